@@ -1,101 +1,323 @@
 import json
-from typing import Dict, Any
-from openai import OpenAI
+import re
+import threading
+import time
+from typing import TYPE_CHECKING, Callable, Dict, Any, List, Optional, Tuple
 from config import config
+from interpretation_cache import InterpretationCache
+from intent_parser import intent_parser
+from streaming_json import IncrementalJSONParser
+from prompts import SYSTEM_PROMPT, MULTI_TASK_PROMPT, build_messages, local_now
+from llm_metrics import llm_usage, estimate_tokens
+from rate_limit import rate_limiter
+from metrics import metrics, stage, interpretations, llm_requests
+from resilience import resilience, HedgePolicy
 
-class AIService:
-    def __init__(self):
-        self.client = OpenAI(api_key=config.OPENAI_API_KEY)
-        
-    def interpret_task(self, user_input: str) -> Dict[str, Any]:
-        """Use OpenAI to interpret user task and extract parameters"""
-        
-        system_prompt = """You are TaskLinx, an AI assistant that interprets natural language tasks for email and calendar operations.
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
 
-Given a user's natural language input, determine:
-1. The action type: "email" or "calendar" 
-2. Extract relevant parameters for the action
+# Called with (path, value) for each field as it streams in, e.g. (("action_type",), "email")
+PartialCallback = Callable[[tuple, Any], None]
+# Path of the partial sent when a call escalates to the next model: drop the fields streamed so far
+PARTIAL_RESET: tuple = ()
 
-For EMAIL tasks, extract:
-- recipient: email address or name
-- subject: email subject line
-- message: email body content
+# Cheap check for inputs that may describe more than one action
+MULTI_ACTION_HINT = re.compile(r"\band\b|\bthen\b|\balso\b|;|\n", re.IGNORECASE)
 
-For CALENDAR tasks, extract:
-- title: event title
-- start_time: start date/time (convert to ISO format if possible)
-- end_time: end date/time (convert to ISO format if possible, default to 1 hour after start)
-- description: optional event description
-
-Respond with a JSON object containing:
-{
-  "action_type": "email" or "calendar",
-  "parameters": {
-    // extracted parameters based on action type
-  },
-  "confidence": number between 0-1,
-  "reasoning": "brief explanation of interpretation"
-}
-
-Examples:
-Input: "Email Alice to reschedule our meeting to tomorrow at 3 PM"
-Output: {
-  "action_type": "email",
-  "parameters": {
-    "recipient": "Alice",
-    "subject": "Meeting Reschedule",
-    "message": "Hi Alice, I'd like to reschedule our meeting to tomorrow at 3 PM. Please let me know if this works for you."
-  },
-  "confidence": 0.9,
-  "reasoning": "Clear email intent with recipient and rescheduling context"
-}
+class AIService:
+    def __init__(self):
+        self._client: Optional["AsyncOpenAI"] = None
+        self._client_lock = threading.Lock()
+        self.hedge_policies: Dict[str, HedgePolicy] = {}
+        self.cache = InterpretationCache(
+            maxsize=config.INTERPRETATION_CACHE_SIZE,
+            ttl=config.INTERPRETATION_CACHE_TTL,
+            persist_path=config.INTERPRETATION_CACHE_FILE
+        )
+        metrics.register_cache("interpretation", self.cache)
+        self.fast_path_attempts = 0
+        self.fast_path_hits = 0
+        self.fast_path_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+    
+    @property
+    def client(self) -> "AsyncOpenAI":
+        """The OpenAI client, built on first use: importing openai is a large share of startup"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    from openai import AsyncOpenAI
+                    # Retries and timeouts are handled by the resilience layer, per attempt and overall
+                    self._client = AsyncOpenAI(
+                        api_key=config.OPENAI_API_KEY,
+                        base_url=config.OPENAI_BASE_URL,
+                        timeout=config.OPENAI_TIMEOUT,
+                        max_retries=0
+                    )
+        return self._client
+    
+    async def interpret_task(
+        self,
+        user_input: str,
+        on_partial: Optional[PartialCallback] = None,
+        timezone: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Interpret a user task: local fast path, then cache, then OpenAI.
 
-Input: "Create a calendar event for team sync tomorrow at 2 PM"
-Output: {
-  "action_type": "calendar",
-  "parameters": {
-    "title": "Team Sync",
-    "start_time": "2024-01-20T14:00:00",
-    "end_time": "2024-01-20T15:00:00",
-    "description": "Team synchronization meeting"
-  },
-  "confidence": 0.95,
-  "reasoning": "Clear calendar event creation request with specific time"
-}"""
+        `on_partial` only fires for LLM interpretations, as fields stream in; when
+        the call escalates to OPENAI_MODEL, a PARTIAL_RESET partial precedes its fields
+        (and follows the fields of a hedged attempt that lost the race).
+        Relative dates are resolved in the user's timezone.
+        """
+        now = local_now(timezone)
+        
+        if config.FAST_PATH_ENABLED:
+            self.fast_path_attempts += 1
+            start = time.perf_counter()
+            with stage("fast_path"):
+                parsed = intent_parser.parse(user_input, now=now)
+            elapsed = time.perf_counter() - start
+            if parsed and parsed["confidence"] >= config.FAST_PATH_CONFIDENCE_THRESHOLD:
+                self.fast_path_hits += 1
+                self.fast_path_seconds += elapsed
+                interpretations.inc(source="fast_path")
+                return parsed
+        
+        cached = self.cache.get(user_input, now.date(), timezone)
+        if cached is not None:
+            interpretations.inc(source="cache")
+            return cached
+        
+        interpretations.inc(source="llm")
+        interpretation = await self._interpret_tiered(user_input, SYSTEM_PROMPT, 500, on_partial, timezone)
+        
+        # Only cache usable interpretations; errors and parse failures should be retried.
+        # Per-call usage belongs to this call, not to later cache hits.
+        # The cache itself skips scheduled and sub-day relative ("in 2 hours") interpretations.
+        if interpretation.get("action_type") in ("email", "calendar"):
+            cacheable = {key: value for key, value in interpretation.items() if key != "llm"}
+            self.cache.set(user_input, cacheable, now.date(), timezone)
+        
+        return interpretation
+    
+    async def interpret_multi_task(self, user_input: str, timezone: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Interpret input that may contain several actions, in a single LLM call.
 
-        try:
-            response = self.client.chat.completions.create(
-                model="gpt-4",
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": user_input}
-                ],
-                temperature=0.1,
-                max_tokens=500
+        Each returned interpretation carries the "user_input" segment it was
+        derived from.
+        """
+        if not MULTI_ACTION_HINT.search(user_input):
+            return [{**await self.interpret_task(user_input, timezone=timezone), "user_input": user_input}]
+        
+        parsed = await self._interpret_tiered(user_input, MULTI_TASK_PROMPT, 1500, None, timezone)
+        
+        tasks = parsed.get("tasks")
+        if not isinstance(tasks, list) or not tasks:
+            # Parse/API failure, or the model answered with a single interpretation
+            return [{**parsed, "user_input": user_input}]
+        
+        return [{**task, "user_input": task.get("user_input") or user_input, "llm": parsed.get("llm")} for task in tasks]
+    
+    def _is_confident(self, interpretation: Dict[str, Any]) -> bool:
+        tasks = interpretation.get("tasks")
+        candidates = tasks if isinstance(tasks, list) and tasks else [interpretation]
+        return all(
+            isinstance(task, dict)
+            and task.get("action_type") in ("email", "calendar")
+            and (task.get("confidence") or 0) >= config.MODEL_ESCALATION_CONFIDENCE
+            for task in candidates
+        )
+    
+    async def _interpret_tiered(
+        self,
+        user_input: str,
+        system_prompt: str,
+        max_tokens: int,
+        on_partial: Optional[PartialCallback],
+        timezone: Optional[str]
+    ) -> Dict[str, Any]:
+        """Try the cheap model first and escalate to OPENAI_MODEL on low confidence"""
+        models = [config.OPENAI_MODEL]
+        if config.OPENAI_FAST_MODEL and config.OPENAI_FAST_MODEL != config.OPENAI_MODEL:
+            models.insert(0, config.OPENAI_FAST_MODEL)
+        
+        calls = []
+        for model in models:
+            if calls and on_partial:
+                # The escalated model streams its own fields, which may contradict the ones already sent
+                on_partial(PARTIAL_RESET, None)
+            interpretation, call = await self._interpret_with_llm(
+                user_input, system_prompt, max_tokens, on_partial, timezone, model
             )
-            
-            response_content = response.choices[0].message.content
-            
-            # Parse JSON response
+            calls.append(call)
+            if self._is_confident(interpretation):
+                break
+        
+        interpretation["llm"] = {
+            "model": calls[-1]["model"],
+            "escalated": len(calls) > 1,
+            "prompt_tokens": sum(call["prompt_tokens"] for call in calls),
+            "completion_tokens": sum(call["completion_tokens"] for call in calls),
+            "latency_ms": round(sum(call["latency_ms"] for call in calls), 1),
+            "cost_usd": round(sum(call["cost_usd"] for call in calls), 6)
+        }
+        return interpretation
+    
+    async def _interpret_with_llm(
+        self,
+        user_input: str,
+        system_prompt: str,
+        max_tokens: int,
+        on_partial: Optional[PartialCallback],
+        timezone: Optional[str],
+        model: str
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Use OpenAI to interpret user task and extract parameters.
+
+        The completion is streamed through an incremental JSON parser so
+        callers can act on fields such as action_type before it finishes.
+        Returns the interpretation and the recorded usage for the call.
+        """
+        # Shared OpenAI budget; raises RateLimitExceeded rather than burning a doomed request
+        await rate_limiter.acquire("openai", max_wait=config.BACKEND_RATE_LIMIT_MAX_WAIT)
+        
+        messages = build_messages(system_prompt, user_input, timezone)
+        completion_chunks = 0
+        start = time.perf_counter()
+        outcome = "ok"
+        with stage("llm", model=model):
             try:
-                parsed_response = json.loads(response_content)
-                return parsed_response
-            except json.JSONDecodeError:
-                # Fallback if JSON parsing fails
-                return {
-                    "action_type": "unknown",
+                response_content, completion_chunks = await resilience.call_async(
+                    "openai",
+                    lambda: self._complete(model, messages, max_tokens, on_partial)
+                )
+                
+                # Parse JSON response
+                try:
+                    interpretation = json.loads(response_content)
+                except json.JSONDecodeError:
+                    interpretation = None
+                if not isinstance(interpretation, dict):
+                    # Fallback if JSON parsing fails or the JSON is not an object
+                    outcome = "invalid_json"
+                    interpretation = {
+                        "action_type": "unknown",
+                        "parameters": {},
+                        "confidence": 0.0,
+                        "reasoning": "Failed to parse AI response",
+                        "raw_response": response_content
+                    }
+                    
+            except Exception as e:
+                outcome = "error"
+                interpretation = {
+                    "action_type": "error",
                     "parameters": {},
                     "confidence": 0.0,
-                    "reasoning": "Failed to parse AI response",
-                    "raw_response": response_content
+                    "reasoning": f"OpenAI API error: {str(e) or type(e).__name__}"
                 }
-                
-        except Exception as e:
-            return {
-                "action_type": "error",
-                "parameters": {},
-                "confidence": 0.0,
-                "reasoning": f"OpenAI API error: {str(e)}"
-            }
+        
+        elapsed = time.perf_counter() - start
+        self.llm_calls += 1
+        self.llm_seconds += elapsed
+        llm_requests.inc(model=model, outcome=outcome)
+        
+        # Streamed responses carry no usage block: estimate prompt tokens from
+        # the prompt text and count one token per streamed content chunk
+        call = llm_usage.record(
+            model=model,
+            prompt_tokens=sum(estimate_tokens(message["content"]) for message in messages),
+            completion_tokens=completion_chunks,
+            latency_seconds=elapsed,
+            estimated=True,
+            purpose="multi_task" if system_prompt is MULTI_TASK_PROMPT else "interpret"
+        )
+        return interpretation, call
+    
+    async def _complete(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        on_partial: Optional[PartialCallback]
+    ) -> Tuple[str, int]:
+        """One completion attempt, hedged with a backup request when the first is unusually slow"""
+        if not config.OPENAI_HEDGE_ENABLED:
+            return await self._stream_completion(model, messages, max_tokens, on_partial)
+        
+        # Only the attempt that streams first forwards partial fields
+        owner = []
+        
+        def forward_from(attempt: int) -> PartialCallback:
+            def forward(path: tuple, value: Any):
+                if not owner:
+                    owner.append(attempt)
+                if owner[0] == attempt and on_partial:
+                    on_partial(path, value)
+            return forward
+        
+        async def run(attempt: int) -> Tuple[int, Tuple[str, int]]:
+            return attempt, await self._stream_completion(model, messages, max_tokens, forward_from(attempt))
+        
+        winner, result = await resilience.hedged(
+            "openai",
+            run,
+            self.hedge_policies.setdefault(model, HedgePolicy(
+                percentile=config.OPENAI_HEDGE_PERCENTILE,
+                min_delay=config.OPENAI_HEDGE_MIN_DELAY,
+                initial_delay=config.OPENAI_TIMEOUT / 2
+            ))
+        )
+        if owner and owner[0] != winner and on_partial:
+            # The fields already sent came from the losing attempt
+            on_partial(PARTIAL_RESET, None)
+        return result
+    
+    async def _stream_completion(
+        self,
+        model: str,
+        messages: List[Dict[str, str]],
+        max_tokens: int,
+        on_partial: Optional[PartialCallback]
+    ) -> Tuple[str, int]:
+        """Stream a completion, feeding fields to on_partial; returns the text and its chunk count"""
+        request_options = {}
+        if config.OPENAI_JSON_MODE:
+            request_options["response_format"] = {"type": "json_object"}
+        
+        stream = await self.client.chat.completions.create(
+            model=model,
+            messages=messages,
+            temperature=0.1,
+            max_tokens=max_tokens,
+            stream=True,
+            **request_options
+        )
+        
+        parser = IncrementalJSONParser()
+        content_parts = []
+        async for chunk in stream:
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if not delta:
+                continue
+            content_parts.append(delta)
+            for path, value in parser.feed(delta):
+                if on_partial:
+                    on_partial(path, value)
+        
+        return "".join(content_parts), len(content_parts)
+    
+    def fast_path_stats(self) -> Dict[str, Any]:
+        """Fast-path hit rate and the LLM latency it avoided (estimated from the mean LLM call)"""
+        mean_llm_seconds = self.llm_seconds / self.llm_calls if self.llm_calls else 0.0
+        return {
+            "attempts": self.fast_path_attempts,
+            "hits": self.fast_path_hits,
+            "hit_rate": self.fast_path_hits / self.fast_path_attempts if self.fast_path_attempts else 0.0,
+            "llm_calls": self.llm_calls,
+            "mean_llm_latency_ms": mean_llm_seconds * 1000,
+            "estimated_latency_saved_ms": max(self.fast_path_hits * mean_llm_seconds - self.fast_path_seconds, 0.0) * 1000
+        }
 
 ai_service = AIService() 
\ No newline at end of file
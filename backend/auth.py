@@ -1,14 +1,31 @@
-import json
-import os
+import functools
+import hashlib
+import importlib
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Optional
-import httpx
-from google.auth.transport.requests import Request
-from google.oauth2.credentials import Credentials
-from google_auth_oauthlib.flow import Flow
-from jose import JWTError, jwt
+from typing import TYPE_CHECKING, Optional
 from fastapi import HTTPException, status
+from cache import TTLCache
 from config import config
+from metrics import metrics, stage
+from resilience import resilience
+from token_store import create_token_store
+from invalidation import invalidation_bus
+from revocation import revocation_list
+
+if TYPE_CHECKING:
+    from google.oauth2.credentials import Credentials
+
+# Imported where they are used, so importing the app stays cheap; warm_up() loads them early
+DEFERRED_IMPORTS = (
+    "jose.jwt",
+    "httpx",
+    "google.oauth2.credentials",
+    "google.auth.transport.requests",
+    "google_auth_oauthlib.flow",
+)
 
 class AuthService:
     def __init__(self):
@@ -16,20 +33,56 @@ class AuthService:
             "web": {
                 "client_id": config.GOOGLE_CLIENT_ID,
                 "client_secret": config.GOOGLE_CLIENT_SECRET,
-                "auth_uri": "https://accounts.google.com/o/oauth2/auth",
-                "token_uri": "https://oauth2.googleapis.com/token",
+                "auth_uri": config.GOOGLE_AUTH_URI,
+                "token_uri": config.GOOGLE_TOKEN_URI,
                 "redirect_uris": [f"{config.FRONTEND_URL}/auth/callback"]
             }
         }
         
-    def get_authorization_url(self) -> str:
-        """Generate Google OAuth2 authorization URL"""
-        flow = Flow.from_client_config(
+        # Shared by all worker processes; local caches are invalidated through the bus
+        self.token_store = create_token_store()
+        
+        # Per-user Credentials objects, so the request path never re-reads the token store
+        self._credentials_cache = TTLCache(
+            maxsize=config.CREDENTIALS_CACHE_SIZE,
+            ttl=config.CREDENTIALS_CACHE_TTL
+        )
+        self._refresh_locks = {}
+        self._refresh_locks_guard = threading.Lock()
+        self._email_cache = TTLCache(
+            maxsize=config.CREDENTIALS_CACHE_SIZE,
+            ttl=config.CREDENTIALS_CACHE_TTL
+        )
+        metrics.register_cache("credentials", self._credentials_cache)
+        metrics.register_cache("user_email", self._email_cache)
+        
+        # Access tokens that passed verification, by SHA-256 digest; revocation is still checked on every hit
+        self._verified_tokens = TTLCache(
+            maxsize=config.TOKEN_VERIFY_CACHE_SIZE,
+            ttl=config.ACCESS_TOKEN_TTL
+        )
+        metrics.register_cache("token_verify", self._verified_tokens)
+        invalidation_bus.subscribe("user_tokens", self._drop_cached)
+        self._refresher_stop = threading.Event()
+        self._refresher_thread = None
+    
+    def warm_up(self):
+        """Import the OAuth and JWT libraries ahead of the first login or authenticated request"""
+        for module in DEFERRED_IMPORTS:
+            importlib.import_module(module)
+    
+    def _flow(self):
+        from google_auth_oauthlib.flow import Flow
+        return Flow.from_client_config(
             self.client_config,
             scopes=config.GOOGLE_SCOPES,
             redirect_uri=f"{config.FRONTEND_URL}/auth/callback"
         )
         
+    def get_authorization_url(self) -> str:
+        """Generate Google OAuth2 authorization URL"""
+        flow = self._flow()
+        
         authorization_url, _ = flow.authorization_url(
             access_type='offline',
             include_granted_scopes='true',
@@ -40,11 +93,7 @@ class AuthService:
     
     def exchange_code_for_tokens(self, code: str) -> dict:
         """Exchange authorization code for access and refresh tokens"""
-        flow = Flow.from_client_config(
-            self.client_config,
-            scopes=config.GOOGLE_SCOPES,
-            redirect_uri=f"{config.FRONTEND_URL}/auth/callback"
-        )
+        flow = self._flow()
         
         flow.fetch_token(code=code)
         credentials = flow.credentials
@@ -52,36 +101,30 @@ class AuthService:
         # Get user info
         user_info = self._get_user_info(credentials.token)
         
-        # Store tokens
+        # Store tokens, along with the address Gmail sends from
         user_id = user_info['id']
-        self._store_user_tokens(user_id, credentials)
-        
-        # Create JWT token for our app
-        access_token = self._create_access_token(user_id)
+        self._store_user_tokens(user_id, credentials, email=user_info.get('email'))
         
+        # Create JWT tokens for our app
         return {
-            "access_token": access_token,
+            **self._issue_tokens(user_id),
             "user_info": user_info
         }
     
     def _get_user_info(self, access_token: str) -> dict:
         """Get user information from Google"""
-        url = f"https://www.googleapis.com/oauth2/v2/userinfo?access_token={access_token}"
-        with httpx.Client() as client:
-            response = client.get(url)
-            response.raise_for_status()
-            return response.json()
-    
-    def _store_user_tokens(self, user_id: str, credentials: Credentials):
-        """Store user tokens in file"""
-        os.makedirs(config.CREDS_DIR, exist_ok=True)
-        
-        tokens_data = {}
-        if os.path.exists(config.TOKENS_FILE):
-            with open(config.TOKENS_FILE, 'r') as f:
-                tokens_data = json.load(f)
-        
-        tokens_data[user_id] = {
+        import httpx
+        url = f"{config.GOOGLE_USERINFO_URL}?access_token={access_token}"
+        with httpx.Client(timeout=config.GOOGLE_TIMEOUT) as client:
+            def fetch() -> dict:
+                response = client.get(url)
+                response.raise_for_status()
+                return response.json()
+            return resilience.call("oauth", fetch)
+    
+    def _store_user_tokens(self, user_id: str, credentials: "Credentials", email: Optional[str] = None):
+        """Store user tokens; token refreshes don't know the address, so the login one is kept"""
+        self.token_store.put(user_id, {
             "token": credentials.token,
             "refresh_token": credentials.refresh_token,
             "token_uri": credentials.token_uri,
@@ -89,60 +132,209 @@ class AuthService:
             "client_secret": credentials.client_secret,
             "scopes": credentials.scopes,
             "expiry": credentials.expiry.isoformat() if credentials.expiry else None
-        }
+        }, email=email)
         
-        with open(config.TOKENS_FILE, 'w') as f:
-            json.dump(tokens_data, f, indent=2)
+        self._drop_cached(user_id)
+        invalidation_bus.publish("user_tokens", user_id)
     
-    def get_user_credentials(self, user_id: str) -> Optional[Credentials]:
-        """Get stored user credentials"""
-        if not os.path.exists(config.TOKENS_FILE):
+    def _drop_cached(self, user_id: str):
+        self._credentials_cache.pop(user_id)
+        self._email_cache.pop(user_id)
+    
+    def get_user_email(self, user_id: str) -> Optional[str]:
+        """Get the user's Gmail address, captured at login"""
+        email = self._email_cache.get(user_id)
+        if email is None:
+            email = (self.token_store.get(user_id) or {}).get("email")
+            if email:
+                self._email_cache.set(user_id, email)
+        return email
+    
+    def set_user_email(self, user_id: str, email: str):
+        """Persist a changed (or previously unknown) Gmail address"""
+        if not self.token_store.set_email(user_id, email):
+            return
+        self._email_cache.set(user_id, email)
+        invalidation_bus.publish("user_tokens", user_id)
+    
+    def _load_user_credentials(self, user_id: str) -> Optional["Credentials"]:
+        """Build Credentials from the user's stored tokens"""
+        from google.oauth2.credentials import Credentials
+        token_info = self.token_store.get(user_id)
+        if not token_info:
             return None
         
-        with open(config.TOKENS_FILE, 'r') as f:
-            tokens_data = json.load(f)
-        
-        if user_id not in tokens_data:
-            return None
+        # google-auth compares expiry against naive UTC datetimes
+        expiry = datetime.fromisoformat(token_info["expiry"]) if token_info.get("expiry") else None
         
-        token_info = tokens_data[user_id]
-        credentials = Credentials(
+        return Credentials(
             token=token_info["token"],
             refresh_token=token_info["refresh_token"],
             token_uri=token_info["token_uri"],
             client_id=token_info["client_id"],
             client_secret=token_info["client_secret"],
-            scopes=token_info["scopes"]
+            scopes=token_info["scopes"],
+            expiry=expiry
         )
-        
-        # Refresh if expired
-        if credentials.expired:
-            credentials.refresh(Request())
+    
+    def _refresh_lock(self, user_id: str) -> threading.Lock:
+        with self._refresh_locks_guard:
+            lock = self._refresh_locks.get(user_id)
+            if lock is None:
+                lock = self._refresh_locks[user_id] = threading.Lock()
+            return lock
+    
+    def _expires_within(self, credentials: "Credentials", seconds: float) -> bool:
+        if not credentials.expiry:
+            return False
+        return credentials.expiry - datetime.utcnow() <= timedelta(seconds=seconds)
+    
+    def _refresh_user_credentials(self, user_id: str, credentials: "Credentials"):
+        """Refresh and persist credentials (caller holds the user's refresh lock)"""
+        from google.auth.transport.requests import Request
+        with stage("credentials_refresh"):
+            # google-auth's default transport timeout is 120s
+            resilience.call("oauth", credentials.refresh, functools.partial(Request(), timeout=config.GOOGLE_TIMEOUT))
             self._store_user_tokens(user_id, credentials)
+        self._credentials_cache.set(user_id, credentials)
+    
+    def get_user_credentials(self, user_id: str) -> Optional["Credentials"]:
+        """Get stored user credentials"""
+        credentials = self._credentials_cache.get(user_id)
+        if credentials is not None and not credentials.expired:
+            return credentials
+        
+        # Only one loader/refresher per user; concurrent callers wait and reuse its result
+        with self._refresh_lock(user_id):
+            credentials = self._credentials_cache.get(user_id)
+            if credentials is None:
+                with stage("credentials_load"):
+                    credentials = self._load_user_credentials(user_id)
+                if credentials is None:
+                    return None
+                self._credentials_cache.set(user_id, credentials)
+            
+            # Refresh if expired (normally the background refresher gets there first)
+            if credentials.expired and credentials.refresh_token:
+                self._refresh_user_credentials(user_id, credentials)
         
         return credentials
     
-    def _create_access_token(self, user_id: str) -> str:
-        """Create JWT access token for our app"""
-        expire = datetime.utcnow() + timedelta(hours=24)
-        to_encode = {"sub": user_id, "exp": expire}
-        return jwt.encode(to_encode, config.SECRET_KEY, algorithm="HS256")
+    def refresh_expiring_credentials(self):
+        """Renew cached credentials that are close to expiry"""
+        for user_id, credentials in self._credentials_cache.items():
+            if not credentials.refresh_token:
+                continue
+            if not self._expires_within(credentials, config.CREDENTIALS_REFRESH_MARGIN):
+                continue
+            
+            with self._refresh_lock(user_id):
+                # Another caller may have refreshed while we waited
+                if not self._expires_within(credentials, config.CREDENTIALS_REFRESH_MARGIN):
+                    continue
+                try:
+                    self._refresh_user_credentials(user_id, credentials)
+                except Exception as e:
+                    print(f"Background token refresh failed for {user_id}: {e}")
     
-    def verify_token(self, token: str) -> str:
-        """Verify JWT token and return user_id"""
+    def _run_refresher(self):
+        while not self._refresher_stop.wait(config.CREDENTIALS_REFRESH_INTERVAL):
+            self.refresh_expiring_credentials()
+    
+    def start_background_refresh(self):
+        """Start the daemon thread that renews tokens before they expire"""
+        if self._refresher_thread and self._refresher_thread.is_alive():
+            return
+        self._refresher_stop.clear()
+        self._refresher_thread = threading.Thread(
+            target=self._run_refresher,
+            name="tasklinx-token-refresher",
+            daemon=True
+        )
+        self._refresher_thread.start()
+    
+    def stop_background_refresh(self):
+        self._refresher_stop.set()
+    
+    def _encode(self, user_id: str, session_id: str, token_type: str, ttl: int) -> str:
+        from jose import jwt
+        now = int(time.time())
+        claims = {
+            "sub": user_id,
+            "sid": session_id,
+            "jti": uuid.uuid4().hex,
+            "typ": token_type,
+            "iat": now,
+            "exp": now + ttl
+        }
+        return jwt.encode(claims, config.SECRET_KEY, algorithm="HS256")
+    
+    def _issue_tokens(self, user_id: str, session_id: Optional[str] = None) -> dict:
+        """Create a short-lived access JWT and the refresh token that renews it"""
+        session_id = session_id or uuid.uuid4().hex
+        return {
+            "access_token": self._encode(user_id, session_id, "access", config.ACCESS_TOKEN_TTL),
+            "refresh_token": self._encode(user_id, session_id, "refresh", config.REFRESH_TOKEN_TTL),
+            "expires_in": config.ACCESS_TOKEN_TTL
+        }
+    
+    def _decode(self, token: str, token_type: str) -> dict:
+        """Check signature, expiry and type; raise 401 otherwise"""
+        from jose import JWTError, jwt
         try:
             payload = jwt.decode(token, config.SECRET_KEY, algorithms=["HS256"])
-            user_id: str = payload.get("sub")
-            if user_id is None:
-                raise HTTPException(
-                    status_code=status.HTTP_401_UNAUTHORIZED,
-                    detail="Invalid authentication token"
-                )
-            return user_id
         except JWTError:
+            payload = {}
+        if payload.get("typ") != token_type or not payload.get("sub") or not payload.get("sid"):
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="Invalid authentication token"
             )
+        return payload
+    
+    def _revoke_session(self, session_id: str):
+        # Outlives every token issued for the session so far; later refreshes are refused
+        revocation_list.revoke(session_id, time.time() + config.REFRESH_TOKEN_TTL)
+    
+    def verify_token(self, token: str) -> str:
+        """Verify JWT token and return user_id"""
+        digest = hashlib.sha256(token.encode()).digest()
+        verified = self._verified_tokens.get(digest)
+        if verified is None:
+            payload = self._decode(token, "access")
+            verified = (payload["sub"], payload["sid"])
+            # Cached no longer than the token is valid, so exp needs no re-check on a hit
+            ttl = payload["exp"] - time.time()
+            if ttl > 0:
+                self._verified_tokens.set(digest, verified, ttl=ttl)
+        
+        user_id, session_id = verified
+        if revocation_list.is_revoked(session_id):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Session has been signed out"
+            )
+        return user_id
+    
+    def refresh_tokens(self, refresh_token: str) -> dict:
+        """Swap a refresh token for a new access/refresh pair; each refresh token works once"""
+        payload = self._decode(refresh_token, "refresh")
+        if revocation_list.is_revoked(payload["sid"]):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Session has been signed out"
+            )
+        if not revocation_list.revoke(payload["jti"], payload["exp"]):
+            # A used refresh token came back: it leaked, or was replayed; end the whole session
+            self._revoke_session(payload["sid"])
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Refresh token has already been used"
+            )
+        return self._issue_tokens(payload["sub"], payload["sid"])
+    
+    def logout(self, refresh_token: str):
+        """Revoke the session of a refresh token: its access and refresh tokens stop working"""
+        self._revoke_session(self._decode(refresh_token, "refresh")["sid"])
 
-auth_service = AuthService() 
\ No newline at end of file
+auth_service = AuthService()
\ No newline at end of file
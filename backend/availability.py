@@ -0,0 +1,302 @@
+import itertools
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
+from cache import TTLCache
+from config import config
+from google_clients import google_clients
+from interval_tree import IntervalTree
+from invalidation import invalidation_bus
+from metrics import metrics, stage
+from resilience import resilience
+
+def _rfc3339(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+def _timestamp(value: Dict[str, str]) -> Optional[float]:
+    """Epoch seconds of an event's start/end; None for all-day events (they don't block time)"""
+    if "dateTime" not in value:
+        return None
+    return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")).timestamp()
+
+class UserAvailability:
+    """One user's busy intervals between window_start and window_end (epoch seconds).
+
+    Events TaskLinx created (and any listed with their id) are keyed
+    "event:<id>" so they can be updated in place; anonymous free/busy
+    blocks are keyed "busy:<n>".
+    """
+
+    def __init__(self):
+        self.tree = IntervalTree()
+        self.titles: Dict[str, str] = {}
+        self.lock = threading.Lock()
+        self.loaded = False
+        self.stale = False
+        self.sync_pending = False
+        self.sync_token: Optional[str] = None
+        self.synced_at = 0.0
+        self.window_start = 0.0
+        self.window_end = 0.0
+        self._busy_ids = itertools.count()
+
+    def add_event(self, event_id: str, start: float, end: float, title: Optional[str] = None):
+        key = f"event:{event_id}"
+        self.tree.add(start, end, key)
+        if title:
+            self.titles[key] = title
+
+    def remove_event(self, event_id: str) -> bool:
+        key = f"event:{event_id}"
+        self.titles.pop(key, None)
+        return self.tree.remove(key)
+
+    def add_busy(self, start: float, end: float):
+        # Free/busy also reports the events we already hold by id
+        known = self.tree.first_overlap(start, end)
+        if known and known[0] == start and known[1] == end:
+            return
+        self.tree.add(start, end, f"busy:{next(self._busy_ids)}")
+
+    def conflicts(self, start: float, end: float) -> List[Dict[str, Any]]:
+        return [
+            {
+                "start": _rfc3339(busy_start),
+                "end": _rfc3339(busy_end),
+                "title": self.titles.get(key)
+            }
+            for busy_start, busy_end, key in self.tree.overlaps(start, end)
+        ]
+
+    def next_free_slot(self, start: float, duration: float, tz: ZoneInfo) -> Optional[float]:
+        """Earliest free start at or after `start` within working hours, inside the cached window"""
+        t = start
+        while t + duration <= self.window_end:
+            t = self.tree.next_free(t, duration, self.window_end)
+            if t is None:
+                return None
+            local = datetime.fromtimestamp(t, tz)
+            day_start = local.replace(hour=config.CALENDAR_WORKDAY_START, minute=0, second=0, microsecond=0)
+            day_end = local.replace(hour=config.CALENDAR_WORKDAY_END, minute=0, second=0, microsecond=0)
+            if local < day_start:
+                t = day_start.timestamp()
+            elif t + duration > day_end.timestamp():
+                t = (day_start + timedelta(days=1)).timestamp()
+            else:
+                return t
+        return None
+
+class AvailabilityCache:
+    """Per-user calendar availability kept locally, so conflict checks cost no API calls.
+
+    A user's window is seeded with one free/busy query (events.list when
+    the token lacks the free/busy scope), then kept fresh with events.list
+    sync tokens: after a booking, in the background, once the last sync is
+    older than AVAILABILITY_SYNC_INTERVAL seconds (usually an empty delta).
+    Changes to events we don't hold by id (edited elsewhere, recurring
+    series) re-seed the window. Events TaskLinx creates are added
+    immediately and announced to other workers, which re-sync before their
+    next check.
+    """
+
+    def __init__(self, window_days: int, sync_interval: float, cache_size: int, cache_ttl: float):
+        self.window_days = window_days
+        self.sync_interval = sync_interval
+        self._states = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._states_lock = threading.Lock()
+        self._syncer = ThreadPoolExecutor(max_workers=2, thread_name_prefix="tasklinx-availability")
+        metrics.register_cache("availability", self._states)
+        invalidation_bus.subscribe("availability", self._mark_stale)
+
+    def _state(self, user_id: str) -> UserAvailability:
+        with self._states_lock:
+            state = self._states.get(user_id)
+            if state is None:
+                state = UserAvailability()
+                self._states.set(user_id, state)
+            return state
+
+    def _mark_stale(self, user_id: str):
+        state = self._states.get(user_id)
+        if state is not None:
+            state.stale = True
+
+    @contextmanager
+    def booking(self, service, user_id: str) -> Iterator[UserAvailability]:
+        """Hold the user's availability (fresh, and locked so checks and inserts don't race)"""
+        state = self._state(user_id)
+        with state.lock:
+            try:
+                self._refresh(service, state)
+            except Exception as e:
+                # Without availability the event is still created, just unchecked
+                print(f"Calendar availability refresh failed for {user_id}: {e}")
+                state.loaded = False
+            yield state
+
+    def sync_later(self, user_id: str, credentials):
+        """Queue a background sync of the user's window if the last one is older than sync_interval"""
+        state = self._states.get(user_id)
+        if state is None or not state.loaded or state.sync_pending:
+            return
+        if time.monotonic() - state.synced_at <= self.sync_interval:
+            return
+        state.sync_pending = True
+        self._syncer.submit(self._background_sync, user_id, state, credentials)
+
+    def _background_sync(self, user_id: str, state: UserAvailability, credentials):
+        try:
+            # The request's client is bound to its thread's HTTP pool, so build one here
+            service = google_clients.client('calendar', 'v3', credentials)
+            with state.lock:
+                if state.loaded and time.monotonic() - state.synced_at > self.sync_interval:
+                    self._sync(service, state)
+        except Exception as e:
+            print(f"Background availability sync failed for {user_id}: {e}")
+        finally:
+            state.sync_pending = False
+
+    def notify_changed(self, user_id: str):
+        """Tell other workers the user's calendar changed"""
+        invalidation_bus.publish("availability", user_id)
+
+    def ensure_window(self, service, state: UserAvailability, until: float):
+        """Extend a loaded window so it covers `until` (plus a week for suggestions)"""
+        if state.loaded and until > state.window_end:
+            end = until + 7 * 86400
+            self._seed(service, state, state.window_end, end)
+            state.window_end = end
+
+    def _refresh(self, service, state: UserAvailability):
+        # Age alone is left to sync_later; a change announced by another worker must be seen now
+        if not state.loaded:
+            self._load(service, state)
+        elif state.stale:
+            self._sync(service, state)
+
+    def _load(self, service, state: UserAvailability):
+        state.tree.clear()
+        state.titles.clear()
+        now = time.time()
+        state.window_start = now - 86400
+        state.window_end = now + self.window_days * 86400
+        with stage("availability_seed"):
+            self._seed(service, state, state.window_start, state.window_end)
+            state.sync_token = self._initial_sync_token(service, state.window_start)
+        state.synced_at = time.monotonic()
+        state.stale = False
+        state.loaded = True
+
+    def _seed(self, service, state: UserAvailability, start: float, end: float):
+        body = {"timeMin": _rfc3339(start), "timeMax": _rfc3339(end), "items": [{"id": "primary"}]}
+        try:
+            response = resilience.call("calendar", service.freebusy().query(body=body).execute)
+        except HttpError as e:
+            if e.resp.status != 403:
+                raise
+            # Tokens granted before the free/busy scope was requested can still list events
+            self._seed_from_events(service, state, start, end)
+            return
+        for busy in response.get("calendars", {}).get("primary", {}).get("busy", []):
+            state.add_busy(_timestamp({"dateTime": busy["start"]}), _timestamp({"dateTime": busy["end"]}))
+
+    def _seed_from_events(self, service, state: UserAvailability, start: float, end: float):
+        page_token = None
+        while True:
+            response = resilience.call("calendar", service.events().list(
+                calendarId='primary',
+                timeMin=_rfc3339(start),
+                timeMax=_rfc3339(end),
+                singleEvents=True,
+                maxResults=2500,
+                pageToken=page_token,
+                fields="nextPageToken,items(id,status,summary,transparency,start,end)"
+            ).execute)
+            for event in response.get("items", []):
+                self._apply(state, event)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return
+
+    def _initial_sync_token(self, service, start: float) -> Optional[str]:
+        # Only the token is wanted: the window was already seeded, so skip the calendar's past
+        page_token = None
+        while True:
+            response = resilience.call("calendar", service.events().list(
+                calendarId='primary',
+                timeMin=_rfc3339(start),
+                showDeleted=True,
+                maxResults=2500,
+                pageToken=page_token,
+                fields="nextPageToken,nextSyncToken"
+            ).execute)
+            page_token = response.get("nextPageToken")
+            if not page_token:
+                return response.get("nextSyncToken")
+
+    def _sync(self, service, state: UserAvailability):
+        if state.sync_token is None:
+            self._load(service, state)
+            return
+
+        changed: List[Dict[str, Any]] = []
+        page_token = None
+        with stage("availability_sync"):
+            try:
+                while True:
+                    response = resilience.call("calendar", service.events().list(
+                        calendarId='primary',
+                        syncToken=state.sync_token,
+                        pageToken=page_token,
+                        fields="nextPageToken,nextSyncToken,items(id,status,summary,transparency,start,end,recurrence,recurringEventId)"
+                    ).execute)
+                    changed.extend(response.get("items", []))
+                    page_token = response.get("nextPageToken")
+                    if not page_token:
+                        break
+            except HttpError as e:
+                # 410: the sync token expired; start over
+                if e.resp.status != 410:
+                    raise
+                self._load(service, state)
+                return
+
+        state.sync_token = response.get("nextSyncToken", state.sync_token)
+        state.synced_at = time.monotonic()
+        state.stale = False
+
+        unknown = False
+        for event in changed:
+            if f"event:{event['id']}" in state.tree and "recurrence" not in event and "recurringEventId" not in event:
+                self._apply(state, event)
+            else:
+                unknown = True
+        if unknown:
+            # Where those events used to be is only in the anonymous free/busy blocks
+            self._reseed(service, state)
+
+    def _reseed(self, service, state: UserAvailability):
+        for key in state.tree.keys():
+            if key.startswith("busy:"):
+                state.tree.remove(key)
+        self._seed(service, state, max(state.window_start, time.time() - 86400), state.window_end)
+
+    def _apply(self, state: UserAvailability, event: Dict[str, Any]):
+        state.remove_event(event["id"])
+        if event.get("status") == "cancelled" or event.get("transparency") == "transparent":
+            return
+        start, end = _timestamp(event.get("start", {})), _timestamp(event.get("end", {}))
+        if start is not None and end is not None and end > start:
+            state.add_event(event["id"], start, end, event.get("summary"))
+
+availability = AvailabilityCache(
+    window_days=config.AVAILABILITY_WINDOW_DAYS,
+    sync_interval=config.AVAILABILITY_SYNC_INTERVAL,
+    cache_size=config.AVAILABILITY_CACHE_SIZE,
+    cache_ttl=config.AVAILABILITY_CACHE_TTL
+)
@@ -0,0 +1,41 @@
+"""Micro-benchmark: per-call Google API client setup cost.
+
+Compares googleapiclient.discovery.build() (what the services did per task)
+with GoogleClientFactory.client(), which reuses parsed discovery documents.
+No network access is needed; only client construction is timed.
+
+    cd backend && python benchmarks/bench_client_factory.py [iterations]
+"""
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from googleapiclient.discovery import build
+from google.oauth2.credentials import Credentials
+from google_clients import GoogleClientFactory
+
+def time_per_call(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations * 1000
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    credentials = Credentials(token="benchmark-token")
+    factory = GoogleClientFactory()
+    factory.preload()
+
+    print(f"{'api':<10} {'build() ms':>12} {'factory ms':>12} {'speedup':>9}")
+    for api, version in [("gmail", "v1"), ("calendar", "v3")]:
+        before = time_per_call(
+            lambda: build(api, version, credentials=credentials, cache_discovery=False),
+            iterations
+        )
+        after = time_per_call(lambda: factory.client(api, version, credentials), iterations)
+        print(f"{api:<10} {before:>12.2f} {after:>12.3f} {before / after:>8.0f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""Cold-start cost of the API: import time and time to first request.
+
+Import time: runs ``python -X importtime -c "import main"`` a few times and
+reports the median total plus the heaviest modules main pulls in (by
+cumulative time, so a library counts everything it imports).
+
+Time to first request: starts fake_upstreams.py once, then starts a fresh
+single-worker serve.py per run (with and without the startup warm-up) and
+measures how long until GET / answers, and how long the first task that
+goes through the LLM and Gmail then takes.
+
+    cd backend && python benchmarks/bench_startup.py --runs 5 --top 15
+"""
+import argparse
+import asyncio
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import httpx
+from harness import BACKEND_DIR, app_token, free_port, seed_tokens, server_env, task_text, wait_ready
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)")
+
+def import_times(env: dict) -> Tuple[float, float, Dict[str, float]]:
+    """(wall seconds, importtime total seconds, cumulative seconds per module imported directly by main)"""
+    start = time.perf_counter()
+    process = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    wall = time.perf_counter() - start
+
+    total = 0.0
+    modules: Dict[str, float] = {}
+    for line in process.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if not match:
+            continue
+        cumulative, depth, name = int(match.group(2)) / 1e6, len(match.group(3)) // 2, match.group(4)
+        if depth == 0:
+            # Top-level imports: main itself, plus whatever the interpreter loaded before it
+            total += cumulative
+        if depth <= 1 and name != "main":
+            modules[name] = modules.get(name, 0.0) + cumulative
+    return wall, total, modules
+
+def report_imports(env: dict, runs: int, top: int):
+    walls, totals, per_module = [], [], {}
+    for _ in range(runs):
+        wall, total, modules = import_times(env)
+        walls.append(wall)
+        totals.append(total)
+        for name, seconds in modules.items():
+            per_module.setdefault(name, []).append(seconds)
+
+    print(f"import main: {statistics.median(totals) * 1000:.0f}ms importtime total, "
+          f"{statistics.median(walls) * 1000:.0f}ms wall (interpreter start included), median of {runs}")
+    heaviest = sorted(per_module.items(), key=lambda item: -statistics.median(item[1]))[:top]
+    for name, samples in heaviest:
+        print(f"  {name:<40} {statistics.median(samples) * 1000:>8.1f}ms")
+
+def first_request(env: dict, token: str, warm_up: bool, settle: float) -> Tuple[float, float]:
+    """(seconds from spawn until GET / answers, seconds for the first task after `settle`)"""
+    port = free_port()
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port), "--workers", "1",
+         "--log-level", "warning"],
+        cwd=BACKEND_DIR, env={**env, "WARM_UP_ENABLED": str(warm_up).lower()}, stdout=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=url, timeout=120) as client:
+            while True:
+                try:
+                    if client.get("/").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                if process.poll() is not None:
+                    raise RuntimeError("serve.py exited during startup")
+                time.sleep(0.005)
+            ready = time.perf_counter() - start
+
+            time.sleep(settle)
+            start = time.perf_counter()
+            response = client.post(
+                "/tasks/execute",
+                json={"task": task_text(1)},
+                headers={"Authorization": f"Bearer {token}"}
+            )
+            first_task = time.perf_counter() - start
+            response.raise_for_status()
+            if not response.json().get("success"):
+                raise RuntimeError(f"First task failed: {response.json().get('result')}")
+        return ready, first_task
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+def report_first_requests(env: dict, token: str, runs: int, settle: float):
+    print(f"\ntime to first request (median of {runs}; first task sent {settle:.1f}s after ready)")
+    print(f"{'':<12} {'ready ms':>10} {'first task ms':>14}")
+    for warm_up in (False, True):
+        samples: List[Tuple[float, float]] = [first_request(env, token, warm_up, settle) for _ in range(runs)]
+        label = "warm-up" if warm_up else "no warm-up"
+        print(f"{label:<12} {statistics.median(s[0] for s in samples) * 1000:>10.0f} "
+              f"{statistics.median(s[1] for s in samples) * 1000:>14.0f}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="heaviest imported modules to list")
+    parser.add_argument("--settle", type=float, default=1.0,
+                        help="seconds between the server answering and the first task")
+    parser.add_argument("--imports-only", action="store_true", help="skip the time-to-first-request runs")
+    args = parser.parse_args()
+
+    upstream_port = free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    token = app_token()
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = server_env(state_dir, upstream_url)
+        report_imports(env, args.runs, args.top)
+        if args.imports_only:
+            return
+
+        seed_tokens(env)
+        upstream = subprocess.Popen(
+            [sys.executable, "benchmarks/fake_upstreams.py", "--port", str(upstream_port)],
+            cwd=BACKEND_DIR, env=env
+        )
+        try:
+            asyncio.run(wait_ready(upstream_url))
+            report_first_requests(env, token, args.runs, args.settle)
+        finally:
+            upstream.terminate()
+            upstream.wait(timeout=30)
+
+if __name__ == "__main__":
+    main()
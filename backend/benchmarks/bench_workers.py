@@ -0,0 +1,147 @@
+"""Throughput of the API as the number of worker processes grows.
+
+Starts serve.py with 1, 2, 4... workers against throwaway SQLite files,
+seeds a user's task history, then drives GET /tasks/history (JWT check,
+shared SQLite read, JSON encoding - no upstream calls) at a fixed
+concurrency and reports requests per second per worker count.
+
+    cd backend && python benchmarks/bench_workers.py --workers 1,2,4 --seconds 10
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+import httpx
+from jose import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = "bench-secret"
+USER_ID = "bench-user"
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def server_env(state_dir: str) -> dict:
+    return {
+        **os.environ,
+        "SECRET_KEY": SECRET_KEY,
+        "OPENAI_API_KEY": os.environ.get("OPENAI_API_KEY", "bench"),
+        # Never touch ../creds: its legacy JSON files would be "migrated" into these throwaway stores
+        "CREDS_DIR": state_dir,
+        "TOKENS_FILE": os.path.join(state_dir, "tokens.json"),
+        "TASKS_FILE": os.path.join(state_dir, "tasks.json"),
+        "HISTORY_DB_FILE": os.path.join(state_dir, "history.db"),
+        "TOKENS_DB_FILE": os.path.join(state_dir, "tokens.db"),
+        "INVALIDATION_DB_FILE": os.path.join(state_dir, "invalidations.db"),
+        "RATE_LIMIT_DB_FILE": os.path.join(state_dir, "ratelimit.db"),
+        "REVOCATION_DB_FILE": os.path.join(state_dir, "revocations.db"),
+        "JOBS_DB_FILE": os.path.join(state_dir, "jobs.db"),
+        "IDEMPOTENCY_DB_FILE": os.path.join(state_dir, "idempotency.db"),
+        "RATE_LIMIT_USER": "0/1",
+        "RATE_LIMIT_GLOBAL": "0/1",
+    }
+
+def seed_history(env: dict, tasks: int):
+    script = (
+        "import json, sys\n"
+        "from datetime import datetime\n"
+        "from history_store import create_history_store\n"
+        "from ids import new_task_id\n"
+        "store = create_history_store()\n"
+        f"for i in range({tasks}):\n"
+        f"    store.append({USER_ID!r}, {{'id': new_task_id(), 'timestamp': datetime.now().isoformat(),\n"
+        "        'user_input': f'Email bob@example.com subject Update {i} saying hi',\n"
+        "        'interpretation': {'action_type': 'email', 'parameters': {}, 'confidence': 0.95},\n"
+        "        'result': {'success': True, 'message_id': str(i)}, 'status': 'completed'})\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True)
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError("server did not start")
+
+async def drive(url: str, token: str, concurrency: int, seconds: float) -> dict:
+    completed, errors = 0, 0
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def user(client: httpx.AsyncClient):
+        nonlocal completed, errors
+        while time.monotonic() < deadline:
+            try:
+                response = await client.get("/tasks/history", params={"limit": 20})
+                response.raise_for_status()
+                completed += 1
+            except httpx.HTTPError:
+                errors += 1
+
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=30) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+    return {"completed": completed, "errors": errors, "throughput": completed / elapsed}
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", default="1,2,4", help="comma-separated worker counts")
+    parser.add_argument("--concurrency", type=int, default=64)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--tasks", type=int, default=100, help="history rows seeded for the user")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args()
+
+    claims = {"sub": USER_ID, "sid": "bench-session", "jti": "bench-token", "typ": "access",
+              "exp": datetime.utcnow() + timedelta(hours=1)}
+    token = jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+    results = []
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = server_env(state_dir)
+        seed_history(env, args.tasks)
+
+        print(f"{'workers':>8} {'done':>8} {'errors':>7} {'req/s':>9} {'speedup':>8}")
+        for workers in [int(count) for count in args.workers.split(",")]:
+            port = free_port()
+            url = f"http://127.0.0.1:{port}"
+            server = subprocess.Popen(
+                [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(port),
+                 "--workers", str(workers), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+            )
+            try:
+                await wait_ready(url)
+                await drive(url, token, args.concurrency, 1)  # Warm-up
+                stats = await drive(url, token, args.concurrency, args.seconds)
+            finally:
+                server.terminate()
+                server.wait(timeout=30)
+
+            stats["workers"] = workers
+            baseline = results[0]["throughput"] if results else stats["throughput"]
+            stats["speedup"] = stats["throughput"] / baseline if baseline else 0.0
+            results.append(stats)
+            print(f"{workers:>8} {stats['completed']:>8} {stats['errors']:>7} "
+                  f"{stats['throughput']:>9.1f} {stats['speedup']:>7.2f}x")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,228 @@
+"""Local stand-ins for OpenAI, Gmail, Calendar and Google OAuth, for benchmarks.
+
+One FastAPI app serves:
+    POST /v1/chat/completions                        OpenAI-compatible (streaming or not)
+    GET  /gmail/v1/users/me/profile                  Gmail getProfile
+    POST /gmail/v1/users/me/messages/send            Gmail send
+    POST /batch                                      Gmail batch (multipart/mixed)
+    POST /calendar/v3/calendars/primary/events       Calendar insert
+    GET  /calendar/v3/calendars/primary/events       Calendar list (sync tokens)
+    GET  /calendar/v3/calendars/primary/events/{id}  Calendar get
+    POST /calendar/v3/freeBusy                       Calendar free/busy
+    POST /token                                      OAuth token refresh
+    GET  /oauth2/v2/userinfo                         OAuth userinfo
+
+Point TaskLinx at it with OPENAI_BASE_URL=http://127.0.0.1:9100/v1,
+GOOGLE_API_BASE_URL=http://127.0.0.1:9100/,
+GOOGLE_TOKEN_URI=http://127.0.0.1:9100/token and
+GOOGLE_USERINFO_URL=http://127.0.0.1:9100/oauth2/v2/userinfo.
+
+    cd backend && python benchmarks/fake_upstreams.py --port 9100 \\
+        --llm-first-token-ms 300 --llm-token-ms 15 --google-ms 80
+"""
+import argparse
+import asyncio
+import email.parser
+import json
+import random
+import re
+import time
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from zoneinfo import ZoneInfo
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+EMAIL_ADDRESS = re.compile(r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+")
+
+# Latencies in seconds; set from the command line
+LATENCY = {"llm_first_token": 0.3, "llm_token": 0.015, "google": 0.08, "oauth": 0.05}
+# Fraction of batched Gmail sends answered with 429, to exercise partial failures
+GMAIL_REJECT_RATE = {"batch": 0.0}
+
+# Inserted calendar events in insertion order; a sync token is a position in this list
+CALENDAR_EVENTS: List[Dict[str, Any]] = []
+
+app = FastAPI(title="TaskLinx fake upstreams")
+
+def interpret(user_input: str) -> Dict[str, Any]:
+    """Deterministic stand-in for the model: e-mail if an address is mentioned, else a calendar event"""
+    recipients = EMAIL_ADDRESS.findall(user_input)
+    if recipients:
+        addressees = {"recipient": recipients[0]} if len(recipients) == 1 else {"recipients": recipients}
+        return {
+            "action_type": "email",
+            "parameters": {**addressees, "subject": "Update", "message": user_input},
+            "confidence": 0.9,
+            "reasoning": "fake upstream"
+        }
+    return {
+        "action_type": "calendar",
+        "parameters": {
+            "title": user_input[:60],
+            "start_time": "2030-01-15T14:00:00",
+            "end_time": "2030-01-15T15:00:00",
+            "description": ""
+        },
+        "confidence": 0.9,
+        "reasoning": "fake upstream"
+    }
+
+def chunk(completion_id: str, model: str, content: str = None, finish_reason: str = None) -> str:
+    delta = {"content": content} if content is not None else {}
+    payload = {
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+    }
+    return f"data: {json.dumps(payload)}\n\n"
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    model = body.get("model", "gpt-3.5-turbo")
+    user_input = body["messages"][-1]["content"]
+    content = json.dumps(interpret(user_input))
+    # Roughly one token per 4 characters, streamed in token-sized pieces
+    pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+    if not body.get("stream"):
+        await asyncio.sleep(LATENCY["llm_first_token"] + LATENCY["llm_token"] * len(pieces))
+        return {
+            "id": completion_id,
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 500, "completion_tokens": len(pieces), "total_tokens": 500 + len(pieces)}
+        }
+
+    async def stream():
+        await asyncio.sleep(LATENCY["llm_first_token"])
+        for piece in pieces:
+            yield chunk(completion_id, model, piece)
+            await asyncio.sleep(LATENCY["llm_token"])
+        yield chunk(completion_id, model, finish_reason="stop")
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(stream(), media_type="text/event-stream")
+
+@app.get("/gmail/v1/users/{user_id}/profile")
+async def gmail_profile(user_id: str):
+    await asyncio.sleep(LATENCY["google"])
+    return {"emailAddress": "bench@example.com", "messagesTotal": 0, "threadsTotal": 0, "historyId": "1"}
+
+@app.post("/gmail/v1/users/{user_id}/messages/send")
+async def gmail_send(user_id: str):
+    await asyncio.sleep(LATENCY["google"])
+    return {"id": uuid.uuid4().hex[:16], "threadId": uuid.uuid4().hex[:16], "labelIds": ["SENT"]}
+
+@app.post("/batch")
+async def gmail_batch(request: Request):
+    """Answer each application/http part of a multipart/mixed batch as a send would"""
+    body = await request.body()
+    head = f"Content-Type: {request.headers['content-type']}\r\n\r\n".encode()
+    batch = email.parser.BytesParser().parsebytes(head + body)
+    await asyncio.sleep(LATENCY["google"])
+
+    boundary = f"batch_{uuid.uuid4().hex}"
+    parts = []
+    for part in batch.get_payload():
+        content_id = part["Content-ID"].strip("<>")
+        if random.random() < GMAIL_REJECT_RATE["batch"]:
+            status = "429 Too Many Requests"
+            payload = {"error": {"code": 429, "message": "User-rate limit exceeded"}}
+        else:
+            status = "200 OK"
+            payload = {"id": uuid.uuid4().hex[:16], "threadId": uuid.uuid4().hex[:16], "labelIds": ["SENT"]}
+        parts.append(
+            f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n"
+            f"HTTP/1.1 {status}\r\nContent-Type: application/json; charset=UTF-8\r\n\r\n{json.dumps(payload)}\r\n"
+        )
+    content = "".join(parts) + f"--{boundary}--\r\n"
+    return Response(content, media_type=f"multipart/mixed; boundary={boundary}")
+
+@app.post("/calendar/v3/calendars/{calendar_id}/events")
+async def calendar_insert(calendar_id: str, request: Request):
+    event = await request.json()
+    await asyncio.sleep(LATENCY["google"])
+    event.setdefault("id", uuid.uuid4().hex)
+    for edge in ("start", "end"):
+        # Google answers with offsets, not the request's wall-clock time plus zone
+        when = datetime.fromisoformat(event[edge]["dateTime"])
+        if when.tzinfo is None:
+            when = when.replace(tzinfo=ZoneInfo(event[edge].get("timeZone", "UTC")))
+        event[edge] = {**event[edge], "dateTime": when.isoformat()}
+    event = {**event, "status": "confirmed", "htmlLink": f"https://calendar.example.com/event?eid={event['id']}"}
+    CALENDAR_EVENTS.append(event)
+    return event
+
+@app.get("/calendar/v3/calendars/{calendar_id}/events")
+async def calendar_list(calendar_id: str, syncToken: Optional[str] = None):
+    """Everything on a full listing, events inserted since the token on an incremental one"""
+    await asyncio.sleep(LATENCY["google"])
+    since = int(syncToken) if syncToken else 0
+    return {"items": CALENDAR_EVENTS[since:], "nextSyncToken": str(len(CALENDAR_EVENTS))}
+
+@app.post("/calendar/v3/freeBusy")
+async def calendar_freebusy(request: Request):
+    query = await request.json()
+    await asyncio.sleep(LATENCY["google"])
+    busy = [
+        {"start": event["start"]["dateTime"], "end": event["end"]["dateTime"]}
+        for event in CALENDAR_EVENTS
+    ]
+    return {
+        "kind": "calendar#freeBusy",
+        "timeMin": query["timeMin"],
+        "timeMax": query["timeMax"],
+        "calendars": {item["id"]: {"busy": busy} for item in query["items"]}
+    }
+
+@app.get("/calendar/v3/calendars/{calendar_id}/events/{event_id}")
+async def calendar_get(calendar_id: str, event_id: str):
+    await asyncio.sleep(LATENCY["google"])
+    return {"id": event_id, "status": "confirmed", "htmlLink": f"https://calendar.example.com/event?eid={event_id}"}
+
+@app.post("/token")
+async def oauth_token():
+    await asyncio.sleep(LATENCY["oauth"])
+    return {"access_token": f"fake-{uuid.uuid4().hex}", "expires_in": 3600, "token_type": "Bearer"}
+
+@app.get("/oauth2/v2/userinfo")
+async def oauth_userinfo():
+    await asyncio.sleep(LATENCY["oauth"])
+    return {"id": "bench-user", "email": "bench@example.com", "name": "Bench User"}
+
+@app.exception_handler(KeyError)
+async def bad_request(request: Request, exc: KeyError):
+    return JSONResponse(status_code=400, content={"error": {"message": f"missing {exc}"}})
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--google-ms", type=float, default=80)
+    parser.add_argument("--oauth-ms", type=float, default=50)
+    parser.add_argument("--gmail-reject-rate", type=float, default=0.0,
+                        help="fraction of batched Gmail sends rejected with 429")
+    args = parser.parse_args()
+
+    LATENCY.update({
+        "llm_first_token": args.llm_first_token_ms / 1000,
+        "llm_token": args.llm_token_ms / 1000,
+        "google": args.google_ms / 1000,
+        "oauth": args.oauth_ms / 1000,
+    })
+    GMAIL_REJECT_RATE["batch"] = args.gmail_reject_rate
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
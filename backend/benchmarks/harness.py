@@ -0,0 +1,319 @@
+"""End-to-end load test against local stand-ins for OpenAI and Google.
+
+Starts benchmarks/fake_upstreams.py and serve.py (pointed at the fakes via
+OPENAI_BASE_URL, GOOGLE_API_BASE_URL, GOOGLE_TOKEN_URI and
+GOOGLE_USERINFO_URL, with throwaway SQLite files), seeds Google tokens for a
+bench user, then drives POST /tasks/execute and GET /tasks/history at a
+fixed concurrency. Reports throughput and p50/p95/p99 latency per endpoint
+and per Server-Timing stage (llm, gmail_send, calendar_insert...).
+
+    cd backend && python benchmarks/harness.py --concurrency 16 --seconds 20
+
+Tracking regressions across commits:
+
+    python benchmarks/harness.py --record bench-results.json
+    python benchmarks/harness.py --compare bench-results.json --threshold 0.15
+
+--record appends the run, keyed by the current git commit. --compare checks
+this run against the last recorded run of another commit and exits with
+status 1 if any p95 grew, or throughput fell, by more than --threshold.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+import httpx
+from jose import jwt
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET_KEY = "bench-secret"
+USER_ID = "bench-user"
+
+RECIPIENTS = ["alice@example.com", "bob@example.com", "carol@example.com", "dave@example.com"]
+MEETINGS = ["team sync", "design review", "1:1 with Sam", "budget planning", "customer call"]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(samples: List[float], fraction: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def summarize(samples: List[float], elapsed: float) -> Dict[str, float]:
+    return {
+        "count": len(samples),
+        "throughput": len(samples) / elapsed if elapsed else 0.0,
+        "p50_ms": percentile(samples, 0.50) * 1000,
+        "p95_ms": percentile(samples, 0.95) * 1000,
+        "p99_ms": percentile(samples, 0.99) * 1000,
+    }
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """"llm;dur=812.4, total;dur=1044.9" -> {"llm": 0.8124, "total": 1.0449}"""
+    stages = {}
+    for entry in header.split(","):
+        name, _, params = entry.strip().partition(";")
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "dur" and name:
+                stages[name] = float(value) / 1000
+    return stages
+
+def server_env(state_dir: str, upstream_url: str) -> dict:
+    return {
+        **os.environ,
+        "SECRET_KEY": SECRET_KEY,
+        "OPENAI_API_KEY": "bench",
+        "OPENAI_BASE_URL": f"{upstream_url}/v1",
+        "GOOGLE_API_BASE_URL": f"{upstream_url}/",
+        "GOOGLE_TOKEN_URI": f"{upstream_url}/token",
+        "GOOGLE_USERINFO_URL": f"{upstream_url}/oauth2/v2/userinfo",
+        "GOOGLE_CLIENT_ID": "bench",
+        "GOOGLE_CLIENT_SECRET": "bench",
+        # Never touch ../creds: its legacy JSON files would be "migrated" into these throwaway stores
+        "CREDS_DIR": state_dir,
+        "TOKENS_FILE": os.path.join(state_dir, "tokens.json"),
+        "TASKS_FILE": os.path.join(state_dir, "tasks.json"),
+        "HISTORY_DB_FILE": os.path.join(state_dir, "history.db"),
+        "TOKENS_DB_FILE": os.path.join(state_dir, "tokens.db"),
+        "INVALIDATION_DB_FILE": os.path.join(state_dir, "invalidations.db"),
+        "RATE_LIMIT_DB_FILE": os.path.join(state_dir, "ratelimit.db"),
+        "CONTACTS_DB_FILE": os.path.join(state_dir, "contacts.db"),
+        "SCHEDULER_DB_FILE": os.path.join(state_dir, "scheduler.db"),
+        "REVOCATION_DB_FILE": os.path.join(state_dir, "revocations.db"),
+        "JOBS_DB_FILE": os.path.join(state_dir, "jobs.db"),
+        "IDEMPOTENCY_DB_FILE": os.path.join(state_dir, "idempotency.db"),
+        # Every benchmark event lands on the same slot; check it, but book it anyway
+        "CALENDAR_CONFLICT_POLICY": "warn",
+        # The point is to measure TaskLinx, not its throttling
+        "RATE_LIMIT_USER": "0/1",
+        "RATE_LIMIT_GLOBAL": "0/1",
+        "RATE_LIMIT_OPENAI": "0/1",
+        "RATE_LIMIT_GMAIL": "0/1",
+        "RATE_LIMIT_CALENDAR": "0/1",
+    }
+
+def app_token(hours: float = 2) -> str:
+    """An access token for the bench user, valid for the whole run"""
+    claims = {"sub": USER_ID, "sid": "bench-session", "jti": "bench-token", "typ": "access",
+              "exp": datetime.utcnow() + timedelta(hours=hours)}
+    return jwt.encode(claims, SECRET_KEY, algorithm="HS256")
+
+def seed_tokens(env: dict):
+    """Store Google tokens for the bench user that stay valid for the whole run"""
+    token_info = {
+        "token": "bench-access-token",
+        "refresh_token": "bench-refresh-token",
+        "token_uri": env["GOOGLE_TOKEN_URI"],
+        "client_id": "bench",
+        "client_secret": "bench",
+        "scopes": ["https://www.googleapis.com/auth/gmail.send", "https://www.googleapis.com/auth/calendar.events"],
+        "expiry": (datetime.utcnow() + timedelta(hours=2)).isoformat(),
+    }
+    script = (
+        "from token_store import create_token_store\n"
+        f"create_token_store().put({USER_ID!r}, {token_info!r}, email='bench@example.com')\n"
+    )
+    subprocess.run([sys.executable, "-c", script], cwd=BACKEND_DIR, env=env, check=True)
+
+async def wait_ready(url: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get("/")).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not start")
+
+def task_text(n: int) -> str:
+    # Distinct wording per request so the interpretation cache and dedup window don't short-circuit
+    # anything; one phrasing in three is simple enough for the local intent parser, the rest need the LLM
+    if n % 3 == 0:
+        return f"Schedule the {random.choice(MEETINGS)} #{n} next Tuesday at 3pm"
+    if n % 3 == 1:
+        return f"Email {random.choice(RECIPIENTS)} about the Q{n % 4 + 1} report, reference #{n}"
+    return f"Could you set up the {random.choice(MEETINGS)} #{n} with the usual folks sometime next week?"
+
+async def drive(url: str, token: str, concurrency: int, seconds: float, history_share: float) -> dict:
+    latencies: Dict[str, List[float]] = {"execute": [], "history": []}
+    stages: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {"execute": 0, "history": 0}
+    counter = 0
+    deadline = time.monotonic() + seconds
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async def user(client: httpx.AsyncClient):
+        nonlocal counter
+        while time.monotonic() < deadline:
+            counter += 1
+            if random.random() < history_share:
+                endpoint, request = "history", client.get("/tasks/history", params={"limit": 20})
+            else:
+                endpoint, request = "execute", client.post("/tasks/execute", json={"task": task_text(counter)})
+            start = time.perf_counter()
+            try:
+                response = await request
+                elapsed = time.perf_counter() - start
+                response.raise_for_status()
+                if endpoint == "execute" and not response.json().get("success"):
+                    raise ValueError(response.json().get("result"))
+            except (httpx.HTTPError, ValueError):
+                errors[endpoint] += 1
+                continue
+            latencies[endpoint].append(elapsed)
+            for name, duration in parse_server_timing(response.headers.get("server-timing", "")).items():
+                if name != "total":
+                    stages.setdefault(name, []).append(duration)
+
+    headers = {"Authorization": f"Bearer {token}"}
+    async with httpx.AsyncClient(base_url=url, headers=headers, limits=limits, timeout=120) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[user(client) for _ in range(concurrency)])
+        elapsed = time.perf_counter() - start
+
+    return {
+        "elapsed": elapsed,
+        "endpoints": {
+            endpoint: {**summarize(samples, elapsed), "errors": errors[endpoint]}
+            for endpoint, samples in latencies.items()
+        },
+        "stages": {name: summarize(samples, elapsed) for name, samples in sorted(stages.items())},
+    }
+
+def print_report(results: dict):
+    print(f"{'':<18} {'count':>7} {'req/s':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for section in ("endpoints", "stages"):
+        for name, stats in results[section].items():
+            label = name if section == "endpoints" else f"  {name}"
+            print(f"{label:<18} {stats['count']:>7} {stats['throughput']:>8.1f} {stats['p50_ms']:>9.1f} "
+                  f"{stats['p95_ms']:>9.1f} {stats['p99_ms']:>9.1f} {stats.get('errors', ''):>7}")
+
+def git_revision() -> dict:
+    def git(*args: str) -> str:
+        return subprocess.run(["git", *args], cwd=BACKEND_DIR, capture_output=True, text=True).stdout.strip()
+    return {"commit": git("rev-parse", "--short", "HEAD") or "unknown", "dirty": bool(git("status", "--porcelain"))}
+
+def load_runs(path: str) -> List[dict]:
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return []
+
+def find_regressions(baseline: dict, current: dict, threshold: float, min_delta_ms: float) -> List[str]:
+    regressions = []
+    for section in ("endpoints", "stages"):
+        for name, stats in current[section].items():
+            before = baseline[section].get(name)
+            if not before or not before["count"] or not stats["count"]:
+                continue
+            grew = stats["p95_ms"] - before["p95_ms"]
+            if grew > min_delta_ms and stats["p95_ms"] > before["p95_ms"] * (1 + threshold):
+                regressions.append(f"{name} p95 {before['p95_ms']:.1f} -> {stats['p95_ms']:.1f} ms")
+            if section == "endpoints" and stats["throughput"] < before["throughput"] * (1 - threshold):
+                regressions.append(f"{name} throughput {before['throughput']:.1f} -> {stats['throughput']:.1f} req/s")
+    return regressions
+
+def compare(runs: List[dict], current: dict, threshold: float, min_delta_ms: float) -> bool:
+    """Compare against the most recent run of a different commit; True if nothing regressed"""
+    baseline: Optional[dict] = next(
+        (run for run in reversed(runs) if run["revision"]["commit"] != current["revision"]["commit"]),
+        runs[-1] if runs else None
+    )
+    if baseline is None:
+        print("No recorded run to compare against")
+        return True
+
+    regressions = find_regressions(baseline, current, threshold, min_delta_ms)
+    print(f"\nCompared with {baseline['revision']['commit']} ({baseline['recorded_at']}), threshold {threshold:.0%}:")
+    for regression in regressions:
+        print(f"  REGRESSION {regression}")
+    if not regressions:
+        print("  no regressions")
+    return not regressions
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=20)
+    parser.add_argument("--warmup", type=float, default=3)
+    parser.add_argument("--workers", type=int, default=1, help="serve.py worker processes")
+    parser.add_argument("--history-share", type=float, default=0.5,
+                        help="fraction of requests that read /tasks/history instead of executing a task")
+    parser.add_argument("--llm-first-token-ms", type=float, default=300)
+    parser.add_argument("--llm-token-ms", type=float, default=15)
+    parser.add_argument("--google-ms", type=float, default=80)
+    parser.add_argument("--record", metavar="FILE", help="append this run to FILE, keyed by git commit")
+    parser.add_argument("--compare", metavar="FILE", help="fail if this run regressed against FILE")
+    parser.add_argument("--threshold", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5,
+                        help="ignore p95 changes smaller than this (sub-millisecond stages are noisy)")
+    args = parser.parse_args()
+
+    token = app_token()
+    upstream_port, server_port = free_port(), free_port()
+    upstream_url = f"http://127.0.0.1:{upstream_port}"
+    server_url = f"http://127.0.0.1:{server_port}"
+
+    with tempfile.TemporaryDirectory() as state_dir:
+        env = server_env(state_dir, upstream_url)
+        seed_tokens(env)
+        processes = [
+            subprocess.Popen(
+                [sys.executable, "benchmarks/fake_upstreams.py", "--port", str(upstream_port),
+                 "--llm-first-token-ms", str(args.llm_first_token_ms), "--llm-token-ms", str(args.llm_token_ms),
+                 "--google-ms", str(args.google_ms)],
+                cwd=BACKEND_DIR, env=env
+            ),
+            subprocess.Popen(
+                [sys.executable, "serve.py", "--host", "127.0.0.1", "--port", str(server_port),
+                 "--workers", str(args.workers), "--log-level", "warning"],
+                cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+            ),
+        ]
+        try:
+            await wait_ready(upstream_url)
+            await wait_ready(server_url)
+            if args.warmup:
+                await drive(server_url, token, args.concurrency, args.warmup, args.history_share)
+            results = await drive(server_url, token, args.concurrency, args.seconds, args.history_share)
+        finally:
+            for process in processes:
+                process.terminate()
+            for process in processes:
+                process.wait(timeout=30)
+
+    results.update({
+        "revision": git_revision(),
+        "recorded_at": datetime.now().isoformat(timespec="seconds"),
+        "settings": {key: value for key, value in vars(args).items() if key not in ("record", "compare", "threshold", "min_delta_ms")},
+    })
+    print_report(results)
+
+    ok = True
+    if args.compare:
+        ok = compare(load_runs(args.compare), results, args.threshold, args.min_delta_ms)
+    if args.record:
+        runs = load_runs(args.record) + [results]
+        with open(args.record, "w") as f:
+            json.dump(runs, f, indent=2)
+    if not ok:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,64 @@
+"""Concurrency load test for POST /tasks/execute.
+
+Runs the same task at increasing numbers of concurrent users against a
+running TaskLinx API and reports throughput per level. With a blocking
+pipeline throughput stays flat as users are added; with the async
+pipeline it should grow until upstream latency or pool limits dominate.
+
+    cd backend && python benchmarks/load_test.py --token <jwt> \\
+        --url http://localhost:8000 --users 1,5,10,20 --requests 5
+"""
+import argparse
+import asyncio
+import time
+import httpx
+
+async def run_user(client: httpx.AsyncClient, task: str, requests: int, latencies: list, errors: list):
+    for _ in range(requests):
+        start = time.perf_counter()
+        try:
+            response = await client.post("/tasks/execute", json={"task": task})
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - start)
+        except httpx.HTTPError as e:
+            errors.append(str(e))
+
+async def run_level(args, users: int) -> dict:
+    latencies, errors = [], []
+    headers = {"Authorization": f"Bearer {args.token}"}
+    async with httpx.AsyncClient(base_url=args.url, headers=headers, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*[
+            run_user(client, args.task, args.requests, latencies, errors)
+            for _ in range(users)
+        ])
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "users": users,
+        "completed": len(latencies),
+        "errors": len(errors),
+        "throughput": len(latencies) / elapsed if elapsed else 0.0,
+        "mean_ms": sum(latencies) / len(latencies) * 1000 if latencies else 0.0,
+        "max_ms": latencies[-1] * 1000 if latencies else 0.0,
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--token", required=True, help="TaskLinx JWT for an authenticated user")
+    parser.add_argument("--task", default="Create a calendar event for team sync tomorrow at 2 PM")
+    parser.add_argument("--users", default="1,5,10,20", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=5, help="requests per user")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args()
+
+    print(f"{'users':>6} {'done':>6} {'errors':>7} {'req/s':>8} {'mean ms':>9} {'max ms':>9}")
+    for users in [int(level) for level in args.users.split(",")]:
+        stats = await run_level(args, users)
+        print(f"{stats['users']:>6} {stats['completed']:>6} {stats['errors']:>7} "
+              f"{stats['throughput']:>8.2f} {stats['mean_ms']:>9.0f} {stats['max_ms']:>9.0f}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,14 +1,30 @@
+import time
+import uuid
 from datetime import datetime, timedelta
-from typing import Dict, Any
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
+from typing import Dict, Any, List, Optional
+from zoneinfo import ZoneInfo
+from googleapiclient.errors import HttpError
 from auth import auth_service
+from availability import availability
+from config import config
+from google_clients import google_clients
+from metrics import stage
+from prompts import resolve_timezone
+from resilience import resilience
 
 class CalendarService:
     def __init__(self):
         pass
     
-    def create_event(self, user_id: str, title: str, start_time: str, end_time: str = None, description: str = "") -> Dict[str, Any]:
+    def create_event(
+        self,
+        user_id: str,
+        title: str,
+        start_time: str,
+        end_time: str = None,
+        description: str = "",
+        timezone: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Create a calendar event using Google Calendar API"""
         try:
             # Get user credentials
@@ -20,52 +36,68 @@ class CalendarService:
                 }
             
             # Build Calendar service
-            service = build('calendar', 'v3', credentials=credentials)
+            service = google_clients.client('calendar', 'v3', credentials)
             
-            # Parse start time
-            try:
-                if isinstance(start_time, str):
-                    if 'T' in start_time:
-                        start_dt = datetime.fromisoformat(start_time.replace('Z', '+00:00'))
-                    else:
-                        start_dt = datetime.strptime(start_time, '%Y-%m-%d %H:%M:%S')
-                else:
-                    start_dt = start_time
-            except:
-                # Fallback: tomorrow at 2 PM
-                start_dt = datetime.now().replace(hour=14, minute=0, second=0, microsecond=0) + timedelta(days=1)
+            # Times are the user's local wall-clock time unless they carry an offset
+            tz = resolve_timezone(timezone)
+            start_dt = self._parse_time(start_time, tz)
+            if start_dt is None:
+                return {
+                    "success": False,
+                    "error": f"Could not understand the start time {start_time!r}; please give a date and time"
+                }
             
             # Parse end time or default to 1 hour after start
-            if end_time:
-                try:
-                    if isinstance(end_time, str):
-                        if 'T' in end_time:
-                            end_dt = datetime.fromisoformat(end_time.replace('Z', '+00:00'))
-                        else:
-                            end_dt = datetime.strptime(end_time, '%Y-%m-%d %H:%M:%S')
-                    else:
-                        end_dt = end_time
-                except:
-                    end_dt = start_dt + timedelta(hours=1)
-            else:
+            end_dt = self._parse_time(end_time, tz) if end_time else None
+            if end_dt is None or end_dt <= start_dt:
                 end_dt = start_dt + timedelta(hours=1)
             
-            # Create event object
+            # Create event object. The client-chosen id makes retried inserts idempotent
             event = {
+                'id': uuid.uuid4().hex,
                 'summary': title,
                 'description': description,
                 'start': {
-                    'dateTime': start_dt.isoformat(),
-                    'timeZone': 'UTC',
+                    'dateTime': start_dt.replace(tzinfo=None).isoformat(),
+                    'timeZone': tz.key,
                 },
                 'end': {
-                    'dateTime': end_dt.isoformat(),
-                    'timeZone': 'UTC',
+                    'dateTime': end_dt.replace(tzinfo=None).isoformat(),
+                    'timeZone': tz.key,
                 },
             }
             
-            # Create the event
-            created_event = service.events().insert(calendarId='primary', body=event).execute()
+            # Check for double-booking against the cached availability, then create the
+            # event while still holding it so concurrent tasks can't book the same slot
+            conflicts = []
+            with availability.booking(service, user_id) as busy:
+                if busy.loaded and config.CALENDAR_CONFLICT_POLICY != "off":
+                    availability.ensure_window(service, busy, end_dt.timestamp())
+                    conflicts = busy.conflicts(start_dt.timestamp(), end_dt.timestamp())
+                    if conflicts and config.CALENDAR_CONFLICT_POLICY == "reject":
+                        # A conflict that was since removed elsewhere must not keep rejecting
+                        availability.sync_later(user_id, credentials)
+                        return self._conflict_result(busy, conflicts, start_dt, end_dt, tz)
+                
+                # Create the event
+                with stage("calendar_insert"):
+                    try:
+                        created_event = resilience.call(
+                            "calendar",
+                            service.events().insert(calendarId='primary', body=event).execute
+                        )
+                    except HttpError as e:
+                        # 409: an earlier attempt was created but its response was lost
+                        if e.resp.status != 409:
+                            raise
+                        created_event = resilience.call(
+                            "calendar",
+                            service.events().get(calendarId='primary', eventId=event['id']).execute
+                        )
+                
+                busy.add_event(created_event['id'], start_dt.timestamp(), end_dt.timestamp(), title)
+            availability.notify_changed(user_id)
+            availability.sync_later(user_id, credentials)
             
             return {
                 "success": True,
@@ -75,8 +107,10 @@ class CalendarService:
                     "title": title,
                     "start": start_dt.isoformat(),
                     "end": end_dt.isoformat(),
+                    "timezone": tz.key,
                     "description": description
-                }
+                },
+                **({"conflicts": conflicts} if conflicts else {})
             }
             
         except Exception as e:
@@ -85,4 +119,40 @@ class CalendarService:
                 "error": f"Failed to create calendar event: {str(e)}"
             }
 
+    def _parse_time(self, value: Any, tz: ZoneInfo) -> Optional[datetime]:
+        """ISO date/time (naive = user's local time) as an aware datetime in tz, or None"""
+        if isinstance(value, datetime):
+            parsed = value
+        else:
+            try:
+                parsed = datetime.fromisoformat(str(value).strip().replace('Z', '+00:00'))
+            except ValueError:
+                return None
+        if parsed.tzinfo is None:
+            return parsed.replace(tzinfo=tz)
+        return parsed.astimezone(tz)
+    
+    def _conflict_result(self, busy, conflicts: List[Dict[str, Any]], start_dt: datetime, end_dt: datetime, tz: ZoneInfo) -> Dict[str, Any]:
+        """Failure result listing the clashing events and the next free slot of the same length"""
+        duration = (end_dt - start_dt).total_seconds()
+        clashes = ", ".join(
+            f"{conflict['title'] or 'busy'} ({self._parse_time(conflict['start'], tz):%a %H:%M}-{self._parse_time(conflict['end'], tz):%H:%M})"
+            for conflict in conflicts
+        )
+        result = {
+            "success": False,
+            "error": f"That time is already booked: {clashes}",
+            "conflicts": conflicts
+        }
+        
+        slot = busy.next_free_slot(max(start_dt.timestamp(), time.time()), duration, tz)
+        if slot is not None:
+            slot_start = datetime.fromtimestamp(slot, tz)
+            result["suggested_slot"] = {
+                "start": slot_start.isoformat(),
+                "end": (slot_start + timedelta(seconds=duration)).isoformat()
+            }
+            result["error"] += f". Next free slot: {slot_start:%a %d %b %H:%M}"
+        return result
+
 calendar_service = CalendarService() 
\ No newline at end of file
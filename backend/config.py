@@ -3,6 +3,11 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+def _rate_limit(name: str, default: str) -> tuple:
+    """Parse "<requests per minute>/<burst>" into (tokens per second, bucket capacity)"""
+    per_minute, burst = os.getenv(name, default).split("/")
+    return float(per_minute) / 60, float(burst)
+
 class Config:
     GOOGLE_CLIENT_ID = os.getenv("GOOGLE_CLIENT_ID")
     GOOGLE_CLIENT_SECRET = os.getenv("GOOGLE_CLIENT_SECRET")
@@ -17,12 +22,190 @@ class Config:
         'email',
         'profile',
         'https://www.googleapis.com/auth/gmail.send',
-        'https://www.googleapis.com/auth/calendar.events'
+        'https://www.googleapis.com/auth/calendar.events',
+        'https://www.googleapis.com/auth/calendar.freebusy'
     ]
     
+    # Upstream endpoints; override to point TaskLinx at local stand-ins (benchmarks/fake_upstreams.py)
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+    GOOGLE_API_BASE_URL = os.getenv("GOOGLE_API_BASE_URL") or None
+    GOOGLE_AUTH_URI = os.getenv("GOOGLE_AUTH_URI", "https://accounts.google.com/o/oauth2/auth")
+    GOOGLE_TOKEN_URI = os.getenv("GOOGLE_TOKEN_URI", "https://oauth2.googleapis.com/token")
+    GOOGLE_USERINFO_URL = os.getenv("GOOGLE_USERINFO_URL", "https://www.googleapis.com/oauth2/v2/userinfo")
+    
+    # OpenAI model; JSON mode needs a model that supports response_format=json_object
+    OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4-turbo")
+    OPENAI_JSON_MODE = os.getenv("OPENAI_JSON_MODE", "true").lower() == "true"
+    # Cheaper model tried first; OPENAI_MODEL is only called when its confidence is low (empty disables)
+    OPENAI_FAST_MODEL = os.getenv("OPENAI_FAST_MODEL", "gpt-3.5-turbo")
+    MODEL_ESCALATION_CONFIDENCE = float(os.getenv("MODEL_ESCALATION_CONFIDENCE", "0.8"))
+    
+    # Timezone for resolving relative dates when the client doesn't send one
+    DEFAULT_TIMEZONE = os.getenv("DEFAULT_TIMEZONE", "UTC")
+    
+    # Rule-based parser tried before the LLM; its result is used at or above the threshold
+    FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() == "true"
+    FAST_PATH_CONFIDENCE_THRESHOLD = float(os.getenv("FAST_PATH_CONFIDENCE_THRESHOLD", "0.85"))
+    
+    # Cache of AI task interpretations (INTERPRETATION_CACHE_FILE enables persistence)
+    INTERPRETATION_CACHE_SIZE = int(os.getenv("INTERPRETATION_CACHE_SIZE", "2048"))
+    INTERPRETATION_CACHE_TTL = int(os.getenv("INTERPRETATION_CACHE_TTL", "86400"))
+    INTERPRETATION_CACHE_FILE = os.getenv("INTERPRETATION_CACHE_FILE")
+    
+    # Batch execution: max tasks per request and concurrent Gmail/Calendar actions per user
+    BATCH_MAX_TASKS = int(os.getenv("BATCH_MAX_TASKS", "10"))
+    USER_ACTION_CONCURRENCY = int(os.getenv("USER_ACTION_CONCURRENCY", "4"))
+    
+    # Bulk email: one message per recipient, sent in Gmail batch requests of up to
+    # GMAIL_BATCH_SIZE (further capped by the gmail rate-limit burst); pacing between
+    # batches waits at most GMAIL_BULK_MAX_WAIT seconds for quota
+    GMAIL_BATCH_SIZE = int(os.getenv("GMAIL_BATCH_SIZE", "50"))
+    GMAIL_BULK_MAX_RECIPIENTS = int(os.getenv("GMAIL_BULK_MAX_RECIPIENTS", "100"))
+    GMAIL_BULK_MAX_WAIT = float(os.getenv("GMAIL_BULK_MAX_WAIT", "60"))
+    
+    # Calendar availability: busy intervals cached per user for AVAILABILITY_WINDOW_DAYS ahead,
+    # re-synced (events.list sync tokens) in the background after a booking once older than
+    # AVAILABILITY_SYNC_INTERVAL seconds
+    AVAILABILITY_WINDOW_DAYS = int(os.getenv("AVAILABILITY_WINDOW_DAYS", "30"))
+    AVAILABILITY_SYNC_INTERVAL = float(os.getenv("AVAILABILITY_SYNC_INTERVAL", "30"))
+    AVAILABILITY_CACHE_SIZE = int(os.getenv("AVAILABILITY_CACHE_SIZE", "1024"))
+    AVAILABILITY_CACHE_TTL = int(os.getenv("AVAILABILITY_CACHE_TTL", "3600"))
+    # Double-booking: "reject" with a suggested free slot, "warn" (create and report), or "off"
+    CALENDAR_CONFLICT_POLICY = os.getenv("CALENDAR_CONFLICT_POLICY", "reject")
+    # Suggested slots fall within these local hours
+    CALENDAR_WORKDAY_START = int(os.getenv("CALENDAR_WORKDAY_START", "9"))
+    CALENDAR_WORKDAY_END = int(os.getenv("CALENDAR_WORKDAY_END", "18"))
+    
+    # Async-mode job queue (/tasks/execute?async=true)
+    JOB_WORKERS = int(os.getenv("JOB_WORKERS", "8"))
+    JOB_MAX_PENDING = int(os.getenv("JOB_MAX_PENDING", "1000"))
+    JOB_RESULT_TTL = int(os.getenv("JOB_RESULT_TTL", "3600"))
+    SSE_KEEPALIVE_SECONDS = int(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+    # Job snapshots shared by all workers; event streams for another worker's job poll them (seconds)
+    JOBS_DB_FILE = os.getenv("JOBS_DB_FILE", "../creds/jobs.db")
+    JOB_EVENTS_POLL_INTERVAL = float(os.getenv("JOB_EVENTS_POLL_INTERVAL", "0.5"))
+    
+    # Idempotency-Key responses are replayed for IDEMPOTENCY_TTL seconds; identical
+    # requests without a key are coalesced within DEDUP_WINDOW_SECONDS
+    IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", "86400"))
+    DEDUP_WINDOW_SECONDS = int(os.getenv("DEDUP_WINDOW_SECONDS", "60"))
+    IDEMPOTENCY_CACHE_SIZE = int(os.getenv("IDEMPOTENCY_CACHE_SIZE", "10000"))
+    # Claims and stored responses shared by all workers; a duplicate on another worker polls
+    # every IDEMPOTENCY_POLL_INTERVAL seconds, and a claim older than IDEMPOTENCY_CLAIM_TIMEOUT
+    # is taken over (its worker died)
+    IDEMPOTENCY_DB_FILE = os.getenv("IDEMPOTENCY_DB_FILE", "../creds/idempotency.db")
+    IDEMPOTENCY_POLL_INTERVAL = float(os.getenv("IDEMPOTENCY_POLL_INTERVAL", "0.2"))
+    IDEMPOTENCY_CLAIM_TIMEOUT = int(os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT", "300"))
+    
+    # Token-bucket rate limits as "<requests per minute>/<burst>" (0 disables a bucket)
+    RATE_LIMITS = {
+        "user": _rate_limit("RATE_LIMIT_USER", "30/10"),
+        "global": _rate_limit("RATE_LIMIT_GLOBAL", "600/100"),
+        "openai": _rate_limit("RATE_LIMIT_OPENAI", "300/50"),
+        "gmail": _rate_limit("RATE_LIMIT_GMAIL", "120/20"),
+        "calendar": _rate_limit("RATE_LIMIT_CALENDAR", "300/50"),
+    }
+    # "memory" per process, or "sqlite" shared by all workers on the host
+    RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+    RATE_LIMIT_DB_FILE = os.getenv("RATE_LIMIT_DB_FILE", "../creds/ratelimit.db")
+    # Bounded wait queue: wait up to this many seconds for a token (0 rejects at once)
+    RATE_LIMIT_MAX_WAIT = float(os.getenv("RATE_LIMIT_MAX_WAIT", "0"))
+    RATE_LIMIT_MAX_WAITERS = int(os.getenv("RATE_LIMIT_MAX_WAITERS", "50"))
+    # Backend calls for already-admitted tasks wait rather than fail
+    BACKEND_RATE_LIMIT_MAX_WAIT = float(os.getenv("BACKEND_RATE_LIMIT_MAX_WAIT", "10"))
+    
+    # Outbound call resilience: per-attempt timeouts, overall deadlines (retries included),
+    # jittered exponential retries and circuit breakers (seconds)
+    OPENAI_TIMEOUT = float(os.getenv("OPENAI_TIMEOUT", "20"))
+    OPENAI_DEADLINE = float(os.getenv("OPENAI_DEADLINE", "45"))
+    GOOGLE_TIMEOUT = float(os.getenv("GOOGLE_TIMEOUT", "10"))
+    GOOGLE_DEADLINE = float(os.getenv("GOOGLE_DEADLINE", "30"))
+    RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", "3"))
+    RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "0.5"))
+    RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "8"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_TIMEOUT = float(os.getenv("CIRCUIT_RESET_TIMEOUT", "30"))
+    # Hedged LLM calls: a backup request starts once the first is slower than this latency percentile
+    OPENAI_HEDGE_ENABLED = os.getenv("OPENAI_HEDGE_ENABLED", "true").lower() == "true"
+    OPENAI_HEDGE_PERCENTILE = float(os.getenv("OPENAI_HEDGE_PERCENTILE", "0.95"))
+    OPENAI_HEDGE_MIN_DELAY = float(os.getenv("OPENAI_HEDGE_MIN_DELAY", "1.0"))
+    
+    # Emit OpenTelemetry spans for pipeline stages (needs opentelemetry-api and an SDK/exporter)
+    TRACING_ENABLED = os.getenv("TRACING_ENABLED", "false").lower() == "true"
+    
+    # Thread pool for blocking Google API and storage calls
+    IO_POOL_WORKERS = int(os.getenv("IO_POOL_WORKERS", "32"))
+    
+    # Google API clients: discovery documents are parsed once per process,
+    # from GOOGLE_DISCOVERY_CACHE_DIR if set, else the library's bundled copies
+    GOOGLE_APIS = [("gmail", "v1"), ("calendar", "v3")]
+    GOOGLE_DISCOVERY_CACHE_DIR = os.getenv("GOOGLE_DISCOVERY_CACHE_DIR")
+    
+    # Startup warm-up: WARM_UP_DELAY seconds after startup (once the port is listening),
+    # load the client libraries, discovery documents and OpenAI client in the background
+    # instead of on the first request that needs them
+    WARM_UP_ENABLED = os.getenv("WARM_UP_ENABLED", "true").lower() == "true"
+    WARM_UP_DELAY = float(os.getenv("WARM_UP_DELAY", "0.2"))
+    
+    # Google credential cache and background token refresh (seconds)
+    CREDENTIALS_CACHE_SIZE = int(os.getenv("CREDENTIALS_CACHE_SIZE", "1024"))
+    CREDENTIALS_CACHE_TTL = int(os.getenv("CREDENTIALS_CACHE_TTL", "3600"))
+    CREDENTIALS_REFRESH_INTERVAL = int(os.getenv("CREDENTIALS_REFRESH_INTERVAL", "60"))
+    CREDENTIALS_REFRESH_MARGIN = int(os.getenv("CREDENTIALS_REFRESH_MARGIN", "600"))
+    
+    # App session tokens (seconds): short-lived access JWTs, renewed through a rotating refresh token
+    ACCESS_TOKEN_TTL = int(os.getenv("ACCESS_TOKEN_TTL", "900"))
+    REFRESH_TOKEN_TTL = int(os.getenv("REFRESH_TOKEN_TTL", str(30 * 24 * 3600)))
+    # Verified access tokens by SHA-256 digest; an entry never outlives its token's exp
+    TOKEN_VERIFY_CACHE_SIZE = int(os.getenv("TOKEN_VERIFY_CACHE_SIZE", "4096"))
+    # Revoked token IDs: "sqlite" (survives restarts, shared by all workers) or "memory" (this process only)
+    REVOCATION_STORE = os.getenv("REVOCATION_STORE", "sqlite")
+    REVOCATION_DB_FILE = os.getenv("REVOCATION_DB_FILE", "../creds/revocations.db")
+    
     # File paths
-    CREDS_DIR = "../creds"
-    TOKENS_FILE = "../creds/tokens.json"
-    TASKS_FILE = "../creds/tasks.json"
+    CREDS_DIR = os.getenv("CREDS_DIR", "../creds")
+    TOKENS_FILE = os.getenv("TOKENS_FILE", "../creds/tokens.json")  # legacy token file, migrated on startup
+    TOKENS_DB_FILE = os.getenv("TOKENS_DB_FILE", "../creds/tokens.db")
+    TASKS_FILE = os.getenv("TASKS_FILE", "../creds/tasks.json")  # legacy history file, migrated on startup
+    
+    # Cross-process cache invalidation (a SQLite table polled by every worker)
+    INVALIDATION_DB_FILE = os.getenv("INVALIDATION_DB_FILE", "../creds/invalidations.db")
+    INVALIDATION_POLL_INTERVAL = float(os.getenv("INVALIDATION_POLL_INTERVAL", "1.0"))
+    
+    # Production server (serve.py / gunicorn_conf.py)
+    HOST = os.getenv("HOST", "0.0.0.0")
+    PORT = int(os.getenv("PORT", "8000"))
+    WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", str(min(os.cpu_count() or 1, 4))))
+    
+    # Task history storage ("sqlite" or "memory")
+    HISTORY_BACKEND = os.getenv("HISTORY_BACKEND", "sqlite")
+    HISTORY_DB_FILE = os.getenv("HISTORY_DB_FILE", "../creds/history.db")
+    # Retention: newest N tasks per user and/or tasks younger than N days (0 = no limit)
+    HISTORY_MAX_TASKS_PER_USER = int(os.getenv("HISTORY_MAX_TASKS_PER_USER", "100"))
+    HISTORY_RETENTION_DAYS = int(os.getenv("HISTORY_RETENTION_DAYS", "0"))
+    HISTORY_MAX_PAGE_SIZE = int(os.getenv("HISTORY_MAX_PAGE_SIZE", "100"))
+    
+    # Contacts for resolving recipient names, learned from sent mail and imported lists
+    CONTACTS_DB_FILE = os.getenv("CONTACTS_DB_FILE", "../creds/contacts.db")
+    CONTACTS_CACHE_SIZE = int(os.getenv("CONTACTS_CACHE_SIZE", "1024"))
+    CONTACTS_CACHE_TTL = int(os.getenv("CONTACTS_CACHE_TTL", "3600"))
+    CONTACTS_MAX_CANDIDATES = int(os.getenv("CONTACTS_MAX_CANDIDATES", "5"))
+    CONTACTS_MAX_IMPORT = int(os.getenv("CONTACTS_MAX_IMPORT", "5000"))
+    
+    # Scheduled and recurring tasks ("send this tomorrow at 9am"), shared by all workers
+    SCHEDULER_DB_FILE = os.getenv("SCHEDULER_DB_FILE", "../creds/scheduler.db")
+    # Scheduled tasks executing at once per worker process
+    SCHEDULER_MAX_CONCURRENT = int(os.getenv("SCHEDULER_MAX_CONCURRENT", "8"))
+    SCHEDULER_MAX_PENDING_PER_USER = int(os.getenv("SCHEDULER_MAX_PENDING_PER_USER", "100"))
+    # Tasks that came due while TaskLinx was down still run if at most this late (seconds);
+    # later ones are recorded as missed
+    SCHEDULER_MISFIRE_GRACE = int(os.getenv("SCHEDULER_MISFIRE_GRACE", str(12 * 3600)))
+    # A task still marked running this long (seconds) after it was claimed belongs to a worker
+    # that died; one-off tasks are then not retried, since they may already have been sent
+    SCHEDULER_CLAIM_TIMEOUT = int(os.getenv("SCHEDULER_CLAIM_TIMEOUT", "900"))
+    # How often (seconds) each worker sweeps for such expired claims, not only at startup
+    SCHEDULER_RECOVER_INTERVAL = int(os.getenv("SCHEDULER_RECOVER_INTERVAL", "60"))
+    # Times less than this far ahead (seconds) run right away instead of being scheduled
+    SCHEDULER_MIN_DELAY = int(os.getenv("SCHEDULER_MIN_DELAY", "60"))
 
 config = Config() 
\ No newline at end of file
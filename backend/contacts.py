@@ -0,0 +1,268 @@
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from cache import TTLCache
+from config import config
+from intent_parser import EMAIL_ADDRESS
+from invalidation import invalidation_bus
+from metrics import metrics
+
+# (name or None, email address)
+ContactEntry = Tuple[Optional[str], str]
+
+def normalize(text: str) -> str:
+    """"José O'Neil" -> "jose o neil": lowercase ASCII words separated by single spaces"""
+    text = unicodedata.normalize("NFKD", text).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", " ", text.lower()).strip()
+
+def is_email_address(text: str) -> bool:
+    return re.fullmatch(EMAIL_ADDRESS, text.strip()) is not None
+
+class _Node:
+    __slots__ = ("children", "emails")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.emails: Set[str] = set()
+
+class ContactIndex:
+    """In-memory trie over one user's contacts.
+
+    Every contact is reachable by its full name, each word of its name and
+    the local part of its address ("alice.smith" and "alice", "smith"), so
+    lookups are exact, prefix or bounded-edit-distance walks of the trie.
+    """
+
+    def __init__(self):
+        self._root = _Node()
+        self.contacts: Dict[str, Dict[str, object]] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _keys(name: Optional[str], email: str) -> Set[str]:
+        local = normalize(email.split("@", 1)[0])
+        keys = {local, local.replace(" ", "")} | set(local.split())
+        if name:
+            full = normalize(name)
+            keys |= {full} | set(full.split())
+        keys.discard("")
+        return keys
+
+    def add(self, name: Optional[str], email: str, sends: int = 0):
+        email = email.lower()
+        with self._lock:
+            contact = self.contacts.get(email)
+            if contact is None:
+                contact = self.contacts[email] = {"name": name, "email": email, "sends": 0}
+            elif name and not contact["name"]:
+                contact["name"] = name
+            contact["sends"] += sends
+            for key in self._keys(name, email):
+                node = self._root
+                for char in key:
+                    node = node.children.setdefault(char, _Node())
+                node.emails.add(email)
+
+    def _find(self, key: str) -> Optional[_Node]:
+        node = self._root
+        for char in key:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node
+
+    def _exact(self, key: str) -> Set[str]:
+        node = self._find(key)
+        return set(node.emails) if node else set()
+
+    def _prefix(self, key: str) -> Set[str]:
+        node = self._find(key)
+        emails: Set[str] = set()
+        stack = [node] if node else []
+        while stack:
+            node = stack.pop()
+            emails |= node.emails
+            stack.extend(node.children.values())
+        return emails
+
+    def _fuzzy(self, key: str, max_distance: int) -> Dict[str, int]:
+        """Emails under keys within max_distance edits of key (Levenshtein, pruned per trie branch).
+
+        Only keys with the same first letter are considered: typos there are
+        rare, and it cuts the search to one subtree.
+        """
+        matches: Dict[str, int] = {}
+        first = self._root.children.get(key[0])
+        if first is None:
+            return matches
+        stack = [(first, key[0], list(range(len(key) + 1)))]
+        while stack:
+            node, char, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + (key[i - 1] != char)))
+            if row[-1] <= max_distance:
+                for email in node.emails:
+                    matches[email] = min(row[-1], matches.get(email, row[-1]))
+            if min(row) <= max_distance:
+                stack.extend((child, next_char, row) for next_char, child in node.children.items())
+        return matches
+
+    def _match(self, key: str) -> Tuple[Set[str], bool]:
+        """(emails, exact): exact key matches, else prefix matches, else the closest fuzzy matches (single words)"""
+        emails = self._exact(key)
+        if emails:
+            return emails, True
+        if len(key) >= 2:
+            emails = self._prefix(key)
+        if not emails and len(key) >= 4 and " " not in key:
+            fuzzy = self._fuzzy(key, 1 if len(key) <= 6 else 2)
+            if fuzzy:
+                best = min(fuzzy.values())
+                emails = {email for email, distance in fuzzy.items() if distance == best}
+        return emails, False
+
+    def lookup(self, query: str) -> List[Dict[str, object]]:
+        """Contacts matching a name, best first (most-mailed wins ties); "exact" is False for prefix/fuzzy matches"""
+        key = normalize(query)
+        if not key:
+            return []
+        with self._lock:
+            emails, exact = self._match(key)
+            if not emails and " " in key:
+                # "alice smth": every word has to match the same contact, typos allowed per word
+                word_matches = [self._match(word) for word in key.split()]
+                emails = set.intersection(*(matched for matched, _ in word_matches))
+                exact = all(word_exact for _, word_exact in word_matches)
+            contacts = [{**self.contacts[email], "exact": exact} for email in emails]
+        return sorted(contacts, key=lambda contact: (-contact["sends"], contact["name"] or "", contact["email"]))
+
+class ContactBook:
+    """Per-user contact indexes for resolving recipient names to addresses.
+
+    Contacts are rows in SQLite (one per user and address, seeded from the
+    user's sent mail and imported lists); each process keeps a trie per
+    active user, updated in place after every successful send. Other
+    workers drop their copy through the invalidation bus.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        sent_history: Optional[Callable[[str], Iterable[ContactEntry]]] = None,
+        cache_size: int = 1024,
+        cache_ttl: float = 3600,
+        max_candidates: int = 5
+    ):
+        self.db_path = db_path
+        self.sent_history = sent_history
+        self.max_candidates = max_candidates
+        self._local = threading.local()
+        self._indexes = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS contacts (
+                user_id TEXT NOT NULL,
+                email TEXT NOT NULL,
+                name TEXT,
+                sends INTEGER NOT NULL DEFAULT 0,
+                updated REAL NOT NULL,
+                PRIMARY KEY (user_id, email)
+            ) WITHOUT ROWID;
+            -- Users whose sent history has already been imported
+            CREATE TABLE IF NOT EXISTS seeded_users (user_id TEXT PRIMARY KEY) WITHOUT ROWID;
+        """)
+        metrics.register_cache("contacts", self._indexes)
+        invalidation_bus.subscribe("contacts", self._indexes.pop)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _upsert(self, user_id: str, entries: Iterable[ContactEntry], sends: int, replace_names: bool):
+        name_update = "COALESCE(excluded.name, contacts.name)" if replace_names else "COALESCE(contacts.name, excluded.name)"
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT INTO contacts (user_id, email, name, sends, updated) VALUES (?, ?, ?, ?, ?) "
+                f"ON CONFLICT(user_id, email) DO UPDATE SET name = {name_update}, "
+                "sends = contacts.sends + excluded.sends, updated = excluded.updated",
+                [(user_id, email.lower(), name or None, sends, time.time()) for name, email in entries]
+            )
+
+    def index(self, user_id: str) -> ContactIndex:
+        index = self._indexes.get(user_id)
+        if index is not None:
+            return index
+
+        conn = self._connect()
+        if self.sent_history and not conn.execute("SELECT 1 FROM seeded_users WHERE user_id = ?", (user_id,)).fetchone():
+            # First use: learn the addresses the user already mailed through TaskLinx
+            self._upsert(user_id, self.sent_history(user_id), sends=1, replace_names=False)
+            conn.execute("INSERT OR IGNORE INTO seeded_users (user_id) VALUES (?)", (user_id,))
+        rows = conn.execute("SELECT name, email, sends FROM contacts WHERE user_id = ?", (user_id,)).fetchall()
+
+        index = ContactIndex()
+        for name, email, sends in rows:
+            index.add(name, email, sends)
+        self._indexes.set(user_id, index)
+        return index
+
+    def resolve(self, user_id: str, recipient: str) -> Tuple[Optional[str], List[Dict[str, object]]]:
+        """Return (address, []) for an address or a name matching exactly one contact, else (None, candidates).
+
+        Prefix and typo matches ("Dan" for Danielle) are only offered as
+        candidates; sending to a guessed address would mail the wrong person.
+        """
+        if is_email_address(recipient):
+            return recipient.strip(), []
+        matches = self.index(user_id).lookup(recipient)
+        if len(matches) == 1 and matches[0]["exact"]:
+            return matches[0]["email"], []
+        return None, matches[:self.max_candidates]
+
+    def search(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, object]]:
+        if is_email_address(query):
+            query = query.split("@", 1)[0]
+        return self.index(user_id).lookup(query)[:limit]
+
+    def record_sent(self, user_id: str, entries: List[ContactEntry]):
+        """Count a successful send to each (name, address) and index it right away"""
+        if not entries:
+            return
+        self._upsert(user_id, entries, sends=1, replace_names=False)
+        index = self._indexes.get(user_id)
+        if index is not None:
+            for name, email in entries:
+                index.add(name, email, sends=1)
+        invalidation_bus.publish("contacts", user_id)
+
+    def import_contacts(self, user_id: str, entries: List[ContactEntry]) -> int:
+        """Add or rename contacts from an imported list; returns how many were stored"""
+        entries = [(name, email.strip()) for name, email in entries if is_email_address(email)]
+        if entries:
+            self._upsert(user_id, entries, sends=0, replace_names=True)
+            # Renamed contacts would keep their old keys, so rebuild rather than patch
+            self._indexes.pop(user_id)
+            invalidation_bus.publish("contacts", user_id)
+        return len(entries)
+
+def create_contact_book(sent_history: Optional[Callable[[str], Iterable[ContactEntry]]] = None) -> ContactBook:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    return ContactBook(
+        config.CONTACTS_DB_FILE,
+        sent_history=sent_history,
+        cache_size=config.CONTACTS_CACHE_SIZE,
+        cache_ttl=config.CONTACTS_CACHE_TTL,
+        max_candidates=config.CONTACTS_MAX_CANDIDATES
+    )
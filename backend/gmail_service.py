@@ -1,9 +1,31 @@
 import base64
 import email.mime.text
-from typing import Dict, Any
-from googleapiclient.discovery import build
-from google.oauth2.credentials import Credentials
+import re
+from typing import Dict, Any, List
+from googleapiclient.errors import HttpError
 from auth import auth_service
+from google_clients import google_clients
+from metrics import stage
+from resilience import resilience, is_rejected
+
+# "alice@x.com, bob@y.com and carol@z.com" -> three recipients
+RECIPIENT_SEPARATOR = re.compile(r"\s*(?:[,;]|\band\b)\s*", re.IGNORECASE)
+
+def split_recipients(parameters: Dict[str, Any]) -> List[str]:
+    """Unique recipients from an email interpretation's "recipient" and "recipients" fields"""
+    values = parameters.get("recipients") or []
+    if isinstance(values, str):
+        values = [values]
+    if parameters.get("recipient"):
+        values = [parameters["recipient"], *values]
+    
+    recipients, seen = [], set()
+    for value in values:
+        for recipient in RECIPIENT_SEPARATOR.split(str(value)):
+            if recipient and recipient.lower() not in seen:
+                seen.add(recipient.lower())
+                recipients.append(recipient)
+    return recipients
 
 class GmailService:
     def __init__(self):
@@ -21,26 +43,24 @@ class GmailService:
                 }
             
             # Build Gmail service
-            service = build('gmail', 'v1', credentials=credentials)
-            
-            # Get user's email address
-            profile = service.users().getProfile(userId='me').execute()
-            sender_email = profile['emailAddress']
-            
-            # Create email message
-            msg = email.mime.text.MIMEText(message)
-            msg['to'] = recipient
-            msg['from'] = sender_email
-            msg['subject'] = subject
+            service = google_clients.client('gmail', 'v1', credentials)
             
-            # Encode message
-            raw_message = base64.urlsafe_b64encode(msg.as_bytes()).decode('utf-8')
+            # Sender address is captured at login; only legacy tokens need a lookup
+            sender_email = auth_service.get_user_email(user_id)
+            if not sender_email:
+                sender_email = self._refresh_sender_email(service, user_id)
             
-            # Send email
-            send_result = service.users().messages().send(
-                userId='me',
-                body={'raw': raw_message}
-            ).execute()
+            try:
+                send_result = self._send_message(service, recipient, subject, message, sender_email)
+            except HttpError as e:
+                # A rejected From header may mean the account's address changed
+                if e.resp.status not in (400, 403):
+                    raise
+                current_email = self._refresh_sender_email(service, user_id)
+                if current_email == sender_email:
+                    raise
+                sender_email = current_email
+                send_result = self._send_message(service, recipient, subject, message, sender_email)
             
             return {
                 "success": True,
@@ -57,5 +77,85 @@ class GmailService:
                 "success": False,
                 "error": f"Failed to send email: {str(e)}"
             }
+    
+    def _refresh_sender_email(self, service, user_id: str) -> str:
+        """Ask Gmail for the account's address and cache it with the user's tokens"""
+        with stage("gmail_get_profile"):
+            profile = resilience.call("gmail", service.users().getProfile(userId='me').execute)
+        sender_email = profile['emailAddress']
+        auth_service.set_user_email(user_id, sender_email)
+        return sender_email
+    
+    def send_bulk_email(self, user_id: str, recipients: List[str], subject: str, message: str) -> List[Dict[str, Any]]:
+        """Send one copy of a message per recipient in a single Gmail batch request.
+        
+        Returns a result per recipient, in order. Items Gmail rejected with 429
+        were not sent and are marked "retryable"; pacing is left to the caller.
+        """
+        try:
+            credentials = auth_service.get_user_credentials(user_id)
+            if not credentials:
+                raise ValueError("User credentials not found. Please re-authenticate.")
+            
+            service = google_clients.client('gmail', 'v1', credentials)
+            sender_email = auth_service.get_user_email(user_id)
+            if not sender_email:
+                sender_email = self._refresh_sender_email(service, user_id)
+        except Exception as e:
+            return [{"recipient": recipient, "success": False, "error": str(e)} for recipient in recipients]
+        
+        results: Dict[str, Dict[str, Any]] = {}
+        
+        def on_response(request_id: str, response: Dict[str, Any], exception: Exception):
+            recipient = recipients[int(request_id)]
+            if exception is None:
+                results[request_id] = {"recipient": recipient, "success": True, "message_id": response['id']}
+            else:
+                results[request_id] = {
+                    "recipient": recipient,
+                    "success": False,
+                    "error": f"Failed to send email: {str(exception)}",
+                    "retryable": is_rejected(exception)
+                }
+        
+        batch = service.new_batch_http_request(callback=on_response)
+        for index, recipient in enumerate(recipients):
+            raw_message = self._encode_message(recipient, subject, message, sender_email)
+            batch.add(service.users().messages().send(userId='me', body={'raw': raw_message}), request_id=str(index))
+        
+        try:
+            # A rejected (429) batch sent nothing and may be retried as a whole
+            with stage("gmail_batch"):
+                resilience.call("gmail", batch.execute, retry_if=is_rejected)
+        except Exception as e:
+            # Whatever did not report back may or may not have been sent
+            for index, recipient in enumerate(recipients):
+                results.setdefault(str(index), {
+                    "recipient": recipient,
+                    "success": False,
+                    "error": f"Failed to send email: {str(e)}",
+                    "retryable": is_rejected(e)
+                })
+        
+        return [results[str(index)] for index in range(len(recipients))]
+    
+    def _encode_message(self, recipient: str, subject: str, message: str, sender_email: str) -> str:
+        msg = email.mime.text.MIMEText(message)
+        msg['to'] = recipient
+        msg['from'] = sender_email
+        msg['subject'] = subject
+        return base64.urlsafe_b64encode(msg.as_bytes()).decode('utf-8')
+    
+    def _send_message(self, service, recipient: str, subject: str, message: str, sender_email: str) -> Dict[str, Any]:
+        raw_message = self._encode_message(recipient, subject, message, sender_email)
+        
+        # Send email. Gmail has no request ids to deduplicate a resend, so only
+        # explicitly rejected (429) attempts are retried; timeouts are not
+        with stage("gmail_send"):
+            return resilience.call(
+                "gmail",
+                service.users().messages().send(userId='me', body={'raw': raw_message}).execute,
+                retry_if=is_rejected
+            )
 
 gmail_service = GmailService() 
\ No newline at end of file
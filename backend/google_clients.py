@@ -0,0 +1,80 @@
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Any, Tuple
+from config import config
+from metrics import stage
+
+# googleapiclient.discovery, httplib2 and google_auth_httplib2 are imported on first use
+# (or by the startup warm-up), not when the app is imported
+if TYPE_CHECKING:
+    import httplib2
+    from google.oauth2.credentials import Credentials
+
+class GoogleClientFactory:
+    """Shared factory for Gmail/Calendar API clients.
+
+    Discovery documents are parsed once per process and reused; binding a
+    user's credentials only builds a thin Resource over a per-thread
+    keep-alive HTTP connection pool.
+    """
+
+    def __init__(self):
+        self._documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._documents_lock = threading.Lock()
+        self._local = threading.local()
+
+    def _read_document(self, api: str, version: str) -> str:
+        """Read a discovery document from the local cache dir, else the library's bundled copy"""
+        if config.GOOGLE_DISCOVERY_CACHE_DIR:
+            cached_path = os.path.join(config.GOOGLE_DISCOVERY_CACHE_DIR, f"{api}.{version}.json")
+            if os.path.exists(cached_path):
+                with open(cached_path, 'r') as f:
+                    return f.read()
+
+        from googleapiclient.discovery_cache import get_static_doc
+        content = get_static_doc(api, version)
+        if not content:
+            raise ValueError(f"No discovery document available for {api} {version}")
+        return content
+
+    def get_document(self, api: str, version: str) -> Dict[str, Any]:
+        key = (api, version)
+        document = self._documents.get(key)
+        if document is None:
+            with self._documents_lock:
+                document = self._documents.get(key)
+                if document is None:
+                    document = self._documents[key] = self._rebase(json.loads(self._read_document(api, version)))
+        return document
+
+    def preload(self):
+        """Import the client libraries and parse all discovery documents TaskLinx uses (startup warm-up)"""
+        import google_auth_httplib2
+        import googleapiclient.discovery
+        for api, version in config.GOOGLE_APIS:
+            self.get_document(api, version)
+
+    def _transport(self) -> "httplib2.Http":
+        # httplib2.Http is not thread-safe, so each worker thread keeps its own pool
+        http = getattr(self._local, "http", None)
+        if http is None:
+            import httplib2
+            http = self._local.http = httplib2.Http(timeout=config.GOOGLE_TIMEOUT)
+        return http
+
+    def client(self, api: str, version: str, credentials: "Credentials"):
+        """Return an API Resource bound to the given user credentials"""
+        import google_auth_httplib2
+        from googleapiclient.discovery import build_from_document
+        with stage("client_build"):
+            authorized_http = google_auth_httplib2.AuthorizedHttp(credentials, http=self._transport())
+            return build_from_document(self.get_document(api, version), http=authorized_http)
+
+    def _rebase(self, document: Dict[str, Any]) -> Dict[str, Any]:
+        """Point the API, batch requests included, at GOOGLE_API_BASE_URL instead of Google, if set"""
+        if config.GOOGLE_API_BASE_URL:
+            document["rootUrl"] = config.GOOGLE_API_BASE_URL.rstrip("/") + "/"
+        return document
+
+google_clients = GoogleClientFactory()
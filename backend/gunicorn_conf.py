@@ -0,0 +1,19 @@
+"""Gunicorn settings for TaskLinx: ``gunicorn -c gunicorn_conf.py main:app``"""
+import os
+from config import config
+
+bind = f"{config.HOST}:{config.PORT}"
+workers = config.WEB_CONCURRENCY
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# The app is imported in each worker after fork, so no SQLite connection or
+# background thread is shared across processes
+preload_app = False
+
+# LLM calls stream for several seconds; keep slow requests alive
+timeout = 120
+graceful_timeout = 30
+keepalive = 5
+
+# Rate-limit buckets must be shared between workers
+os.environ.setdefault("RATE_LIMIT_STORE", "sqlite")
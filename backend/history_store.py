@@ -0,0 +1,334 @@
+import json
+import os
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+from typing import List, Dict, Any, Optional
+from config import config
+
+def _retention_cutoff(retention_days: int) -> Optional[str]:
+    """Timestamps older than this are dropped (None keeps tasks regardless of age)"""
+    if retention_days <= 0:
+        return None
+    return (datetime.now() - timedelta(days=retention_days)).isoformat()
+
+def _matches(task_record: Dict[str, Any], action_type: Optional[str], status: Optional[str], query: Optional[str]) -> bool:
+    interpretation = task_record.get("interpretation") or {}
+    if action_type and interpretation.get("action_type") != action_type:
+        return False
+    if status and task_record.get("status") != status:
+        return False
+    if query and query.lower() not in (task_record.get("user_input") or "").lower():
+        return False
+    return True
+
+class HistoryStore:
+    """Interface for TaskLinx task history backends"""
+
+    def append(self, user_id: str, task_record: Dict[str, Any]):
+        raise NotImplementedError
+
+    def recent(
+        self,
+        user_id: str,
+        limit: int = 20,
+        before: Optional[str] = None,
+        since: Optional[str] = None,
+        action_type: Optional[str] = None,
+        status: Optional[str] = None,
+        query: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """Return the user's tasks, newest first, matching the filters.
+
+        `before` pages back from a task id. `since` returns only tasks newer
+        than a task id: the oldest `limit` of them, so repeated polling never
+        skips any. Unknown cursors give an empty list.
+        """
+        raise NotImplementedError
+
+    def version(self, user_id: str) -> int:
+        """Number that changes whenever the user's history changes (for ETags)"""
+        raise NotImplementedError
+
+    def get(self, user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        """Return one of the user's tasks by id"""
+        raise NotImplementedError
+
+class SQLiteHistoryStore(HistoryStore):
+    """Task history in SQLite (WAL mode), indexed by user and timestamp and by task id.
+
+    Appends are a single indexed INSERT, so their cost does not depend on the
+    size of the history, and WAL lets readers run alongside a writer.
+    Connections are per thread; concurrent writers are serialized by SQLite.
+    """
+
+    def __init__(self, db_path: str, max_tasks_per_user: int = 100, retention_days: int = 0):
+        self.db_path = db_path
+        self.max_tasks_per_user = max_tasks_per_user
+        self.retention_days = retention_days
+        self._local = threading.local()
+        self._init_schema()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _init_schema(self):
+        conn = self._connect()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS tasks (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                id TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                timestamp TEXT NOT NULL,
+                action_type TEXT,
+                status TEXT,
+                user_input TEXT,
+                record TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_tasks_user_ts ON tasks (user_id, timestamp);
+            CREATE INDEX IF NOT EXISTS idx_tasks_id ON tasks (id);
+        """)
+
+    def _row_values(self, user_id: str, task_record: Dict[str, Any]) -> tuple:
+        interpretation = task_record.get("interpretation") or {}
+        return (
+            task_record["id"],
+            user_id,
+            task_record["timestamp"],
+            interpretation.get("action_type"),
+            task_record.get("status"),
+            task_record.get("user_input"),
+            json.dumps(task_record),
+        )
+
+    def append(self, user_id: str, task_record: Dict[str, Any]):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "INSERT INTO tasks (id, user_id, timestamp, action_type, status, user_input, record) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                self._row_values(user_id, task_record)
+            )
+            self._trim(conn, user_id)
+
+    def _trim(self, conn: sqlite3.Connection, user_id: str):
+        """Drop the user's tasks beyond the retention limits (walks the user index only)"""
+        cutoff = _retention_cutoff(self.retention_days)
+        if cutoff:
+            conn.execute("DELETE FROM tasks WHERE user_id = ? AND timestamp < ?", (user_id, cutoff))
+        if self.max_tasks_per_user > 0:
+            conn.execute(
+                "DELETE FROM tasks WHERE user_id = ? AND seq IN ("
+                "  SELECT seq FROM tasks WHERE user_id = ?"
+                "  ORDER BY timestamp DESC, seq DESC LIMIT -1 OFFSET ?"
+                ")",
+                (user_id, user_id, self.max_tasks_per_user)
+            )
+
+    def _position(self, conn: sqlite3.Connection, user_id: str, task_id: str) -> Optional[tuple]:
+        return conn.execute(
+            "SELECT timestamp, seq FROM tasks WHERE id = ? AND user_id = ? ORDER BY seq DESC LIMIT 1",
+            (task_id, user_id)
+        ).fetchone()
+
+    def recent(
+        self,
+        user_id: str,
+        limit: int = 20,
+        before: Optional[str] = None,
+        since: Optional[str] = None,
+        action_type: Optional[str] = None,
+        status: Optional[str] = None,
+        query: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        conn = self._connect()
+        clauses = ["user_id = ?"]
+        params: List[Any] = [user_id]
+        order = "DESC"
+        
+        # Keyset pagination: seek to the cursor task's position in the user index
+        if before is not None:
+            cursor = self._position(conn, user_id, before)
+            if cursor is None:
+                return []
+            clauses.append("(timestamp, seq) < (?, ?)")
+            params.extend(cursor)
+        if since is not None:
+            cursor = self._position(conn, user_id, since)
+            if cursor is None:
+                return []
+            clauses.append("(timestamp, seq) > (?, ?)")
+            params.extend(cursor)
+            order = "ASC"
+        
+        if action_type:
+            clauses.append("action_type = ?")
+            params.append(action_type)
+        if status:
+            clauses.append("status = ?")
+            params.append(status)
+        if query:
+            escaped = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            clauses.append("user_input LIKE ? ESCAPE '\\'")
+            params.append(f"%{escaped}%")
+        
+        rows = conn.execute(
+            f"SELECT record FROM tasks WHERE {' AND '.join(clauses)} "
+            f"ORDER BY timestamp {order}, seq {order} LIMIT ?",
+            (*params, limit)
+        ).fetchall()
+        records = [json.loads(row[0]) for row in rows]
+        return records[::-1] if order == "ASC" else records
+
+    def version(self, user_id: str) -> int:
+        row = self._connect().execute("SELECT MAX(seq) FROM tasks WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] or 0
+
+    def get(self, user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT record FROM tasks WHERE id = ? AND user_id = ? ORDER BY seq DESC LIMIT 1",
+            (task_id, user_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _retained(self, records: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if self.max_tasks_per_user > 0:
+            records = records[-self.max_tasks_per_user:]
+        cutoff = _retention_cutoff(self.retention_days)
+        if cutoff:
+            records = [record for record in records if record.get("timestamp", "") >= cutoff]
+        return records
+
+    def import_records(self, history_data: Dict[str, List[Dict[str, Any]]]) -> int:
+        """Bulk-load {user_id: [task_record, ...]} into an empty store, in a single transaction.
+
+        The emptiness check runs inside the same IMMEDIATE transaction, so when
+        several workers migrate at once only the first imports. Returns the
+        number of records imported.
+        """
+        conn = self._connect()
+        imported = 0
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if conn.execute("SELECT 1 FROM tasks LIMIT 1").fetchone() is not None:
+                return 0
+            for user_id, records in history_data.items():
+                rows = [self._row_values(user_id, record) for record in self._retained(records)]
+                conn.executemany(
+                    "INSERT INTO tasks (id, user_id, timestamp, action_type, status, user_input, record) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+                imported += len(rows)
+        return imported
+
+class MemoryHistoryStore(HistoryStore):
+    """Process-local task history, for development and benchmarks"""
+
+    def __init__(self, max_tasks_per_user: int = 100, retention_days: int = 0):
+        self.max_tasks_per_user = max_tasks_per_user
+        self.retention_days = retention_days
+        self._tasks: Dict[str, List[Dict[str, Any]]] = {}
+        self._by_id: Dict[tuple, Dict[str, Any]] = {}
+        self._versions: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def append(self, user_id: str, task_record: Dict[str, Any]):
+        with self._lock:
+            user_tasks = self._tasks.setdefault(user_id, [])
+            user_tasks.append(task_record)
+            self._by_id[(user_id, task_record["id"])] = task_record
+            self._versions[user_id] = self._versions.get(user_id, 0) + 1
+            if self.max_tasks_per_user > 0 and len(user_tasks) > 2 * self.max_tasks_per_user:
+                for dropped in user_tasks[:-self.max_tasks_per_user]:
+                    self._by_id.pop((user_id, dropped["id"]), None)
+                del user_tasks[:-self.max_tasks_per_user]
+
+    def _visible(self, user_id: str) -> List[Dict[str, Any]]:
+        user_tasks = self._tasks.get(user_id, [])
+        if self.max_tasks_per_user > 0:
+            user_tasks = user_tasks[-self.max_tasks_per_user:]
+        cutoff = _retention_cutoff(self.retention_days)
+        if cutoff:
+            user_tasks = [task for task in user_tasks if task["timestamp"] >= cutoff]
+        return user_tasks
+
+    def recent(
+        self,
+        user_id: str,
+        limit: int = 20,
+        before: Optional[str] = None,
+        since: Optional[str] = None,
+        action_type: Optional[str] = None,
+        status: Optional[str] = None,
+        query: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        with self._lock:
+            user_tasks = self._visible(user_id)
+            ids = [task["id"] for task in user_tasks]
+            if before is not None:
+                if before not in ids:
+                    return []
+                user_tasks = user_tasks[:len(ids) - 1 - ids[::-1].index(before)]
+            if since is not None:
+                if since not in ids:
+                    return []
+                user_tasks = user_tasks[len(ids) - ids[::-1].index(since):]
+            matching = [task for task in user_tasks if _matches(task, action_type, status, query)]
+            if since is not None:
+                return matching[:limit][::-1]
+            return matching[-limit:][::-1]
+
+    def version(self, user_id: str) -> int:
+        return self._versions.get(user_id, 0)
+
+    def get(self, user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            record = self._by_id.get((user_id, task_id))
+            # Trimmed lazily, so an indexed task may already be past retention
+            if record is None or not any(task is record for task in self._visible(user_id)):
+                return None
+            return record
+
+def migrate_json_history(store: SQLiteHistoryStore, json_path: str) -> int:
+    """One-shot import of the legacy tasks.json file into the SQLite store.
+
+    The JSON file is renamed to ``<name>.migrated`` afterwards so the import
+    never runs twice. Returns the number of records imported.
+    """
+    try:
+        with open(json_path, 'r') as f:
+            history_data = json.load(f)
+    except FileNotFoundError:
+        return 0
+
+    imported = store.import_records(history_data)
+
+    try:
+        os.replace(json_path, f"{json_path}.migrated")
+    except FileNotFoundError:
+        # Another worker finished the migration first
+        pass
+    return imported
+
+def create_history_store() -> HistoryStore:
+    """Build the history backend selected by config.HISTORY_BACKEND"""
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+
+    if config.HISTORY_BACKEND == "memory":
+        return MemoryHistoryStore(config.HISTORY_MAX_TASKS_PER_USER, config.HISTORY_RETENTION_DAYS)
+
+    if config.HISTORY_BACKEND == "sqlite":
+        store = SQLiteHistoryStore(config.HISTORY_DB_FILE, config.HISTORY_MAX_TASKS_PER_USER, config.HISTORY_RETENTION_DAYS)
+        migrate_json_history(store, config.TASKS_FILE)
+        return store
+
+    raise ValueError(f"Unknown history backend: {config.HISTORY_BACKEND}")
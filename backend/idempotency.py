@@ -0,0 +1,191 @@
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Optional, Tuple
+from cache import TTLCache
+from config import config
+from io_pool import io_pool
+from metrics import metrics
+
+class IdempotencyKeyConflict(Exception):
+    pass
+
+class SQLiteIdempotencyStore:
+    """Idempotency claims and stored responses in SQLite, shared by all worker processes.
+
+    A request claims its key with a 'running' row; duplicates arriving at
+    any worker replay the stored response once it is 'done'. A claim older
+    than claim_timeout belongs to a worker that died and may be taken over.
+    """
+
+    def __init__(self, db_path: str, claim_timeout: float):
+        self.db_path = db_path
+        self.claim_timeout = claim_timeout
+        self._next_prune = 0.0
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS idempotency (
+                key TEXT PRIMARY KEY,
+                fingerprint TEXT NOT NULL,
+                -- running or done
+                status TEXT NOT NULL,
+                response TEXT,
+                claimed_at REAL NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def claim(self, key: str, fingerprint: str, ttl: float, now: float) -> Tuple[str, Any]:
+        """("claimed", None) if the caller should execute, ("done", response) to replay, or ("running", None) to wait"""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            if now >= self._next_prune:
+                self._next_prune = now + 60
+                conn.execute("DELETE FROM idempotency WHERE expires <= ?", (now,))
+            row = conn.execute(
+                "SELECT fingerprint, status, response, claimed_at FROM idempotency WHERE key = ? AND expires > ?",
+                (key, now)
+            ).fetchone()
+            if row is not None:
+                stored_fingerprint, status, response, claimed_at = row
+                if stored_fingerprint != fingerprint:
+                    raise IdempotencyKeyConflict("Idempotency-Key was already used with a different request")
+                if status == "done":
+                    return "done", json.loads(response)
+                if claimed_at > now - self.claim_timeout:
+                    return "running", None
+            conn.execute(
+                "INSERT OR REPLACE INTO idempotency (key, fingerprint, status, response, claimed_at, expires) "
+                "VALUES (?, ?, 'running', NULL, ?, ?)",
+                (key, fingerprint, now, now + ttl)
+            )
+        return "claimed", None
+
+    def complete(self, key: str, response: Any, ttl: float):
+        now = time.time()
+        self._connect().execute(
+            "UPDATE idempotency SET status = 'done', response = ?, expires = ? WHERE key = ?",
+            (json.dumps(response), now + ttl, key)
+        )
+
+    def release(self, key: str):
+        """Drop a claim whose execution failed, so a retry runs again"""
+        self._connect().execute("DELETE FROM idempotency WHERE key = ? AND status = 'running'", (key,))
+
+class IdempotencyCache:
+    """Deduplicates task submissions per user, across all worker processes.
+
+    With an Idempotency-Key, the first execution's outcome is replayed for
+    IDEMPOTENCY_TTL seconds. Without one, identical requests (same body)
+    are coalesced for DEDUP_WINDOW_SECONDS, but only while in flight or if
+    they succeeded, so a failed task can simply be resubmitted. Concurrent
+    duplicates await the first execution instead of running again: in the
+    same process through its future, in other workers by polling the
+    shared store until the response is stored.
+    """
+
+    def __init__(self, store: SQLiteIdempotencyStore, maxsize: int, key_ttl: float, dedup_window: float, poll_interval: float):
+        self.store = store
+        self.key_ttl = key_ttl
+        self.dedup_window = dedup_window
+        self.poll_interval = poll_interval
+        # Entry: (request fingerprint, future resolving to the stored response)
+        self._entries = TTLCache(maxsize=maxsize, ttl=key_ttl)
+        self.replays = 0
+        metrics.register_cache("idempotency", self._entries)
+
+    @staticmethod
+    def fingerprint(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    async def run(
+        self,
+        user_id: str,
+        idempotency_key: Optional[str],
+        fingerprint: str,
+        execute: Callable[[], Awaitable[Any]],
+        succeeded: Callable[[Any], bool] = lambda result: True
+    ) -> Tuple[Any, bool]:
+        """Return (response, replayed): a stored/in-flight response, else execute() once"""
+        if idempotency_key:
+            key, ttl = f"{user_id}:key:{idempotency_key}", self.key_ttl
+        else:
+            key, ttl = f"{user_id}:body:{fingerprint}", self.dedup_window
+
+        entry = self._entries.get(key)
+        if entry is not None:
+            stored_fingerprint, future = entry
+            if stored_fingerprint != fingerprint:
+                raise IdempotencyKeyConflict("Idempotency-Key was already used with a different request")
+            self.replays += 1
+            # Shielded so a disconnecting duplicate does not cancel the original execution
+            return await asyncio.shield(future), True
+
+        future = asyncio.get_running_loop().create_future()
+        self._entries.set(key, (fingerprint, future), ttl=ttl)
+        claimed = False
+        try:
+            while True:
+                state, response = await io_pool.run(self.store.claim, key, fingerprint, ttl, time.time())
+                if state == "done":
+                    # Executed by another worker
+                    self.replays += 1
+                    future.set_result(response)
+                    return response, True
+                if state == "claimed":
+                    claimed = True
+                    break
+                await asyncio.sleep(self.poll_interval)
+            result = await execute()
+        except asyncio.CancelledError:
+            self._entries.pop(key)
+            future.cancel()
+            if claimed:
+                await asyncio.shield(io_pool.run(self.store.release, key))
+            raise
+        except Exception as e:
+            # Nothing is stored for errors: duplicates see this error, later retries run again
+            self._entries.pop(key)
+            if claimed:
+                await io_pool.run(self.store.release, key)
+            future.set_exception(e)
+            future.exception()  # Mark retrieved when no duplicate is waiting
+            raise
+
+        future.set_result(result)
+        if not idempotency_key and not succeeded(result):
+            self._entries.pop(key)
+            await io_pool.run(self.store.release, key)
+        else:
+            await io_pool.run(self.store.complete, key, result, ttl)
+        return result, False
+
+    def stats(self):
+        return {**self._entries.stats(), "replays": self.replays}
+
+def create_idempotency_cache() -> IdempotencyCache:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    return IdempotencyCache(
+        store=SQLiteIdempotencyStore(config.IDEMPOTENCY_DB_FILE, config.IDEMPOTENCY_CLAIM_TIMEOUT),
+        maxsize=config.IDEMPOTENCY_CACHE_SIZE,
+        key_ttl=config.IDEMPOTENCY_TTL,
+        dedup_window=config.DEDUP_WINDOW_SECONDS,
+        poll_interval=config.IDEMPOTENCY_POLL_INTERVAL
+    )
+
+idempotency = create_idempotency_cache()
@@ -0,0 +1,47 @@
+import secrets
+import threading
+import time
+
+CROCKFORD_BASE32 = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+RANDOM_BITS = 80
+
+class ULIDGenerator:
+    """Monotonic ULIDs: 48-bit millisecond timestamp + 80 random bits.
+
+    IDs sort lexicographically by creation time. Within one millisecond the
+    random part is incremented, so IDs from this process never collide and
+    stay ordered; across processes the 80 random bits make collisions
+    practically impossible.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_ms = 0
+        self._last_random = 0
+
+    def new(self) -> str:
+        with self._lock:
+            now_ms = int(time.time() * 1000)
+            if now_ms <= self._last_ms:
+                now_ms = self._last_ms
+                random_part = self._last_random + 1
+                if random_part >> RANDOM_BITS:
+                    # Random space for this millisecond exhausted; borrow the next one
+                    now_ms += 1
+                    random_part = secrets.randbits(RANDOM_BITS)
+            else:
+                random_part = secrets.randbits(RANDOM_BITS)
+            self._last_ms = now_ms
+            self._last_random = random_part
+
+        value = (now_ms << RANDOM_BITS) | random_part
+        chars = []
+        for _ in range(26):
+            chars.append(CROCKFORD_BASE32[value & 0x1F])
+            value >>= 5
+        return "".join(reversed(chars))
+
+ulid_generator = ULIDGenerator()
+
+def new_task_id() -> str:
+    return f"task_{ulid_generator.new()}"
@@ -0,0 +1,227 @@
+import re
+from datetime import date, datetime, time, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+EMAIL_ADDRESS = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+
+EMAIL_COMMAND = re.compile(
+    rf"^(?:please\s+)?(?:send\s+(?:an?\s+)?)?e-?mail\s+(?:to\s+)?(?P<recipient>{EMAIL_ADDRESS})\s+"
+    rf"(?:with\s+)?(?:the\s+)?subject\s*:?\s*(?P<subject>.+?)\s+"
+    rf"(?:saying|that says|with (?:the )?message|message|body)\s*:?\s*(?P<message>.+)$",
+    re.IGNORECASE | re.DOTALL
+)
+
+CALENDAR_NOUNS = r"(?:meeting|event|call|sync|appointment|standup|stand-up|1:1|one-on-one|lunch|interview|review)"
+# "Team sync tomorrow at 3pm": the event itself leads, within the first few words
+CALENDAR_NOUN_LED = re.compile(
+    rf"^(?:please\s+)?(?:(?:a|an|the|my|our)\s+)?(?:[\w'-]+\s+){{0,2}}{CALENDAR_NOUNS}\b",
+    re.IGNORECASE
+)
+# Changing, asking or talking about an existing event is not a create; leave those to the LLM
+CALENDAR_NOT_CREATE = re.compile(
+    r"^(?:please\s+)?(?:cancel|call off|move|reschedule|postpone|push|shift|delete|remove|drop|change|update|"
+    r"tell|ask|remind|invite|notify|confirm|check)\b|\blet\s+(?:\S+\s+){1,2}know\b"
+    # Questions ("What meeting do I have ...", "Any meeting ...")
+    r"|^(?:what|when|where|which|who|why|how|any|do|does|did|is|are|was|were|am|can|could|will|would|should|have|has)\b|\?$"
+    # Statements about an event's status ("The meeting ... is cancelled", "Lunch ... got moved")
+    r"|\b(?:is|are|was|were|got|gets|been|moved|cancell?ed|rescheduled|postponed|pushed|delayed|changed|called off)\b"
+    # "Add Bob to the review ...": an attendee, not a new event
+    rf"|^(?:please\s+)?add\s+.+?\s+to\s+(?:the|my|our)\s+(?:[\w'-]+\s+)?{CALENDAR_NOUNS}\b",
+    re.IGNORECASE
+)
+# "Schedule an email ...": a scheduled message, which needs the LLM's schedule field
+SCHEDULED_MESSAGE = re.compile(r"\b(?:e-?mails?|messages?|mail|texts?|notes?)\b", re.IGNORECASE)
+CALENDAR_PREFIX = re.compile(
+    r"^(?:please\s+)?(?:create|schedule|add|book|set up|put)\s+(?:an?\s+)?(?:new\s+)?"
+    r"(?:calendar\s+)?(?:(?:event|entry)\s+)?(?:(?:for|called|titled|named)\s+)?",
+    re.IGNORECASE
+)
+CALENDAR_SUFFIX = re.compile(r"\s+(?:on|to|in)\s+(?:my\s+|the\s+)?calendar$", re.IGNORECASE)
+DANGLING_WORDS = re.compile(r"(?:\s+(?:on|at|for|from|,))+$", re.IGNORECASE)
+
+TIME_12H = re.compile(r"\b(?:at\s+)?(?P<hour>\d{1,2})(?::(?P<minute>\d{2}))?\s*(?P<meridiem>am|pm|a\.m\.|p\.m\.)(?!\w)", re.IGNORECASE)
+TIME_24H = re.compile(r"\bat\s+(?P<hour>\d{1,2}):(?P<minute>\d{2})\b", re.IGNORECASE)
+TIME_NOON = re.compile(r"\b(?:at\s+)?noon\b", re.IGNORECASE)
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+DAY_RELATIVE = re.compile(r"\b(?P<day>today|tonight|tomorrow)\b", re.IGNORECASE)
+DAY_WEEKDAY = re.compile(r"\b(?:on\s+)?(?P<next>next\s+)?(?P<weekday>" + "|".join(WEEKDAYS) + r")\b", re.IGNORECASE)
+DAY_ISO = re.compile(r"\b(?:on\s+)?(?P<date>\d{4}-\d{2}-\d{2})\b")
+
+# Recurring or "do it later" requests need the LLM's schedule field
+SCHEDULE_HINT = re.compile(
+    r"\b(?:every|each|daily|weekly|monthly|weekdays|recurring|remind(?:er)?)\b|\b(?:send|email) (?:it|this) (?:at|on|tomorrow|later)\b",
+    re.IGNORECASE
+)
+
+DURATION = re.compile(
+    r"\bfor\s+(?P<amount>\d+(?:\.\d+)?|an?|one|half an?)\s*(?P<unit>minutes?|mins?|hours?|hrs?|h)\b",
+    re.IGNORECASE
+)
+
+class IntentParser:
+    """Deterministic parser for simple, unambiguous email and calendar commands.
+
+    Returns interpretations in the same schema as the LLM (action_type,
+    parameters, confidence, reasoning) or None when the input is not one of
+    the shapes it understands. Anything ambiguous gets a low confidence so
+    the caller falls back to the LLM.
+    """
+
+    def parse(self, user_input: str, now: Optional[datetime] = None) -> Optional[Dict[str, Any]]:
+        text = " ".join(user_input.split())
+        now = now or datetime.now()
+        if SCHEDULE_HINT.search(text):
+            return None
+        return self._parse_email(text) or self._parse_calendar(text, now)
+
+    def _parse_email(self, text: str) -> Optional[Dict[str, Any]]:
+        match = EMAIL_COMMAND.match(text)
+        if not match:
+            return None
+
+        subject = match.group("subject").strip().strip("\"'")
+        message = match.group("message").strip().strip("\"'")
+        if not subject or not message:
+            return None
+
+        return {
+            "action_type": "email",
+            "parameters": {
+                "recipient": match.group("recipient"),
+                "subject": subject,
+                "message": message
+            },
+            "confidence": 0.95,
+            "reasoning": "Matched explicit email command (recipient, subject and message)"
+        }
+
+    def _parse_calendar(self, text: str, now: datetime) -> Optional[Dict[str, Any]]:
+        if re.search(EMAIL_ADDRESS, text) or re.match(r"^(?:send|e-?mail|reply|write)\b", text, re.IGNORECASE):
+            return None
+        if CALENDAR_NOT_CREATE.search(text) or SCHEDULED_MESSAGE.search(text):
+            return None
+        # Only an imperative create ("Schedule a meeting ...") is sure enough to skip the LLM;
+        # a bare noun-led phrase ("Team sync tomorrow at 3pm") stays below the fast-path threshold
+        imperative = CALENDAR_PREFIX.match(text) is not None
+        if not imperative and not CALENDAR_NOUN_LED.match(text):
+            return None
+
+        spans = []
+        clock, time_span = self._find_time(text)
+        if time_span:
+            spans.append(time_span)
+        day, day_span = self._find_day(text, now)
+        if day_span:
+            spans.append(day_span)
+        duration, duration_span = self._find_duration(text)
+        if duration_span:
+            spans.append(duration_span)
+
+        title = self._extract_title(text, spans)
+        if clock is None or not title:
+            return None
+
+        confidence = 0.9
+        reasoning = "Matched calendar command with explicit day and time"
+        if day is None:
+            # No day given: the next occurrence of that time, which is a guess
+            day = now.date() if now.time() < clock else now.date() + timedelta(days=1)
+            confidence = 0.8
+            reasoning = "Matched calendar command with a time but no day"
+        if not imperative:
+            confidence -= 0.1
+            reasoning += ", without a create verb"
+
+        start_dt = datetime.combine(day, clock)
+        end_dt = start_dt + (duration or timedelta(hours=1))
+
+        return {
+            "action_type": "calendar",
+            "parameters": {
+                "title": title,
+                "start_time": start_dt.isoformat(),
+                "end_time": end_dt.isoformat(),
+                "description": ""
+            },
+            "confidence": confidence,
+            "reasoning": reasoning
+        }
+
+    def _find_time(self, text: str) -> Tuple[Optional[time], Optional[Tuple[int, int]]]:
+        match = TIME_12H.search(text)
+        if match:
+            hour = int(match.group("hour"))
+            minute = int(match.group("minute") or 0)
+            if not 1 <= hour <= 12 or minute > 59:
+                return None, None
+            is_pm = match.group("meridiem").lower().startswith("p")
+            hour = hour % 12 + (12 if is_pm else 0)
+            return time(hour, minute), match.span()
+
+        match = TIME_24H.search(text)
+        if match:
+            hour, minute = int(match.group("hour")), int(match.group("minute"))
+            if hour > 23 or minute > 59:
+                return None, None
+            return time(hour, minute), match.span()
+
+        match = TIME_NOON.search(text)
+        if match:
+            return time(12, 0), match.span()
+
+        return None, None
+
+    def _find_day(self, text: str, now: datetime) -> Tuple[Optional[date], Optional[Tuple[int, int]]]:
+        match = DAY_RELATIVE.search(text)
+        if match:
+            offset = 1 if match.group("day").lower() == "tomorrow" else 0
+            return now.date() + timedelta(days=offset), match.span()
+
+        match = DAY_WEEKDAY.search(text)
+        if match:
+            target = WEEKDAYS.index(match.group("weekday").lower())
+            days_ahead = (target - now.weekday()) % 7
+            if days_ahead == 0 or match.group("next"):
+                days_ahead = days_ahead or 7
+            return now.date() + timedelta(days=days_ahead), match.span()
+
+        match = DAY_ISO.search(text)
+        if match:
+            try:
+                return datetime.strptime(match.group("date"), "%Y-%m-%d").date(), match.span()
+            except ValueError:
+                return None, None
+
+        return None, None
+
+    def _find_duration(self, text: str) -> Tuple[Optional[timedelta], Optional[Tuple[int, int]]]:
+        match = DURATION.search(text)
+        if not match:
+            return None, None
+
+        amount_text = match.group("amount").lower()
+        if amount_text.startswith("half"):
+            amount = 0.5
+        elif amount_text in ("a", "an", "one"):
+            amount = 1.0
+        else:
+            amount = float(amount_text)
+
+        unit = match.group("unit").lower()
+        minutes = amount if unit.startswith("m") else amount * 60
+        if minutes <= 0:
+            return None, None
+        return timedelta(minutes=minutes), match.span()
+
+    def _extract_title(self, text: str, spans: List[Tuple[int, int]]) -> str:
+        # Cut the date/time/duration phrases out, back to front so offsets stay valid
+        for start, end in sorted(spans, reverse=True):
+            text = text[:start] + " " + text[end:]
+        title = " ".join(text.split())
+        title = CALENDAR_PREFIX.sub("", title)
+        title = CALENDAR_SUFFIX.sub("", title)
+        title = DANGLING_WORDS.sub("", title).strip(" ,.")
+        return title[:1].upper() + title[1:]
+
+intent_parser = IntentParser()
@@ -0,0 +1,98 @@
+import copy
+import json
+import os
+import re
+import time
+from datetime import date
+from typing import Dict, Any, Optional
+from cache import TTLCache
+
+# Inputs mentioning dates or times are resolved by the model against the
+# current date, so their cache entries are only valid for that day
+TIME_SENSITIVE_PATTERN = re.compile(
+    r"\b(today|tonight|tomorrow|yesterday|now|next|this|last|week|weekend|month|year|"
+    r"monday|tuesday|wednesday|thursday|friday|saturday|sunday|"
+    r"morning|afternoon|evening|noon|midnight|am|pm|in \d+|\d{1,2}(:\d{2})?\s*(am|pm))\b"
+)
+
+# Offsets from the current time of day ("in 2 hours", "now") resolve to a different
+# absolute time on every call, so interpretations of these inputs are never cached
+SUB_DAY_PATTERN = re.compile(
+    r"\b(now|asap|soon|later|tonight|in (\d+|an?|a few|a couple of|half an?) (minutes?|mins?|hours?|hrs?))\b"
+)
+
+class InterpretationCache:
+    """Exact-match cache of task interpretations keyed on normalized input"""
+
+    def __init__(self, maxsize: int, ttl: float, persist_path: Optional[str] = None):
+        self.ttl = ttl
+        self.persist_path = persist_path
+        self._cache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.time_sensitive_lookups = 0
+        if persist_path:
+            self.load()
+
+    @staticmethod
+    def normalize(user_input: str) -> str:
+        return " ".join(user_input.lower().split()).rstrip(".!?")
+
+    def make_key(self, user_input: str, today: date, timezone: Optional[str] = None) -> str:
+        """Key on normalized input; time-sensitive inputs also key on the user's local date and timezone"""
+        normalized = self.normalize(user_input)
+        if TIME_SENSITIVE_PATTERN.search(normalized):
+            return f"{today.isoformat()}@{timezone or ''}|{normalized}"
+        return f"|{normalized}"
+
+    def is_cacheable(self, user_input: str, interpretation: Optional[Dict[str, Any]] = None) -> bool:
+        """False for sub-day relative inputs and for scheduled interpretations (their run_at goes stale)"""
+        if SUB_DAY_PATTERN.search(self.normalize(user_input)):
+            return False
+        return not (interpretation and interpretation.get("schedule"))
+
+    def get(self, user_input: str, today: date, timezone: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        if not self.is_cacheable(user_input):
+            return None
+        key = self.make_key(user_input, today, timezone)
+        if not key.startswith("|"):
+            self.time_sensitive_lookups += 1
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        # Callers annotate interpretations, so never hand out the cached object
+        return copy.deepcopy(entry[1])
+
+    def set(self, user_input: str, interpretation: Dict[str, Any], today: date, timezone: Optional[str] = None):
+        if not self.is_cacheable(user_input, interpretation):
+            return
+        self._cache.set(self.make_key(user_input, today, timezone), (time.time(), copy.deepcopy(interpretation)))
+
+    def stats(self) -> Dict[str, Any]:
+        return {**self._cache.stats(), "time_sensitive_lookups": self.time_sensitive_lookups}
+
+    def load(self):
+        """Restore unexpired entries from the persistence file"""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, 'r') as f:
+                entries = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+
+        now = time.time()
+        for key, (created_at, interpretation) in entries.items():
+            # Time-sensitive entries from earlier days can no longer match and age out via LRU/TTL
+            remaining = self.ttl - (now - created_at)
+            if remaining <= 0:
+                continue
+            self._cache.set(key, (created_at, interpretation), ttl=remaining)
+
+    def save(self):
+        """Write live entries to the persistence file (called on shutdown)"""
+        if not self.persist_path:
+            return
+        entries = {key: list(entry) for key, entry in self._cache.items()}
+        tmp_path = f"{self.persist_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(entries, f)
+        os.replace(tmp_path, self.persist_path)
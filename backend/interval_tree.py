@@ -0,0 +1,139 @@
+import random
+from typing import Dict, Hashable, List, Optional, Tuple
+
+# (start, end, key); intervals are half-open [start, end)
+Interval = Tuple[float, float, Hashable]
+
+class _Node:
+    __slots__ = ("start", "end", "key", "priority", "left", "right", "max_end")
+
+    def __init__(self, start: float, end: float, key: Hashable):
+        self.start = start
+        self.end = end
+        self.key = key
+        self.priority = random.random()
+        self.left: Optional["_Node"] = None
+        self.right: Optional["_Node"] = None
+        self.max_end = end
+
+    def update(self):
+        self.max_end = max(
+            self.end,
+            self.left.max_end if self.left else self.end,
+            self.right.max_end if self.right else self.end
+        )
+
+class IntervalTree:
+    """Augmented treap of intervals ordered by start, each subtree tracking its latest end.
+
+    Insert, remove and "first overlap" run in O(log n) expected time;
+    subtrees that end before a query starts are never visited. Intervals
+    are identified by key, so an updated one can be replaced in place.
+    """
+
+    def __init__(self):
+        self._root: Optional[_Node] = None
+        self._intervals: Dict[Hashable, Tuple[float, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._intervals)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._intervals
+
+    @staticmethod
+    def _order(start: float, key: Hashable) -> tuple:
+        # Ties on start are broken by key, so every interval has a unique position
+        return (start, str(key))
+
+    def _split(self, node: Optional[_Node], order: tuple) -> Tuple[Optional[_Node], Optional[_Node]]:
+        """(nodes ordered before `order`, the rest)"""
+        if node is None:
+            return None, None
+        if self._order(node.start, node.key) < order:
+            node.right, right = self._split(node.right, order)
+            node.update()
+            return node, right
+        left, node.left = self._split(node.left, order)
+        node.update()
+        return left, node
+
+    def _merge(self, left: Optional[_Node], right: Optional[_Node]) -> Optional[_Node]:
+        if left is None or right is None:
+            return left or right
+        if left.priority > right.priority:
+            left.right = self._merge(left.right, right)
+            left.update()
+            return left
+        right.left = self._merge(left, right.left)
+        right.update()
+        return right
+
+    def add(self, start: float, end: float, key: Hashable):
+        """Insert [start, end), replacing any interval already stored under key"""
+        if end <= start:
+            raise ValueError("Interval must end after it starts")
+        self.remove(key)
+        node = _Node(start, end, key)
+        left, right = self._split(self._root, self._order(start, key))
+        self._root = self._merge(self._merge(left, node), right)
+        self._intervals[key] = (start, end)
+
+    def remove(self, key: Hashable) -> bool:
+        interval = self._intervals.pop(key, None)
+        if interval is None:
+            return False
+        order = self._order(interval[0], key)
+        left, rest = self._split(self._root, order)
+        # `rest` starts with the node itself; drop it
+        _, right = self._split(rest, (order[0], order[1] + "\0"))
+        self._root = self._merge(left, right)
+        return True
+
+    def keys(self) -> List[Hashable]:
+        return list(self._intervals)
+
+    def clear(self):
+        self._root = None
+        self._intervals.clear()
+
+    def first_overlap(self, start: float, end: float) -> Optional[Interval]:
+        """The earliest-starting interval overlapping [start, end), if any"""
+        node = self._root
+        while node is not None:
+            if node.left is not None and node.left.max_end > start:
+                # Something on the left ends after `start`: if it doesn't overlap the range,
+                # it starts at or after `end`, and so does everything after it
+                node = node.left
+            elif node.start < end and node.end > start:
+                return node.start, node.end, node.key
+            elif node.start >= end:
+                return None
+            else:
+                node = node.right
+        return None
+
+    def overlaps(self, start: float, end: float) -> List[Interval]:
+        """All intervals overlapping [start, end), by start; only subtrees that can overlap are visited"""
+        results: List[Interval] = []
+        stack = [self._root]
+        while stack:
+            node = stack.pop()
+            if node is None or node.max_end <= start:
+                continue
+            if node.start < end:
+                stack.append(node.right)
+                if node.end > start:
+                    results.append((node.start, node.end, node.key))
+            stack.append(node.left)
+        return sorted(results, key=lambda interval: interval[0])
+
+    def next_free(self, start: float, duration: float, until: float) -> Optional[float]:
+        """Earliest t >= start, with t + duration <= until, such that [t, t + duration) is free"""
+        t = start
+        while t + duration <= until:
+            busy = self.first_overlap(t, t + duration)
+            if busy is None:
+                return t
+            t = busy[1]
+        return None
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, Set
+from config import config
+
+class InvalidationBus:
+    """Cross-process cache invalidation over a shared SQLite table.
+
+    publish() appends (channel, key) rows; a daemon thread in every worker
+    polls for rows it has not seen and calls the channel's subscribers, so
+    each process drops its cached copy of, e.g., a user's credentials after
+    another process refreshed them. A process skips its own messages; it
+    updates its caches directly.
+    """
+
+    def __init__(self, db_path: str, poll_interval: float, retention: float = 3600):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._subscribers: Dict[str, List[Callable[[str], None]]] = {}
+        self._published: Set[int] = set()
+        self._local = threading.local()
+        self._stop = threading.Event()
+        self._thread = None
+        conn = self._connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS invalidations ("
+            "seq INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, key TEXT NOT NULL, created REAL NOT NULL)"
+        )
+        self._last_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM invalidations").fetchone()[0]
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def subscribe(self, channel: str, callback: Callable[[str], None]):
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def publish(self, channel: str, key: str):
+        cursor = self._connect().execute(
+            "INSERT INTO invalidations (channel, key, created) VALUES (?, ?, ?)", (channel, key, time.time())
+        )
+        if self._thread is not None:
+            self._published.add(cursor.lastrowid)
+
+    def poll(self):
+        """Deliver messages published since the last poll"""
+        conn = self._connect()
+        rows = conn.execute(
+            "SELECT seq, channel, key FROM invalidations WHERE seq > ? ORDER BY seq", (self._last_seq,)
+        ).fetchall()
+        for seq, channel, key in rows:
+            self._last_seq = seq
+            if seq in self._published:
+                self._published.discard(seq)
+                continue
+            for callback in self._subscribers.get(channel, []):
+                try:
+                    callback(key)
+                except Exception as e:
+                    print(f"Invalidation handler for {channel} failed: {e}")
+
+    def _prune(self):
+        self._connect().execute("DELETE FROM invalidations WHERE created < ?", (time.time() - self.retention,))
+
+    def _run(self):
+        last_prune = time.monotonic()
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.poll()
+                if time.monotonic() - last_prune > self.retention / 4:
+                    self._prune()
+                    last_prune = time.monotonic()
+            except sqlite3.Error as e:
+                print(f"Invalidation poll failed: {e}")
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="tasklinx-invalidation", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+def create_invalidation_bus() -> InvalidationBus:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    return InvalidationBus(config.INVALIDATION_DB_FILE, config.INVALIDATION_POLL_INTERVAL)
+
+invalidation_bus = create_invalidation_bus()
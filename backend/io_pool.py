@@ -0,0 +1,25 @@
+import asyncio
+import contextvars
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable
+from config import config
+
+class IOPool:
+    """Bounded thread pool for the blocking Google API and storage calls.
+
+    Keeps the event loop free while googleapiclient, httplib2 and sqlite do
+    their synchronous I/O, and caps how many of those run at once.
+    """
+
+    def __init__(self, max_workers: int):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="tasklinx-io")
+
+    async def run(self, func: Callable[..., Any], *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        # Carry context variables (request-scoped state) into the worker thread
+        context = contextvars.copy_context()
+        call = functools.partial(context.run, func, *args, **kwargs)
+        return await loop.run_in_executor(self._executor, call)
+
+io_pool = IOPool(config.IO_POOL_WORKERS)
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, List, Optional, Set
+from cache import TTLCache
+from config import config
+from ids import new_task_id
+from io_pool import io_pool
+from sse import format_event
+from task_service import task_service
+
+TERMINAL_STATES = ("done", "failed")
+
+class QueueFullError(Exception):
+    pass
+
+class Job:
+    """A task submitted in async mode; its id doubles as the task id"""
+
+    def __init__(self, job_id: str, user_id: str, user_input: str, timezone: Optional[str] = None):
+        self.id = job_id
+        self.user_id = user_id
+        self.user_input = user_input
+        self.timezone = timezone
+        self.status = "queued"
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = datetime.now().isoformat()
+        self.updated_at = self.created_at
+        # Orders the snapshots written to the shared store
+        self.seq = 0
+        self._subscribers: List[asyncio.Queue] = []
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "user_input": self.user_input,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+            "result": self.result,
+            "error": self.error
+        }
+
+class SQLiteJobStore:
+    """Job snapshots in SQLite, shared by all worker processes.
+
+    A job runs in the worker that accepted it; the others answer
+    GET /tasks/{id} and its event stream from here.
+    """
+
+    def __init__(self, db_path: str, result_ttl: float):
+        self.db_path = db_path
+        self.result_ttl = result_ttl
+        self._next_prune = 0.0
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                snapshot TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                expires REAL NOT NULL
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def put(self, user_id: str, snapshot: Dict[str, Any], seq: int):
+        """Store a snapshot unless a later one (higher seq) is already there"""
+        now = time.time()
+        conn = self._connect()
+        conn.execute(
+            "INSERT INTO jobs (id, user_id, snapshot, seq, expires) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(id) DO UPDATE SET snapshot = excluded.snapshot, seq = excluded.seq, "
+            "expires = excluded.expires WHERE excluded.seq > jobs.seq",
+            (snapshot["id"], user_id, json.dumps(snapshot, default=str), seq, now + self.result_ttl)
+        )
+        if now >= self._next_prune:
+            self._next_prune = now + 60
+            conn.execute("DELETE FROM jobs WHERE expires <= ?", (now,))
+
+    def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connect().execute(
+            "SELECT snapshot FROM jobs WHERE id = ? AND user_id = ? AND expires > ?", (job_id, user_id, time.time())
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+class JobQueue:
+    """In-process queue and worker pool for async-mode task execution.
+
+    Workers run TaskService.execute_task and publish status changes
+    (queued -> interpreting -> executing -> done/failed) to pollers and
+    Server-Sent Events subscribers. Every change is also written to the
+    shared job store, so any worker process can report on any job.
+    Finished jobs stay queryable for JOB_RESULT_TTL seconds; after that
+    the task is only in history.
+    """
+
+    def __init__(self, store: SQLiteJobStore, workers: int, max_pending: int, result_ttl: int, poll_interval: float):
+        self.store = store
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        self._jobs = TTLCache(maxsize=max(max_pending * 4, 1024), ttl=result_ttl)
+        self._worker_tasks: List[asyncio.Task] = []
+        self._writes: Set[asyncio.Task] = set()
+
+    async def start(self):
+        self._worker_tasks = [
+            asyncio.create_task(self._worker(), name=f"tasklinx-job-worker-{i}")
+            for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for worker in self._worker_tasks:
+            worker.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        await asyncio.gather(*self._writes, return_exceptions=True)
+
+    async def submit(self, user_id: str, user_input: str, timezone: Optional[str] = None) -> Job:
+        if self._queue.full():
+            raise QueueFullError("Too many pending tasks, try again shortly")
+        job = Job(new_task_id(), user_id, user_input, timezone)
+        # Stored before the client learns the id, so a poll that lands on another worker finds it
+        await io_pool.run(self.store.put, user_id, job.to_dict(), job.seq)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise QueueFullError("Too many pending tasks, try again shortly")
+        self._jobs.set(job.id, job)
+        return job
+
+    def _local_job(self, job_id: str, user_id: str) -> Optional[Job]:
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def get(self, job_id: str, user_id: str) -> Optional[Dict[str, Any]]:
+        """The job's current snapshot, whichever worker process runs it"""
+        job = self._local_job(job_id, user_id)
+        if job is not None:
+            return job.to_dict()
+        return await io_pool.run(self.store.get, job_id, user_id)
+
+    def _update(self, job: Job, status: str, result: Optional[Dict[str, Any]] = None, error: Optional[str] = None):
+        job.status = status
+        job.result = result if result is not None else job.result
+        job.error = error
+        job.updated_at = datetime.now().isoformat()
+        job.seq += 1
+        snapshot = job.to_dict()
+        for subscriber in job._subscribers:
+            subscriber.put_nowait(snapshot)
+        write = asyncio.get_running_loop().create_task(io_pool.run(self.store.put, job.user_id, snapshot, job.seq))
+        self._writes.add(write)
+        write.add_done_callback(self._writes.discard)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                record = await task_service.execute_task(
+                    job.user_id,
+                    job.user_input,
+                    task_id=job.id,
+                    on_progress=lambda stage, job=job: self._update(job, stage),
+                    timezone=job.timezone
+                )
+                self._update(job, "done", result=record)
+            except Exception as e:
+                self._update(job, "failed", error=str(e))
+            finally:
+                self._queue.task_done()
+
+    async def events(self, job_id: str, user_id: str) -> AsyncIterator[str]:
+        """Stream the job's status changes as Server-Sent Events until it finishes"""
+        job = self._local_job(job_id, user_id)
+        if job is None:
+            async for event in self._polled_events(job_id, user_id):
+                yield event
+            return
+
+        subscriber: asyncio.Queue = asyncio.Queue()
+        job._subscribers.append(subscriber)
+        try:
+            snapshot = job.to_dict()
+            yield format_event("status", snapshot)
+            while snapshot["status"] not in TERMINAL_STATES:
+                try:
+                    snapshot = await asyncio.wait_for(subscriber.get(), timeout=config.SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    # Comment line keeps proxies from closing an idle stream
+                    yield ": keepalive\n\n"
+                    continue
+                yield format_event("status", snapshot)
+        finally:
+            job._subscribers.remove(subscriber)
+
+    async def _polled_events(self, job_id: str, user_id: str) -> AsyncIterator[str]:
+        # The job runs in another worker process: follow its snapshots in the shared store
+        snapshot = await io_pool.run(self.store.get, job_id, user_id)
+        if snapshot is None:
+            return
+        yield format_event("status", snapshot)
+        last_sent = time.monotonic()
+        while snapshot["status"] not in TERMINAL_STATES:
+            await asyncio.sleep(self.poll_interval)
+            current = await io_pool.run(self.store.get, job_id, user_id)
+            if current is None:
+                # Expired, or the store was reset
+                return
+            if current != snapshot:
+                snapshot = current
+                yield format_event("status", snapshot)
+                last_sent = time.monotonic()
+            elif time.monotonic() - last_sent >= config.SSE_KEEPALIVE_SECONDS:
+                yield ": keepalive\n\n"
+                last_sent = time.monotonic()
+
+def create_job_queue() -> JobQueue:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    return JobQueue(
+        store=SQLiteJobStore(config.JOBS_DB_FILE, config.JOB_RESULT_TTL),
+        workers=config.JOB_WORKERS,
+        max_pending=config.JOB_MAX_PENDING,
+        result_ttl=config.JOB_RESULT_TTL,
+        poll_interval=config.JOB_EVENTS_POLL_INTERVAL
+    )
+
+job_queue = create_job_queue()
@@ -0,0 +1,74 @@
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Dict, Any, Optional
+
+# USD per 1K tokens (prompt, completion); unknown models are reported at zero cost
+MODEL_PRICING = {
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-turbo": (0.01, 0.03),
+    "gpt-4o": (0.0025, 0.01),
+    "gpt-4o-mini": (0.00015, 0.0006),
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+}
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (~4 characters per token) for streamed calls without usage data"""
+    return max(1, len(text) // 4)
+
+class LLMUsageTracker:
+    """Per-call and per-model token, latency and cost accounting for OpenAI calls"""
+
+    def __init__(self, recent_calls: int = 100):
+        self._lock = threading.Lock()
+        self._models: Dict[str, Dict[str, float]] = {}
+        self._recent = deque(maxlen=recent_calls)
+
+    def cost(self, model: str, prompt_tokens: int, completion_tokens: int) -> float:
+        prompt_price, completion_price = MODEL_PRICING.get(model, (0.0, 0.0))
+        return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+    def record(
+        self,
+        model: str,
+        prompt_tokens: int,
+        completion_tokens: int,
+        latency_seconds: float,
+        estimated: bool = False,
+        purpose: Optional[str] = None
+    ) -> Dict[str, Any]:
+        call = {
+            "timestamp": datetime.now().isoformat(),
+            "model": model,
+            "purpose": purpose,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency_ms": round(latency_seconds * 1000, 1),
+            "cost_usd": round(self.cost(model, prompt_tokens, completion_tokens), 6),
+            "estimated": estimated
+        }
+        with self._lock:
+            totals = self._models.setdefault(model, {
+                "calls": 0, "prompt_tokens": 0, "completion_tokens": 0, "latency_ms": 0.0, "cost_usd": 0.0
+            })
+            totals["calls"] += 1
+            totals["prompt_tokens"] += prompt_tokens
+            totals["completion_tokens"] += completion_tokens
+            totals["latency_ms"] += call["latency_ms"]
+            totals["cost_usd"] += call["cost_usd"]
+            self._recent.append(call)
+        return call
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            models = {
+                model: {**totals, "mean_latency_ms": totals["latency_ms"] / totals["calls"]}
+                for model, totals in self._models.items()
+            }
+            return {
+                "models": models,
+                "total_cost_usd": sum(totals["cost_usd"] for totals in self._models.values()),
+                "recent_calls": list(self._recent)
+            }
+
+llm_usage = LLMUsageTracker()
@@ -1,18 +1,68 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Header, Query, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from pydantic import BaseModel
 from typing import Optional, List
-import uvicorn
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
+import json
+import math
+import time
 
 from config import config
 from auth import auth_service
+from ai_service import ai_service
+from llm_metrics import llm_usage
 from task_service import task_service
+from google_clients import google_clients
+from io_pool import io_pool
+from job_queue import job_queue, QueueFullError
+from rate_limit import rate_limiter, RateLimitExceeded
+from metrics import metrics, ServerTimingMiddleware
+from idempotency import idempotency, IdempotencyKeyConflict
+from invalidation import invalidation_bus
+from scheduler import scheduler
+
+def warm_up():
+    """Load what the first requests would otherwise wait for: client libraries, discovery documents, the OpenAI client"""
+    start = time.perf_counter()
+    google_clients.preload()
+    auth_service.warm_up()
+    ai_service.client  # built on first access
+    print(f"🔥 Warm-up finished in {(time.perf_counter() - start) * 1000:.0f}ms")
+
+async def warm_up_in_background():
+    # Give the server time to bind its port first, so warming up never delays accepting requests
+    await asyncio.sleep(config.WARM_UP_DELAY)
+    try:
+        await io_pool.run(warm_up)
+    except Exception as e:
+        # Whatever failed is loaded again, and reports its error, on first use
+        print(f"Warm-up failed: {e}")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    auth_service.start_background_refresh()
+    invalidation_bus.start()
+    await job_queue.start()
+    await scheduler.start(task_service.run_scheduled)
+    warming = asyncio.create_task(warm_up_in_background()) if config.WARM_UP_ENABLED else None
+    yield
+    if warming:
+        warming.cancel()
+    await scheduler.stop()
+    await job_queue.stop()
+    invalidation_bus.stop()
+    auth_service.stop_background_refresh()
+    ai_service.cache.save()
 
 app = FastAPI(
     title="TaskLinx API", 
     version="1.0.0",
-    description="AI-powered task automation platform for emails and calendar events"
+    description="AI-powered task automation platform for emails and calendar events",
+    lifespan=lifespan
 )
 
 # CORS middleware
@@ -22,31 +72,80 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "Idempotent-Replayed", "ETag"],
 )
 
+# Per-stage Server-Timing header and request latency histogram
+app.add_middleware(ServerTimingMiddleware)
+
 security = HTTPBearer()
 
 # Pydantic models
 class TaskRequest(BaseModel):
     task: str
+    timezone: Optional[str] = None  # IANA name, e.g. "Europe/Berlin"
 
 class AuthCallbackRequest(BaseModel):
     code: str
 
+class RefreshTokenRequest(BaseModel):
+    refresh_token: str
+
 class TaskResponse(BaseModel):
     success: bool
     task_id: Optional[str] = None
     result: dict
     interpretation: dict
 
+class BatchTaskRequest(BaseModel):
+    tasks: List[str]
+    timezone: Optional[str] = None
+
+class BatchTaskResponse(BaseModel):
+    results: List[TaskResponse]
+
+class Contact(BaseModel):
+    email: str
+    name: Optional[str] = None
+
+class ContactImportRequest(BaseModel):
+    contacts: List[Contact]
+
 class HistoryResponse(BaseModel):
     tasks: List[dict]
+    next_cursor: Optional[str] = None
+    latest_cursor: Optional[str] = None
+    delta: bool = False
 
 # Dependency to get current user
 async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
     token = credentials.credentials
     return auth_service.verify_token(token)
 
+def rate_limit_response(e: RateLimitExceeded) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(max(1, math.ceil(e.retry_after)))}
+    )
+
+async def admit(user_id: str, cost: int = 1):
+    """Admission control: charge the user's and the global bucket before any work starts"""
+    try:
+        await rate_limiter.acquire("user", key=user_id, tokens=cost)
+        await rate_limiter.acquire("global", tokens=cost)
+    except RateLimitExceeded as e:
+        raise rate_limit_response(e)
+
+async def run_idempotent(user_id: str, idempotency_key: Optional[str], request_parts: tuple, execute, succeeded) -> tuple:
+    """Replay the stored response of a duplicate submission, or execute it once"""
+    try:
+        return await idempotency.run(
+            user_id, idempotency_key, idempotency.fingerprint(*request_parts), execute, succeeded
+        )
+    except IdempotencyKeyConflict as e:
+        raise HTTPException(status_code=422, detail=str(e))
+
 # Routes
 @app.get("/")
 async def root():
@@ -69,42 +168,254 @@ async def login():
 async def auth_callback(request: AuthCallbackRequest):
     """Handle OAuth2 callback and exchange code for TaskLinx tokens"""
     try:
-        result = auth_service.exchange_code_for_tokens(request.code)
+        result = await io_pool.run(auth_service.exchange_code_for_tokens, request.code)
         return {
             "access_token": result["access_token"],
+            "refresh_token": result["refresh_token"],
+            "expires_in": result["expires_in"],
             "user_info": result["user_info"]
         }
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Authentication failed: {str(e)}")
 
+@app.post("/auth/refresh")
+async def refresh_token(request: RefreshTokenRequest):
+    """Exchange a refresh token for a new access token (and a new refresh token)"""
+    return await io_pool.run(auth_service.refresh_tokens, request.refresh_token)
+
+@app.post("/auth/logout")
+async def logout(request: RefreshTokenRequest):
+    """Sign out: revoke the session's access and refresh tokens"""
+    await io_pool.run(auth_service.logout, request.refresh_token)
+    return {"success": True}
+
 @app.post("/tasks/execute", response_model=TaskResponse)
-async def execute_task(request: TaskRequest, user_id: str = Depends(get_current_user)):
+async def execute_task(
+    request: TaskRequest,
+    run_async: bool = Query(False, alias="async"),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    user_id: str = Depends(get_current_user)
+):
     """Execute a natural language task using TaskLinx AI"""
-    try:
-        result = task_service.execute_task(user_id, request.task)
-        return TaskResponse(
-            success=result["result"]["success"],
-            task_id=result["id"],
-            result=result["result"],
-            interpretation=result["interpretation"]
+    async def run() -> dict:
+        await admit(user_id)
+        
+        if run_async:
+            # Queue the task and return immediately; progress is at /tasks/{id}
+            try:
+                job = await job_queue.submit(user_id, request.task, request.timezone)
+            except QueueFullError as e:
+                raise HTTPException(status_code=503, detail=str(e))
+            return {
+                "job_id": job.id,
+                "status": job.status,
+                "status_url": f"/tasks/{job.id}",
+                "events_url": f"/tasks/{job.id}/events"
+            }
+        
+        try:
+            result = await task_service.execute_task(user_id, request.task, timezone=request.timezone)
+            return TaskResponse(
+                success=result["result"]["success"],
+                task_id=result["id"],
+                result=result["result"],
+                interpretation=result["interpretation"]
+            ).model_dump()
+        except RateLimitExceeded as e:
+            raise rate_limit_response(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Task execution failed: {str(e)}")
+    
+    content, replayed = await run_idempotent(
+        user_id,
+        idempotency_key,
+        ("execute", request.task, request.timezone, run_async),
+        run,
+        succeeded=lambda content: run_async or content["success"]
+    )
+    return JSONResponse(
+        status_code=202 if run_async else 200,
+        content=content,
+        headers={"Idempotent-Replayed": "true"} if replayed else None
+    )
+
+@app.post("/tasks/interpret/stream")
+async def stream_interpretation(request: TaskRequest, user_id: str = Depends(get_current_user)):
+    """Stream the TaskLinx AI interpretation of a task as Server-Sent Events"""
+    await admit(user_id)
+    return StreamingResponse(
+        task_service.stream_interpretation(user_id, request.task, request.timezone),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/tasks/batch", response_model=BatchTaskResponse)
+async def execute_batch(
+    request: BatchTaskRequest,
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=255),
+    user_id: str = Depends(get_current_user)
+):
+    """Execute several natural language tasks (or one multi-action input) using TaskLinx AI"""
+    if not request.tasks or len(request.tasks) > config.BATCH_MAX_TASKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"A batch must contain between 1 and {config.BATCH_MAX_TASKS} tasks"
         )
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Task execution failed: {str(e)}")
+    
+    async def run() -> dict:
+        await admit(user_id, cost=len(request.tasks))
+        
+        try:
+            results = await task_service.execute_batch(user_id, request.tasks, request.timezone)
+            return BatchTaskResponse(results=[
+                TaskResponse(
+                    success=result["result"]["success"],
+                    task_id=result["id"],
+                    result=result["result"],
+                    interpretation=result["interpretation"]
+                )
+                for result in results
+            ]).model_dump()
+        except RateLimitExceeded as e:
+            raise rate_limit_response(e)
+        except Exception as e:
+            raise HTTPException(status_code=500, detail=f"Batch execution failed: {str(e)}")
+    
+    content, replayed = await run_idempotent(
+        user_id,
+        idempotency_key,
+        ("batch", request.tasks, request.timezone),
+        run,
+        succeeded=lambda content: all(result["success"] for result in content["results"])
+    )
+    return JSONResponse(content=content, headers={"Idempotent-Replayed": "true"} if replayed else None)
 
 @app.get("/tasks/history", response_model=HistoryResponse)
-async def get_task_history(limit: int = 20, user_id: str = Depends(get_current_user)):
-    """Get user's task history from TaskLinx"""
+async def get_task_history(
+    limit: int = Query(20, ge=1, le=config.HISTORY_MAX_PAGE_SIZE),
+    before: Optional[str] = None,
+    since: Optional[str] = None,
+    action_type: Optional[str] = None,
+    task_status: Optional[str] = Query(None, alias="status"),
+    q: Optional[str] = Query(None, max_length=200),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+    user_id: str = Depends(get_current_user)
+):
+    """Get user's task history from TaskLinx.
+
+    Pass next_cursor as `before` for older tasks, or latest_cursor as
+    `since` to poll for new ones. Unchanged results return 304 when the
+    ETag is sent back in If-None-Match.
+    """
     try:
-        tasks = task_service.get_task_history(user_id, limit)
-        return HistoryResponse(tasks=tasks)
+        version = await task_service.get_history_version(user_id)
+        etag = '"' + hashlib.sha256(
+            json.dumps([user_id, version, limit, before, since, action_type, task_status, q]).encode("utf-8")
+        ).hexdigest()[:32] + '"'
+        if if_none_match and (if_none_match.strip() == "*" or etag in [tag.strip() for tag in if_none_match.split(",")]):
+            return Response(status_code=304, headers={"ETag": etag})
+        
+        # A trimmed (or unknown) `since` task falls back to a full first page
+        delta = since is not None and await task_service.get_task(user_id, since) is not None
+        tasks = await task_service.get_task_history(
+            user_id,
+            limit,
+            before,
+            since=since if delta else None,
+            action_type=action_type,
+            status=task_status,
+            query=q
+        )
+        history = HistoryResponse(
+            tasks=tasks,
+            next_cursor=tasks[-1]["id"] if len(tasks) == limit and not delta else None,
+            latest_cursor=tasks[0]["id"] if tasks else (since if delta else None),
+            delta=delta
+        )
+        return JSONResponse(
+            content=history.model_dump(),
+            headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+        )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to retrieve history: {str(e)}")
 
+# Registered before /tasks/{task_id}, which would otherwise match "scheduled"
+@app.get("/tasks/scheduled")
+async def list_scheduled_tasks(user_id: str = Depends(get_current_user)):
+    """Get the user's upcoming scheduled and recurring TaskLinx tasks, soonest first"""
+    return {"tasks": await task_service.list_scheduled(user_id)}
+
+@app.delete("/tasks/scheduled/{task_id}")
+async def cancel_scheduled_task(task_id: str, user_id: str = Depends(get_current_user)):
+    """Cancel a scheduled task, or stop a recurring one"""
+    if not await task_service.cancel_scheduled(user_id, task_id):
+        raise HTTPException(status_code=404, detail="No pending scheduled task with that id")
+    return {"success": True, "id": task_id, "status": "cancelled"}
+
+@app.get("/tasks/{task_id}")
+async def get_task(task_id: str, user_id: str = Depends(get_current_user)):
+    """Get a single TaskLinx task: live status while queued/running, else from history"""
+    job = await job_queue.get(task_id, user_id)
+    if job is not None:
+        return job
+    
+    record = await task_service.get_task(user_id, task_id)
+    if record is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return {
+        "id": record["id"],
+        "status": "done",
+        "user_input": record.get("user_input"),
+        "created_at": record.get("timestamp"),
+        "updated_at": record.get("timestamp"),
+        "result": record,
+        "error": None
+    }
+
+@app.get("/tasks/{task_id}/events")
+async def stream_task_events(task_id: str, user_id: str = Depends(get_current_user)):
+    """Stream TaskLinx task progress as Server-Sent Events"""
+    if await job_queue.get(task_id, user_id) is None:
+        raise HTTPException(status_code=404, detail="Task not found")
+    return StreamingResponse(
+        job_queue.events(task_id, user_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/contacts/import")
+async def import_contacts(request: ContactImportRequest, user_id: str = Depends(get_current_user)):
+    """Add a contact list used to resolve recipient names ("email Alice ...") to addresses"""
+    if len(request.contacts) > config.CONTACTS_MAX_IMPORT:
+        raise HTTPException(
+            status_code=413,
+            detail=f"At most {config.CONTACTS_MAX_IMPORT} contacts per import"
+        )
+    try:
+        imported = await task_service.import_contacts(
+            user_id, [(contact.name, contact.email) for contact in request.contacts]
+        )
+        return {"imported": imported, "skipped": len(request.contacts) - imported}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import contacts: {str(e)}")
+
+@app.get("/contacts/search")
+async def search_contacts(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_current_user)
+):
+    """Look up contacts by name or address prefix (typo-tolerant)"""
+    try:
+        return {"contacts": await task_service.search_contacts(user_id, q, limit)}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to search contacts: {str(e)}")
+
 @app.get("/user/profile")
 async def get_user_profile(user_id: str = Depends(get_current_user)):
     """Get current user profile in TaskLinx"""
     try:
-        credentials = auth_service.get_user_credentials(user_id)
+        credentials = await io_pool.run(auth_service.get_user_credentials, user_id)
         if not credentials:
             raise HTTPException(status_code=401, detail="User not authenticated")
         
@@ -112,7 +423,23 @@ async def get_user_profile(user_id: str = Depends(get_current_user)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to get profile: {str(e)}")
 
+@app.get("/ai/stats")
+async def get_ai_stats(user_id: str = Depends(get_current_user)):
+    """Get TaskLinx AI cache, fast-path and per-model token/latency/cost statistics"""
+    return {
+        "interpretation_cache": ai_service.cache.stats(),
+        "fast_path": ai_service.fast_path_stats(),
+        "llm_usage": llm_usage.stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus metrics: per-stage latency histograms, task/LLM counters and cache hit rates"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
+    import uvicorn
+    
     print("🚀 Starting TaskLinx API Server...")
     print("📧 Gmail integration: Ready")
     print("📅 Calendar integration: Ready")
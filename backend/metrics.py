@@ -0,0 +1,241 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+from config import config
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# Seconds; spans a cache hit (~ms) up to a slow LLM call
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(str(value))}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels: str) -> float:
+        return self._values.get(tuple(str(labels.get(name, "")) for name in self.labelnames), 0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        # Per label set: [per-bucket counts, sum, count]
+        self._values: Dict[LabelValues, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str):
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                series = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    le = f'le="{_format_value(bound)}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Gauge:
+    """Gauge read at scrape time from a callback returning {label values: value}"""
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = collect
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        for key, value in sorted(self.collect().items()):
+            lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+class MetricsRegistry:
+    """Process-wide metrics rendered in the Prometheus text exposition format"""
+
+    def __init__(self):
+        self._metrics: List[Any] = []
+        self._caches: Dict[str, Any] = {}
+
+    def counter(self, name: str, documentation: str, labelnames: Sequence[str] = ()) -> Counter:
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, documentation: str, labelnames: Sequence[str], collect: Callable[[], Dict[LabelValues, float]]) -> Gauge:
+        metric = Gauge(name, documentation, labelnames, collect)
+        self._metrics.append(metric)
+        return metric
+
+    def register_cache(self, name: str, cache: Any):
+        """Export a cache's stats() (hits, misses, size, hit_rate) as gauges"""
+        self._caches[name] = cache
+
+    def cache_stats(self, field: str) -> Dict[LabelValues, float]:
+        return {(name,): cache.stats()[field] for name, cache in self._caches.items()}
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+stage_seconds = metrics.histogram(
+    "tasklinx_stage_duration_seconds", "Time spent in each task pipeline stage", ["stage"]
+)
+stage_errors = metrics.counter(
+    "tasklinx_stage_errors_total", "Pipeline stages that raised an exception", ["stage"]
+)
+request_seconds = metrics.histogram(
+    "tasklinx_http_request_duration_seconds", "HTTP request latency", ["method", "route", "status"]
+)
+tasks_total = metrics.counter(
+    "tasklinx_tasks_total", "Executed tasks by action type and final status", ["action_type", "status"]
+)
+task_errors = metrics.counter(
+    "tasklinx_task_errors_total", "Failed tasks by action type", ["action_type"]
+)
+llm_requests = metrics.counter(
+    "tasklinx_llm_requests_total", "OpenAI interpretation calls by model and outcome", ["model", "outcome"]
+)
+interpretations = metrics.counter(
+    "tasklinx_interpretations_total", "Task interpretations by source (fast_path, cache, llm)", ["source"]
+)
+metrics.gauge("tasklinx_cache_hit_ratio", "Cache hit rate since start", ["cache"], lambda: metrics.cache_stats("hit_rate"))
+metrics.gauge("tasklinx_cache_hits", "Cache hits since start", ["cache"], lambda: metrics.cache_stats("hits"))
+metrics.gauge("tasklinx_cache_misses", "Cache misses since start", ["cache"], lambda: metrics.cache_stats("misses"))
+metrics.gauge("tasklinx_cache_entries", "Entries currently cached", ["cache"], lambda: metrics.cache_stats("size"))
+
+# Stage timings of the current HTTP request, for its Server-Timing header.
+# The list is shared with I/O pool threads, which copy the context.
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    "tasklinx_request_timings", default=None
+)
+
+def _tracer():
+    if otel_trace is None or not config.TRACING_ENABLED:
+        return None
+    return otel_trace.get_tracer("tasklinx")
+
+@contextmanager
+def stage(name: str, **attributes: Any) -> Iterator[None]:
+    """Time a pipeline stage: histogram, Server-Timing entry and (optionally) an OpenTelemetry span"""
+    tracer = _tracer()
+    span = tracer.start_as_current_span(f"tasklinx.{name}", attributes=attributes) if tracer else nullcontext()
+    start = time.perf_counter()
+    with span:
+        try:
+            yield
+        except Exception:
+            stage_errors.inc(stage=name)
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            stage_seconds.observe(elapsed, stage=name)
+            timings = _request_timings.get()
+            if timings is not None:
+                timings.append((name, elapsed))
+
+def server_timing_header(timings: List[Tuple[str, float]], total: float) -> str:
+    """Sum repeated stages, e.g. "llm;dur=812.4, gmail_send;dur=203.1, total;dur=1044.9" """
+    durations: Dict[str, float] = {}
+    for name, elapsed in timings:
+        durations[name] = durations.get(name, 0.0) + elapsed
+    durations["total"] = total
+    return ", ".join(f"{name};dur={elapsed * 1000:.1f}" for name, elapsed in durations.items())
+
+class ServerTimingMiddleware:
+    """ASGI middleware adding a Server-Timing header and recording request latency"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings: List[Tuple[str, float]] = []
+        token = _request_timings.set(timings)
+        start = time.perf_counter()
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                header = server_timing_header(timings, time.perf_counter() - start)
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", header.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
+            route = scope.get("route")
+            request_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"],
+                route=getattr(route, "path", "unmatched"),
+                status=str(status_code)
+            )
@@ -0,0 +1,155 @@
+import asyncio
+import math
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple
+from config import config
+from io_pool import io_pool
+
+class RateLimitExceeded(Exception):
+    def __init__(self, bucket: str, retry_after: float):
+        self.bucket = bucket
+        self.retry_after = retry_after
+        super().__init__(f"Rate limit exceeded for {bucket}, retry in {math.ceil(retry_after)}s")
+
+class BucketStore:
+    """Token bucket state backend.
+
+    take() refills the bucket for the elapsed time, then either removes
+    `tokens` and returns 0, or leaves it untouched and returns how many
+    seconds until enough tokens will be available.
+    """
+
+    # Stores doing blocking I/O are called through the I/O pool
+    blocking = False
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        raise NotImplementedError
+
+    @staticmethod
+    def _refill(level: float, updated: float, now: float, rate: float, capacity: float) -> float:
+        return min(capacity, level + (now - updated) * rate)
+
+class InMemoryBucketStore(BucketStore):
+    """Per-process buckets (the default for a single worker)"""
+
+    def __init__(self):
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+        self._lock = threading.Lock()
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        now = time.monotonic()
+        with self._lock:
+            level, updated = self._buckets.get(key, (capacity, now))
+            level = self._refill(level, updated, now, rate, capacity)
+            if level >= tokens:
+                self._buckets[key] = (level - tokens, now)
+                return 0.0
+            self._buckets[key] = (level, now)
+            return (tokens - level) / rate
+
+class SQLiteBucketStore(BucketStore):
+    """Buckets shared by every worker process through a SQLite file"""
+
+    blocking = True
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connect().execute(
+            "CREATE TABLE IF NOT EXISTS buckets (key TEXT PRIMARY KEY, level REAL NOT NULL, updated REAL NOT NULL)"
+        )
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def take(self, key: str, rate: float, capacity: float, tokens: float = 1) -> float:
+        # Wall clock, since monotonic clocks are not comparable across processes
+        now = time.time()
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute("SELECT level, updated FROM buckets WHERE key = ?", (key,)).fetchone()
+            level, updated = row if row else (capacity, now)
+            level = self._refill(level, updated, now, rate, capacity)
+            retry_after = 0.0
+            if level >= tokens:
+                level -= tokens
+            else:
+                retry_after = (tokens - level) / rate
+            conn.execute(
+                "INSERT INTO buckets (key, level, updated) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET level = excluded.level, updated = excluded.updated",
+                (key, level, now)
+            )
+        return retry_after
+
+class RateLimiter:
+    """Named token-bucket limits with an optional bounded wait queue.
+
+    With max_wait > 0, up to max_waiters callers per bucket sleep until a
+    token frees up (backpressure) instead of being rejected immediately.
+    """
+
+    def __init__(self, store: BucketStore, limits: Dict[str, Tuple[float, float]], max_wait: float, max_waiters: int):
+        self.store = store
+        self.limits = limits
+        self.max_wait = max_wait
+        self.max_waiters = max_waiters
+        self._waiters: Dict[str, int] = {}
+
+    async def _take(self, bucket: str, key: str, tokens: float) -> float:
+        rate, capacity = self.limits[bucket]
+        if rate <= 0:
+            return 0.0
+        # A request costing more than the burst drains a full bucket instead of never fitting
+        tokens = min(tokens, capacity)
+        bucket_key = f"{bucket}:{key}"
+        if self.store.blocking:
+            return await io_pool.run(self.store.take, bucket_key, rate, capacity, tokens)
+        return self.store.take(bucket_key, rate, capacity, tokens)
+
+    async def acquire(self, bucket: str, key: str = "global", tokens: float = 1, max_wait: Optional[float] = None):
+        """Take tokens from a bucket, waiting up to max_wait seconds, else raise RateLimitExceeded"""
+        max_wait = self.max_wait if max_wait is None else max_wait
+        retry_after = await self._take(bucket, key, tokens)
+        if retry_after == 0:
+            return
+
+        waiting = self._waiters.get(bucket, 0)
+        if retry_after > max_wait or waiting >= self.max_waiters:
+            raise RateLimitExceeded(bucket, retry_after)
+
+        self._waiters[bucket] = waiting + 1
+        deadline = time.monotonic() + max_wait
+        try:
+            while retry_after > 0:
+                if time.monotonic() + retry_after > deadline:
+                    raise RateLimitExceeded(bucket, retry_after)
+                await asyncio.sleep(retry_after)
+                retry_after = await self._take(bucket, key, tokens)
+        finally:
+            self._waiters[bucket] -= 1
+
+def create_bucket_store() -> BucketStore:
+    if config.RATE_LIMIT_STORE == "sqlite":
+        os.makedirs(config.CREDS_DIR, exist_ok=True)
+        return SQLiteBucketStore(config.RATE_LIMIT_DB_FILE)
+    if config.RATE_LIMIT_STORE == "memory":
+        return InMemoryBucketStore()
+    raise ValueError(f"Unknown rate limit store: {config.RATE_LIMIT_STORE}")
+
+rate_limiter = RateLimiter(
+    store=create_bucket_store(),
+    limits=config.RATE_LIMITS,
+    max_wait=config.RATE_LIMIT_MAX_WAIT,
+    max_waiters=config.RATE_LIMIT_MAX_WAITERS
+)
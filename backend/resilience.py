@@ -0,0 +1,279 @@
+import asyncio
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from googleapiclient.errors import HttpError
+from config import config
+from metrics import metrics
+
+# Upstream responses worth retrying: throttling and server-side failures
+TRANSIENT_STATUSES = (429, 500, 502, 503, 504)
+
+CIRCUIT_STATES = {"closed": 0, "half_open": 1, "open": 2}
+
+# Client-library errors that are transient, by module. The libraries are only looked up
+# once something else has imported them: an error can't come from a library never loaded
+TRANSIENT_ERRORS = {
+    "httplib2": ("HttpLib2Error",),
+    "httpx": ("TransportError",),
+    "google.auth.exceptions": ("TransportError",),
+    "openai": ("APITimeoutError", "APIConnectionError", "RateLimitError", "InternalServerError"),
+}
+
+def _loaded_errors(errors: Dict[str, Tuple[str, ...]]) -> tuple:
+    return tuple(
+        getattr(sys.modules[module], name)
+        for module, names in errors.items() if module in sys.modules
+        for name in names
+    )
+
+def is_transient(error: Exception) -> bool:
+    """Whether an outbound call failed for a reason that may go away on retry"""
+    if isinstance(error, HttpError):
+        return error.resp.status in TRANSIENT_STATUSES
+    httpx = sys.modules.get("httpx")
+    if httpx and isinstance(error, httpx.HTTPStatusError):
+        return error.response.status_code in TRANSIENT_STATUSES
+    return isinstance(error, (
+        TimeoutError,
+        ConnectionError,
+        asyncio.TimeoutError,
+        *_loaded_errors(TRANSIENT_ERRORS),
+    ))
+
+def is_rejected(error: Exception) -> bool:
+    """Whether the upstream explicitly refused the request, so it certainly had no effect"""
+    return isinstance(error, HttpError) and error.resp.status == 429
+
+class CircuitOpenError(Exception):
+    def __init__(self, dependency: str, retry_after: float):
+        self.dependency = dependency
+        self.retry_after = retry_after
+        super().__init__(f"{dependency} is unavailable, retry in {retry_after:.0f}s")
+
+class CircuitBreaker:
+    """Fails fast after repeated transient failures of a dependency.
+
+    closed -> open after failure_threshold consecutive failures; after
+    reset_timeout one trial call is let through (half_open) and its
+    outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == "closed":
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and remaining <= 0:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            circuit_rejections.inc(dependency=self.name)
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def record_success(self):
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or self.failures >= self.failure_threshold:
+                self.state = "open"
+                self.opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+class HedgePolicy:
+    """Hedge delay from recent latencies: a backup request starts once the primary is slower than the given percentile"""
+
+    def __init__(self, percentile: float, min_delay: float, initial_delay: float, window: int = 200):
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.initial_delay = initial_delay
+        self._latencies = deque(maxlen=window)
+
+    def observe(self, seconds: float):
+        self._latencies.append(seconds)
+
+    def delay(self) -> float:
+        # Too few samples for a meaningful percentile yet
+        if len(self._latencies) < 20:
+            return max(self.min_delay, self.initial_delay)
+        ordered = sorted(self._latencies)
+        return max(self.min_delay, ordered[int(len(ordered) * self.percentile) - 1])
+
+class Resilience:
+    """Deadlines, jittered exponential retries, circuit breakers and hedging for outbound calls.
+
+    Google calls are synchronous (run in the I/O pool) and go through
+    call(); OpenAI calls are coroutines and go through call_async(). Only
+    pass operations that are idempotent, or narrow retry_if to errors
+    that prove the request had no effect.
+    """
+
+    def __init__(self, deadlines: Dict[str, float], attempt_timeouts: Dict[str, float]):
+        # Budget for a whole call including retries, and for a single async attempt
+        self.deadlines = deadlines
+        self.attempt_timeouts = attempt_timeouts
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+
+    def breaker(self, dependency: str) -> CircuitBreaker:
+        with self._breakers_lock:
+            breaker = self.breakers.get(dependency)
+            if breaker is None:
+                breaker = self.breakers[dependency] = CircuitBreaker(
+                    dependency, config.CIRCUIT_FAILURE_THRESHOLD, config.CIRCUIT_RESET_TIMEOUT
+                )
+            return breaker
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (1-based)"""
+        return random.uniform(0, min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2 ** (attempt - 1)))
+
+    def _next_delay(self, dependency: str, attempt: int, started: float, error: Exception, retry_if: Callable[[Exception], bool]) -> Optional[float]:
+        """Delay before the next attempt, or None when the error should be raised"""
+        if attempt >= config.RETRY_ATTEMPTS or not retry_if(error):
+            return None
+        delay = self.backoff(attempt)
+        if time.monotonic() - started + delay >= self.deadlines[dependency]:
+            return None
+        retries.inc(dependency=dependency)
+        return delay
+
+    def call(self, dependency: str, func: Callable[..., Any], *args, retry_if: Callable[[Exception], bool] = is_transient, **kwargs) -> Any:
+        """Run a blocking call with retries inside the dependency's deadline and circuit breaker"""
+        breaker = self.breaker(dependency)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if is_transient(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                delay = self._next_delay(dependency, attempt, started, e, retry_if)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def call_async(
+        self,
+        dependency: str,
+        factory: Callable[[], Awaitable[Any]],
+        retry_if: Callable[[Exception], bool] = is_transient
+    ) -> Any:
+        """Await factory() with per-attempt timeouts and retries, all within the dependency's deadline"""
+        breaker = self.breaker(dependency)
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            attempt += 1
+            breaker.before_call()
+            remaining = self.deadlines[dependency] - (time.monotonic() - started)
+            timeout = max(min(remaining, self.attempt_timeouts[dependency]), 0.001)
+            try:
+                result = await asyncio.wait_for(factory(), timeout=timeout)
+            except Exception as e:
+                if isinstance(e, asyncio.TimeoutError):
+                    timeouts.inc(dependency=dependency)
+                if is_transient(e):
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                delay = self._next_delay(dependency, attempt, started, e, retry_if)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            breaker.record_success()
+            return result
+
+    async def hedged(self, dependency: str, factory: Callable[[int], Awaitable[Any]], policy: HedgePolicy) -> Any:
+        """Start factory(0); if it is still running after the hedge delay, race it against factory(1).
+
+        The first attempt to succeed wins and the other is cancelled; if one
+        fails, the other is still awaited.
+        """
+        started = time.monotonic()
+        primary = asyncio.ensure_future(factory(0))
+        pending = {primary}
+        error: Optional[BaseException] = None
+        try:
+            done, _ = await asyncio.wait(pending, timeout=policy.delay())
+            if done:
+                result = primary.result()
+                policy.observe(time.monotonic() - started)
+                return result
+
+            hedges.inc(dependency=dependency, outcome="started")
+            backup = asyncio.ensure_future(factory(1))
+            pending = {primary, backup}
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for attempt in done:
+                    if attempt.exception() is None:
+                        hedges.inc(dependency=dependency, outcome="backup_won" if attempt is backup else "primary_won")
+                        policy.observe(time.monotonic() - started)
+                        return attempt.result()
+                    error = attempt.exception()
+            raise error
+        finally:
+            for attempt in pending:
+                attempt.cancel()
+
+resilience = Resilience(
+    deadlines={
+        "openai": config.OPENAI_DEADLINE,
+        "gmail": config.GOOGLE_DEADLINE,
+        "calendar": config.GOOGLE_DEADLINE,
+        "oauth": config.GOOGLE_DEADLINE,
+    },
+    attempt_timeouts={
+        "openai": config.OPENAI_TIMEOUT,
+        "gmail": config.GOOGLE_TIMEOUT,
+        "calendar": config.GOOGLE_TIMEOUT,
+        "oauth": config.GOOGLE_TIMEOUT,
+    }
+)
+
+retries = metrics.counter(
+    "tasklinx_upstream_retries_total", "Retried outbound calls by dependency", ["dependency"]
+)
+timeouts = metrics.counter(
+    "tasklinx_upstream_timeouts_total", "Outbound calls that hit their deadline", ["dependency"]
+)
+circuit_rejections = metrics.counter(
+    "tasklinx_circuit_rejections_total", "Calls failed fast by an open circuit breaker", ["dependency"]
+)
+hedges = metrics.counter(
+    "tasklinx_hedged_requests_total", "Hedged LLM requests: started, and which attempt won", ["dependency", "outcome"]
+)
+metrics.gauge(
+    "tasklinx_circuit_state", "Circuit breaker state (0 closed, 1 half-open, 2 open)", ["dependency"],
+    lambda: {(name,): CIRCUIT_STATES[breaker.state] for name, breaker in resilience.breakers.items()}
+)
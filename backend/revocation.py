@@ -0,0 +1,110 @@
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from config import config
+from invalidation import invalidation_bus
+from metrics import metrics
+
+# How often expired entries are dropped from the set and the table (seconds)
+PRUNE_INTERVAL = 60
+
+class RevocationList:
+    """Revoked app token IDs (a token's jti or its session's sid).
+
+    Every authenticated request checks the in-memory set, a dict lookup.
+    With a SQLite backing store, revocations survive restarts and reach the
+    other workers through the invalidation bus. An entry is kept only until
+    the tokens it covers would have expired anyway.
+    """
+
+    def __init__(self, db_path: Optional[str] = None):
+        self.db_path = db_path
+        self._revoked: Dict[str, float] = {}
+        self._lock = threading.Lock()
+        self._next_prune = time.time() + PRUNE_INTERVAL
+        self._local = threading.local()
+        if db_path:
+            conn = self._connect()
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS revoked_tokens (token_id TEXT PRIMARY KEY, expires REAL NOT NULL)"
+            )
+            rows = conn.execute("SELECT token_id, expires FROM revoked_tokens WHERE expires > ?", (time.time(),))
+            self._revoked.update(rows.fetchall())
+            invalidation_bus.subscribe("revoked_tokens", self._on_revoked)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def is_revoked(self, token_id: Optional[str]) -> bool:
+        return token_id is not None and token_id in self._revoked
+
+    def revoke(self, token_id: str, expires: float) -> bool:
+        """Revoke a token ID until `expires` (epoch seconds); False if it was already revoked.
+
+        Exactly one caller, across all workers sharing the store, gets True,
+        so refresh-token rotation can use this as its claim.
+        """
+        if self.db_path:
+            conn = self._connect()
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO revoked_tokens (token_id, expires) VALUES (?, ?)", (token_id, expires)
+            )
+            if cursor.rowcount == 0:
+                self._add(token_id, expires)
+                return False
+            self._add(token_id, expires)
+            invalidation_bus.publish("revoked_tokens", f"{token_id} {expires}")
+            if self._prune():
+                conn.execute("DELETE FROM revoked_tokens WHERE expires <= ?", (time.time(),))
+            return True
+
+        with self._lock:
+            if token_id in self._revoked:
+                return False
+            self._revoked[token_id] = expires
+        self._prune()
+        return True
+
+    def _add(self, token_id: str, expires: float):
+        with self._lock:
+            self._revoked[token_id] = expires
+
+    def _on_revoked(self, key: str):
+        token_id, expires = key.rsplit(" ", 1)
+        self._add(token_id, float(expires))
+
+    def _prune(self) -> bool:
+        """Drop expired entries from the set, at most once per PRUNE_INTERVAL; True if it ran"""
+        now = time.time()
+        if now < self._next_prune:
+            return False
+        with self._lock:
+            self._next_prune = now + PRUNE_INTERVAL
+            self._revoked = {token_id: expires for token_id, expires in self._revoked.items() if expires > now}
+        return True
+
+    def __len__(self) -> int:
+        return len(self._revoked)
+
+def create_revocation_list() -> RevocationList:
+    if config.REVOCATION_STORE == "sqlite":
+        os.makedirs(config.CREDS_DIR, exist_ok=True)
+        return RevocationList(config.REVOCATION_DB_FILE)
+    if config.REVOCATION_STORE == "memory":
+        return RevocationList()
+    raise ValueError(f"Unknown revocation store: {config.REVOCATION_STORE}")
+
+revocation_list = create_revocation_list()
+
+metrics.gauge(
+    "tasklinx_revoked_tokens", "Revoked app token IDs held in memory until they expire", [],
+    lambda: {(): len(revocation_list)}
+)
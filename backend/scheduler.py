@@ -0,0 +1,437 @@
+import asyncio
+import calendar
+import heapq
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from config import config
+from invalidation import invalidation_bus
+from io_pool import io_pool
+from metrics import metrics
+from prompts import resolve_timezone
+
+REPEATS = ("daily", "weekdays", "weekly", "monthly")
+
+COLUMNS = (
+    "id, user_id, user_input, interpretation, timezone, repeat, first_run_at, run_at, "
+    "status, runs, last_task_id, created"
+)
+
+# Runs a due task; called with (scheduled task, missed) and returns its history record
+Dispatch = Callable[[Dict[str, Any], bool], Awaitable[Dict[str, Any]]]
+
+scheduled_runs = metrics.counter(
+    "tasklinx_scheduled_runs_total", "Scheduled task occurrences by outcome (run, missed, failed)", ["outcome"]
+)
+
+class ScheduleError(ValueError):
+    pass
+
+def _step(local: datetime, repeat: str, anchor_day: int) -> datetime:
+    if repeat == "daily":
+        return local + timedelta(days=1)
+    if repeat == "weekdays":
+        local += timedelta(days=1)
+        while local.weekday() >= 5:
+            local += timedelta(days=1)
+        return local
+    if repeat == "weekly":
+        return local + timedelta(weeks=1)
+    # Monthly: the first run's day of the month, or the month's last day if it is shorter
+    year, month = local.year + local.month // 12, local.month % 12 + 1
+    return local.replace(year=year, month=month, day=min(anchor_day, calendar.monthrange(year, month)[1]))
+
+def next_occurrence(task: Dict[str, Any], after: float) -> float:
+    """The series' first occurrence after `after`, at the same local wall-clock time across DST changes"""
+    tz = resolve_timezone(task["timezone"])
+    anchor_day = datetime.fromtimestamp(task["first_run_at"], tz).day
+    local = datetime.fromtimestamp(task["run_at"], tz).replace(tzinfo=None)
+    while True:
+        local = _step(local, task["repeat"], anchor_day)
+        run_at = local.replace(tzinfo=tz).timestamp()
+        if run_at > after:
+            return run_at
+
+def parse_schedule(schedule: Dict[str, Any], timezone: Optional[str], now: float) -> Optional[Tuple[float, Optional[str]]]:
+    """(first run in epoch seconds, repeat) for an interpretation's schedule, or None to run right away"""
+    repeat = schedule.get("repeat") or None
+    if repeat is not None and repeat not in REPEATS:
+        raise ScheduleError(f"Unsupported repeat {repeat!r}; use one of: {', '.join(REPEATS)}")
+    if not schedule.get("run_at"):
+        if repeat:
+            raise ScheduleError("Say when the recurring task should first run")
+        return None
+
+    try:
+        local = datetime.fromisoformat(str(schedule["run_at"]).strip().replace("Z", "+00:00"))
+    except ValueError:
+        raise ScheduleError(f"Could not understand the time {schedule['run_at']!r}")
+    if local.tzinfo is None:
+        local = local.replace(tzinfo=resolve_timezone(timezone))
+    run_at = local.timestamp()
+
+    if run_at < now + config.SCHEDULER_MIN_DELAY:
+        if not repeat:
+            return None
+        if run_at <= now:
+            run_at = next_occurrence(
+                {"timezone": timezone, "first_run_at": run_at, "run_at": run_at, "repeat": repeat}, now
+            )
+    return run_at, repeat
+
+class Scheduler:
+    """Durable one-off and recurring tasks, fired by one timer per worker process.
+
+    Scheduled tasks are rows in SQLite shared by all workers. Each process
+    keeps a min-heap of (run_at, id) and sleeps until the earliest is due,
+    so thousands of pending tasks cost nothing until they fire. A due task
+    is claimed with a conditional UPDATE, so exactly one worker runs it,
+    and at most SCHEDULER_MAX_CONCURRENT run at once per process. New and
+    rescheduled tasks reach the other workers' heaps through the
+    invalidation bus; cancelled ones are skipped when their entry comes up.
+    """
+
+    def __init__(
+        self,
+        db_path: str,
+        max_concurrent: int,
+        max_pending_per_user: int,
+        misfire_grace: float,
+        claim_timeout: float,
+        recover_interval: float
+    ):
+        self.db_path = db_path
+        self.max_concurrent = max_concurrent
+        self.max_pending_per_user = max_pending_per_user
+        self.misfire_grace = misfire_grace
+        self.claim_timeout = claim_timeout
+        self.recover_interval = recover_interval
+        self._local = threading.local()
+        self._heap: List[Tuple[float, str]] = []
+        self._dispatch: Optional[Dispatch] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._timer: Optional[asyncio.Task] = None
+        self._running: Set[asyncio.Task] = set()
+        self._connect().executescript("""
+            CREATE TABLE IF NOT EXISTS scheduled_tasks (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                user_input TEXT NOT NULL,
+                interpretation TEXT NOT NULL,
+                timezone TEXT,
+                repeat TEXT,
+                first_run_at REAL NOT NULL,
+                run_at REAL NOT NULL,
+                -- pending, running, done, missed, cancelled or interrupted
+                status TEXT NOT NULL,
+                runs INTEGER NOT NULL DEFAULT 0,
+                last_task_id TEXT,
+                claimed_at REAL,
+                created REAL NOT NULL,
+                updated REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_scheduled_status ON scheduled_tasks (status, run_at);
+            CREATE INDEX IF NOT EXISTS idx_scheduled_user ON scheduled_tasks (user_id, status, run_at);
+        """)
+        metrics.gauge("tasklinx_scheduler_timers", "Scheduled task timers held by this process", [], lambda: {(): len(self._heap)})
+        invalidation_bus.subscribe("scheduled_tasks", self._on_scheduled)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @staticmethod
+    def _task(row: sqlite3.Row) -> Dict[str, Any]:
+        task = dict(row)
+        task["interpretation"] = json.loads(task["interpretation"])
+        return task
+
+    @staticmethod
+    def to_public(task: Dict[str, Any]) -> Dict[str, Any]:
+        tz = resolve_timezone(task["timezone"])
+        return {
+            "id": task["id"],
+            "user_input": task["user_input"],
+            "action_type": task["interpretation"].get("action_type"),
+            "run_at": datetime.fromtimestamp(task["run_at"], tz).isoformat(),
+            "repeat": task["repeat"],
+            "timezone": tz.key,
+            "status": task["status"],
+            "runs": task["runs"],
+            "last_task_id": task["last_task_id"],
+            "created_at": datetime.fromtimestamp(task["created"], tz).isoformat()
+        }
+
+    # Timer
+
+    def _push(self, run_at: float, task_id: str):
+        heapq.heappush(self._heap, (run_at, task_id))
+        if self._wakeup is not None and self._heap[0][1] == task_id:
+            self._wakeup.set()
+
+    def _on_scheduled(self, key: str):
+        # Invalidation bus thread: "<id> <run_at>" from another worker
+        if self._loop is None:
+            return
+        task_id, run_at = key.rsplit(" ", 1)
+        self._loop.call_soon_threadsafe(self._push, float(run_at), task_id)
+
+    async def start(self, dispatch: Dispatch):
+        self._dispatch = dispatch
+        self._loop = asyncio.get_running_loop()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.max_concurrent)
+        self._heap = await io_pool.run(self._recover, time.time())
+        heapq.heapify(self._heap)
+        self._timer = asyncio.create_task(self._run(), name="tasklinx-scheduler")
+
+    async def stop(self):
+        if self._timer:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+        # Let tasks already executing finish, so none is left half-done and marked running
+        await asyncio.gather(*self._running, return_exceptions=True)
+        self._loop = None
+
+    async def _sweep(self):
+        """Settle claims that expired since startup, e.g. left by a worker that crashed and restarted"""
+        try:
+            for run_at, task_id in await io_pool.run(self._reclaim_stale, time.time()):
+                self._push(run_at, task_id)
+        except Exception as e:
+            print(f"Scheduler could not recover stale tasks: {e}")
+
+    async def _run(self):
+        next_sweep = time.monotonic() + self.recover_interval
+        while True:
+            self._wakeup.clear()
+            if time.monotonic() >= next_sweep:
+                await self._sweep()
+                next_sweep = time.monotonic() + self.recover_interval
+            if self._heap and self._heap[0][0] <= time.time():
+                # Wait for a free slot before claiming, so other workers can take what we can't run yet
+                await self._slots.acquire()
+                _, task_id = heapq.heappop(self._heap)
+                fire = asyncio.create_task(self._fire(task_id))
+                self._running.add(fire)
+                fire.add_done_callback(self._running.discard)
+                continue
+            timeout = next_sweep - time.monotonic()
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - time.time())
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fire(self, task_id: str):
+        try:
+            task = await io_pool.run(self._claim, task_id, time.time())
+            if task is None:
+                # Cancelled, moved to a later time, or another worker has it
+                return
+
+            missed = time.time() - task["run_at"] > self.misfire_grace
+            record_id = None
+            try:
+                record = await self._dispatch(task, missed)
+                record_id = record["id"]
+                scheduled_runs.inc(outcome="missed" if missed else "run")
+            except Exception as e:
+                print(f"Scheduled task {task_id} failed: {e}")
+                scheduled_runs.inc(outcome="failed")
+
+            next_run = await io_pool.run(self._finish, task, record_id, "missed" if missed else "done", time.time())
+            if next_run is not None:
+                self._push(next_run, task_id)
+        except Exception as e:
+            print(f"Scheduler could not run {task_id}: {e}")
+        finally:
+            self._slots.release()
+
+    # Storage
+
+    def _settle_stale(self, conn: sqlite3.Connection, now: float) -> List[Tuple[float, str]]:
+        """Settle tasks left running past the claim timeout; returns the rescheduled series' timers"""
+        stale = conn.execute(
+            f"SELECT {COLUMNS} FROM scheduled_tasks WHERE status = 'running' AND claimed_at < ?",
+            (now - self.claim_timeout,)
+        ).fetchall()
+        rescheduled = []
+        for row in stale:
+            task = self._task(row)
+            if task["repeat"]:
+                run_at = next_occurrence(task, now)
+                conn.execute(
+                    "UPDATE scheduled_tasks SET status = 'pending', run_at = ?, claimed_at = NULL, updated = ? WHERE id = ?",
+                    (run_at, now, task["id"])
+                )
+                rescheduled.append((run_at, task["id"]))
+            else:
+                # It may already have been sent, so it is not retried
+                conn.execute(
+                    "UPDATE scheduled_tasks SET status = 'interrupted', claimed_at = NULL, updated = ? WHERE id = ?",
+                    (now, task["id"])
+                )
+        return rescheduled
+
+    def _reclaim_stale(self, now: float) -> List[Tuple[float, str]]:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rescheduled = self._settle_stale(conn, now)
+        for run_at, task_id in rescheduled:
+            invalidation_bus.publish("scheduled_tasks", f"{task_id} {run_at}")
+        return rescheduled
+
+    def _recover(self, now: float) -> List[Tuple[float, str]]:
+        """Settle tasks left running by a worker that died, and return all pending timers"""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            self._settle_stale(conn, now)
+            # Overdue tasks stay pending: they fire right away, and run or count as missed by lateness
+            rows = conn.execute("SELECT run_at, id FROM scheduled_tasks WHERE status = 'pending'").fetchall()
+        return [(row["run_at"], row["id"]) for row in rows]
+
+    def _insert(self, task: Dict[str, Any]):
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            pending = conn.execute(
+                "SELECT COUNT(*) FROM scheduled_tasks WHERE user_id = ? AND status IN ('pending', 'running')",
+                (task["user_id"],)
+            ).fetchone()[0]
+            if pending >= self.max_pending_per_user:
+                raise ScheduleError(
+                    f"You already have {pending} scheduled tasks; cancel some before scheduling more"
+                )
+            conn.execute(
+                f"INSERT INTO scheduled_tasks ({COLUMNS}, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    task["id"], task["user_id"], task["user_input"], json.dumps(task["interpretation"]),
+                    task["timezone"], task["repeat"], task["first_run_at"], task["run_at"],
+                    task["status"], task["runs"], task["last_task_id"], task["created"], task["created"]
+                )
+            )
+        invalidation_bus.publish("scheduled_tasks", f"{task['id']} {task['run_at']}")
+
+    def _claim(self, task_id: str, now: float) -> Optional[Dict[str, Any]]:
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE scheduled_tasks SET status = 'running', claimed_at = ?, updated = ? "
+                "WHERE id = ? AND status = 'pending' AND run_at <= ?",
+                (now, now, task_id, now)
+            )
+            if cursor.rowcount != 1:
+                return None
+            row = conn.execute(f"SELECT {COLUMNS} FROM scheduled_tasks WHERE id = ?", (task_id,)).fetchone()
+        return self._task(row)
+
+    def _finish(self, task: Dict[str, Any], record_id: Optional[str], status: str, now: float) -> Optional[float]:
+        """Record the run; a series moves on to its next occurrence, which is returned"""
+        conn = self._connect()
+        if task["repeat"]:
+            # After downtime, missed occurrences collapse into the one run that just happened
+            next_run = next_occurrence(task, now)
+            cursor = conn.execute(
+                "UPDATE scheduled_tasks SET status = 'pending', run_at = ?, runs = runs + 1, last_task_id = ?, "
+                "claimed_at = NULL, updated = ? WHERE id = ? AND status = 'running'",
+                (next_run, record_id, now, task["id"])
+            )
+            if cursor.rowcount != 1:
+                # Cancelled while it ran
+                return None
+            invalidation_bus.publish("scheduled_tasks", f"{task['id']} {next_run}")
+            return next_run
+
+        conn.execute(
+            "UPDATE scheduled_tasks SET status = ?, runs = runs + 1, last_task_id = ?, claimed_at = NULL, updated = ? "
+            "WHERE id = ? AND status = 'running'",
+            (status, record_id, now, task["id"])
+        )
+        return None
+
+    # API
+
+    async def schedule(
+        self,
+        task_id: str,
+        user_id: str,
+        user_input: str,
+        interpretation: Dict[str, Any],
+        run_at: float,
+        repeat: Optional[str] = None,
+        timezone: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Store a task to run at `run_at` (epoch seconds), then every `repeat` if given"""
+        task = {
+            "id": task_id,
+            "user_id": user_id,
+            "user_input": user_input,
+            "interpretation": interpretation,
+            "timezone": timezone,
+            "repeat": repeat,
+            "first_run_at": run_at,
+            "run_at": run_at,
+            "status": "pending",
+            "runs": 0,
+            "last_task_id": None,
+            "created": time.time()
+        }
+        await io_pool.run(self._insert, task)
+        self._push(run_at, task_id)
+        return self.to_public(task)
+
+    def _list(self, user_id: str) -> List[Dict[str, Any]]:
+        rows = self._connect().execute(
+            f"SELECT {COLUMNS} FROM scheduled_tasks WHERE user_id = ? AND status IN ('pending', 'running') ORDER BY run_at",
+            (user_id,)
+        ).fetchall()
+        return [self.to_public(self._task(row)) for row in rows]
+
+    async def list(self, user_id: str) -> List[Dict[str, Any]]:
+        """The user's upcoming and currently running scheduled tasks, soonest first"""
+        return await io_pool.run(self._list, user_id)
+
+    def _cancel(self, user_id: str, task_id: str) -> bool:
+        # A running one-off can't be stopped; a running series just won't be rescheduled
+        cursor = self._connect().execute(
+            "UPDATE scheduled_tasks SET status = 'cancelled', updated = ? "
+            "WHERE id = ? AND user_id = ? AND (status = 'pending' OR (status = 'running' AND repeat IS NOT NULL))",
+            (time.time(), task_id, user_id)
+        )
+        return cursor.rowcount == 1
+
+    async def cancel(self, user_id: str, task_id: str) -> bool:
+        """Cancel a scheduled task; its timer entries are dropped when they come up"""
+        return await io_pool.run(self._cancel, user_id, task_id)
+
+def create_scheduler() -> Scheduler:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    return Scheduler(
+        config.SCHEDULER_DB_FILE,
+        max_concurrent=config.SCHEDULER_MAX_CONCURRENT,
+        max_pending_per_user=config.SCHEDULER_MAX_PENDING_PER_USER,
+        misfire_grace=config.SCHEDULER_MISFIRE_GRACE,
+        claim_timeout=config.SCHEDULER_CLAIM_TIMEOUT,
+        recover_interval=config.SCHEDULER_RECOVER_INTERVAL
+    )
+
+scheduler = create_scheduler()
@@ -0,0 +1,38 @@
+"""Production entry point: several uvicorn worker processes, no auto-reload.
+
+    cd backend && python serve.py --workers 4
+
+or, under gunicorn, ``gunicorn -c gunicorn_conf.py main:app``. Tokens,
+history, rate-limit buckets, async job status and idempotency records
+live in SQLite files shared by all workers, so any worker can answer
+any request; per-process caches are kept coherent by the invalidation bus.
+"""
+import argparse
+import os
+import uvicorn
+from config import config
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.HOST)
+    parser.add_argument("--port", type=int, default=config.PORT)
+    parser.add_argument("--workers", type=int, default=config.WEB_CONCURRENCY)
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args()
+
+    # Workers are spawned fresh and read this; in-memory buckets would give each worker its own limits
+    if args.workers > 1:
+        os.environ.setdefault("RATE_LIMIT_STORE", "sqlite")
+
+    print(f"🚀 Starting TaskLinx API with {args.workers} worker(s) on http://{args.host}:{args.port}")
+    uvicorn.run(
+        "main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        proxy_headers=True,
+        log_level=args.log_level
+    )
+
+if __name__ == "__main__":
+    main()
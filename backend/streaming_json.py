@@ -0,0 +1,111 @@
+import json
+from typing import Any, Dict, List, Tuple
+
+class IncrementalJSONParser:
+    """Character-level JSON parser fed with streamed completion chunks.
+
+    Emits (path, value) for every scalar as soon as its closing quote or
+    delimiter arrives, e.g. (("action_type",), "email") long before the
+    message body is generated, and keeps `partial` as the object so far.
+    Text before the first "{" is ignored.
+    """
+
+    def __init__(self):
+        # Each frame is [kind, key_or_index, awaiting_key]
+        self._stack: List[list] = []
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._buffer: List[str] = []
+        self._literal: List[str] = []
+        self.partial: Dict[str, Any] = {}
+        self.done = False
+
+    def feed(self, chunk: str) -> List[Tuple[tuple, Any]]:
+        events: List[Tuple[tuple, Any]] = []
+        for char in chunk:
+            if self.done:
+                break
+            if self._in_string:
+                self._feed_string_char(char, events)
+                continue
+
+            if not self._stack and char != "{":
+                continue
+
+            if char in " \t\r\n":
+                self._finish_literal(events)
+            elif char == "{":
+                self._open("object")
+            elif char == "[":
+                self._open("array")
+            elif char == '"':
+                self._in_string = True
+                self._string_is_key = self._stack[-1][0] == "object" and self._stack[-1][2]
+                self._buffer = []
+            elif char == ":":
+                self._finish_literal(events)
+            elif char == ",":
+                self._finish_literal(events)
+                frame = self._stack[-1]
+                if frame[0] == "object":
+                    frame[1], frame[2] = None, True
+                else:
+                    frame[1] += 1
+            elif char in "}]":
+                self._finish_literal(events)
+                self._stack.pop()
+                if not self._stack:
+                    self.done = True
+            else:
+                self._literal.append(char)
+        return events
+
+    def _feed_string_char(self, char: str, events: List[Tuple[tuple, Any]]):
+        if self._escape:
+            self._buffer.append(char)
+            self._escape = False
+        elif char == "\\":
+            self._buffer.append(char)
+            self._escape = True
+        elif char == '"':
+            self._in_string = False
+            value = json.loads('"' + "".join(self._buffer) + '"')
+            if self._string_is_key:
+                self._stack[-1][1], self._stack[-1][2] = value, False
+            else:
+                self._emit(value, events)
+        else:
+            self._buffer.append(char)
+
+    def _open(self, kind: str):
+        if self._stack:
+            self._assign(self._path(), {} if kind == "object" else [])
+        self._stack.append([kind, None, True] if kind == "object" else [kind, 0, False])
+
+    def _finish_literal(self, events: List[Tuple[tuple, Any]]):
+        if not self._literal:
+            return
+        text = "".join(self._literal)
+        self._literal = []
+        try:
+            self._emit(json.loads(text), events)
+        except ValueError:
+            pass
+
+    def _path(self) -> tuple:
+        return tuple(frame[1] for frame in self._stack)
+
+    def _emit(self, value: Any, events: List[Tuple[tuple, Any]]):
+        path = self._path()
+        self._assign(path, value)
+        events.append((path, value))
+
+    def _assign(self, path: tuple, value: Any):
+        target: Any = self.partial
+        for key in path[:-1]:
+            target = target[key]
+        if isinstance(target, list):
+            target.append(value)
+        else:
+            target[path[-1]] = value
@@ -1,54 +1,278 @@
-import json
-import os
+import asyncio
+import time
+import weakref
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any
-from config import config
-from ai_service import ai_service
-from gmail_service import gmail_service
+from typing import AsyncIterator, Callable, List, Dict, Any, Optional
+from ai_service import ai_service, PartialCallback, PARTIAL_RESET
+from auth import auth_service
+from gmail_service import gmail_service, split_recipients
 from calendar_service import calendar_service
+from history_store import create_history_store
+from io_pool import io_pool
+from ids import new_task_id
+from contacts import create_contact_book, is_email_address, ContactEntry
+from google_clients import google_clients
+from config import config
+from rate_limit import rate_limiter, RateLimitExceeded
+from scheduler import scheduler, parse_schedule, ScheduleError
+from sse import format_event
+from metrics import stage, tasks_total, task_errors
+
+# Google API used by each action type, for warming clients up early
+ACTION_APIS = {
+    "email": ("gmail", "v1"),
+    "calendar": ("calendar", "v3"),
+}
 
 class TaskService:
     def __init__(self):
-        os.makedirs(config.CREDS_DIR, exist_ok=True)
+        self.history_store = create_history_store()
+        self.contacts = create_contact_book(sent_history=self._sent_recipients)
+        # Per-user limit on concurrently running Gmail/Calendar actions
+        self._user_semaphores = weakref.WeakValueDictionary()
+        self._background_tasks = set()
     
-    def execute_task(self, user_id: str, user_input: str) -> Dict[str, Any]:
+    def _user_semaphore(self, user_id: str) -> asyncio.Semaphore:
+        semaphore = self._user_semaphores.get(user_id)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(config.USER_ACTION_CONCURRENCY)
+            self._user_semaphores[user_id] = semaphore
+        return semaphore
+    
+    async def execute_task(
+        self,
+        user_id: str,
+        user_input: str,
+        task_id: Optional[str] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        timezone: Optional[str] = None
+    ) -> Dict[str, Any]:
         """Execute a natural language task using TaskLinx AI"""
         
         # Interpret the task using AI
-        interpretation = ai_service.interpret_task(user_input)
+        if on_progress:
+            on_progress("interpreting")
+        with stage("interpret"):
+            interpretation = await ai_service.interpret_task(
+                user_input,
+                on_partial=self._warm_up_callback(user_id),
+                timezone=timezone
+            )
+        
+        return await self.run_interpretation(user_id, user_input, interpretation, task_id, on_progress, timezone)
+    
+    async def stream_interpretation(self, user_id: str, user_input: str, timezone: Optional[str] = None) -> AsyncIterator[str]:
+        """Interpret a task, streaming partial fields and the final interpretation as SSE"""
+        events: asyncio.Queue = asyncio.Queue()
+        warm_up = self._warm_up_callback(user_id)
+        
+        def on_partial(path: tuple, value: Any):
+            if path == PARTIAL_RESET:
+                # Escalated to the next model: clients discard the partial fields received so far
+                events.put_nowait(format_event("reset", {}))
+                return
+            warm_up(path, value)
+            events.put_nowait(format_event("partial", {"path": list(path), "value": value}))
+        
+        interpretation_task = asyncio.create_task(
+            ai_service.interpret_task(user_input, on_partial=on_partial, timezone=timezone)
+        )
+        interpretation_task.add_done_callback(lambda _: events.put_nowait(None))
+        
+        while True:
+            event = await events.get()
+            if event is None:
+                break
+            yield event
+        
+        yield format_event("interpretation", interpretation_task.result())
+    
+    def _warm_up_callback(self, user_id: str) -> PartialCallback:
+        """Start loading credentials as soon as the streamed action_type names a Google service"""
+        def on_partial(path: tuple, value: Any):
+            if path != ("action_type",) or value not in ACTION_APIS:
+                return
+            warm_up = asyncio.get_running_loop().create_task(io_pool.run(self._warm_up, user_id, value))
+            self._background_tasks.add(warm_up)
+            warm_up.add_done_callback(self._background_tasks.discard)
+        return on_partial
+    
+    def _warm_up(self, user_id: str, action_type: str):
+        # Loads (and if needed refreshes) the user's cached credentials
+        try:
+            credentials = auth_service.get_user_credentials(user_id)
+            if credentials:
+                google_clients.get_document(*ACTION_APIS[action_type])
+        except Exception:
+            # Best effort: the execution step reports credential errors itself
+            pass
+    
+    async def execute_batch(self, user_id: str, user_inputs: List[str], timezone: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Execute several tasks, or one input describing several actions, concurrently"""
+        if len(user_inputs) == 1:
+            # One LLM call splits the input into its separate actions
+            interpretations = await ai_service.interpret_multi_task(user_inputs[0], timezone=timezone)
+            items = [(interpretation.pop("user_input"), interpretation) for interpretation in interpretations]
+        else:
+            interpretations = await asyncio.gather(*[
+                ai_service.interpret_task(user_input, timezone=timezone) for user_input in user_inputs
+            ])
+            items = list(zip(user_inputs, interpretations))
+        
+        return await asyncio.gather(*[
+            self.run_interpretation(user_id, user_input, interpretation, timezone=timezone)
+            for user_input, interpretation in items
+        ])
+    
+    async def run_interpretation(
+        self,
+        user_id: str,
+        user_input: str,
+        interpretation: Dict[str, Any],
+        task_id: Optional[str] = None,
+        on_progress: Optional[Callable[[str], None]] = None,
+        timezone: Optional[str] = None,
+        scheduled_task_id: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """Execute an interpreted task (or schedule it, if it is meant for later) and record it in the user's history"""
         
         # Create task record
         task_record = {
-            "id": f"task_{datetime.now().strftime('%Y%m%d_%H%M%S')}",
+            "id": task_id or new_task_id(),
             "timestamp": datetime.now().isoformat(),
             "user_input": user_input,
             "interpretation": interpretation,
             "result": None,
             "status": "processing"
         }
+        if scheduled_task_id:
+            task_record["scheduled_task_id"] = scheduled_task_id
         
-        # Execute based on action type
-        if interpretation["action_type"] == "email":
-            task_record["result"] = self._execute_email_task(user_id, interpretation["parameters"])
-        elif interpretation["action_type"] == "calendar":
-            task_record["result"] = self._execute_calendar_task(user_id, interpretation["parameters"])
-        else:
-            task_record["result"] = {
-                "success": False,
-                "error": f"Unknown action type: {interpretation['action_type']}"
-            }
+        # "Send this tomorrow at 9am": hand it to the scheduler instead of executing it now
+        action_type = interpretation.get("action_type", "unknown")
+        if interpretation.get("schedule") and action_type in ACTION_APIS and not scheduled_task_id:
+            scheduled = await self._schedule(user_id, user_input, interpretation, task_record, timezone)
+            if scheduled is not None:
+                return scheduled
+        
+        # Execute based on action type (Google client calls block, so they run in the I/O pool)
+        if on_progress:
+            on_progress("executing")
+        recipients = split_recipients(interpretation["parameters"]) if action_type == "email" else []
+        async with self._user_semaphore(user_id):
+            # Bulk sends pace themselves batch by batch
+            throttled = None if len(recipients) > 1 else await self._acquire_backend(user_id, action_type)
+            if throttled:
+                task_record["result"] = throttled
+            elif len(recipients) > 1:
+                with stage("execute_email"):
+                    task_record["result"] = await self._execute_bulk_email_task(user_id, recipients, interpretation["parameters"])
+            elif action_type == "email":
+                with stage("execute_email"):
+                    task_record["result"] = await io_pool.run(self._execute_email_task, user_id, interpretation["parameters"])
+            elif action_type == "calendar":
+                with stage("execute_calendar"):
+                    task_record["result"] = await io_pool.run(
+                        self._execute_calendar_task, user_id, interpretation["parameters"], timezone
+                    )
+            else:
+                task_record["result"] = {
+                    "success": False,
+                    "error": f"Unknown action type: {action_type}"
+                }
         
         # Update status
         task_record["status"] = "completed" if task_record["result"].get("success") else "failed"
+        metric_action = action_type if action_type in ACTION_APIS else "other"
+        tasks_total.inc(action_type=metric_action, status=task_record["status"])
+        if task_record["status"] == "failed":
+            task_errors.inc(action_type=metric_action)
         
         # Save task to history
-        self._save_task_to_history(user_id, task_record)
+        with stage("history_save"):
+            await io_pool.run(self._save_task_to_history, user_id, task_record)
         
         return task_record
     
+    async def _schedule(
+        self,
+        user_id: str,
+        user_input: str,
+        interpretation: Dict[str, Any],
+        task_record: Dict[str, Any],
+        timezone: Optional[str]
+    ) -> Optional[Dict[str, Any]]:
+        """Store a task for later and record that in history; None if it is due now after all"""
+        try:
+            when = parse_schedule(interpretation["schedule"], timezone, time.time())
+            if when is None:
+                return None
+            run_at, repeat = when
+            scheduled = await scheduler.schedule(
+                task_record["id"], user_id, user_input, interpretation, run_at, repeat, timezone
+            )
+            task_record["result"] = {"success": True, "scheduled": scheduled}
+            task_record["status"] = "scheduled"
+        except ScheduleError as e:
+            task_record["result"] = {"success": False, "error": str(e)}
+            task_record["status"] = "failed"
+        
+        tasks_total.inc(action_type=interpretation["action_type"], status=task_record["status"])
+        with stage("history_save"):
+            await io_pool.run(self._save_task_to_history, user_id, task_record)
+        return task_record
+    
+    async def run_scheduled(self, scheduled: Dict[str, Any], missed: bool = False) -> Dict[str, Any]:
+        """Run one occurrence of a scheduled task as it comes due (the scheduler's dispatch callback)"""
+        if not missed:
+            return await self.run_interpretation(
+                scheduled["user_id"],
+                scheduled["user_input"],
+                scheduled["interpretation"],
+                timezone=scheduled["timezone"],
+                scheduled_task_id=scheduled["id"]
+            )
+        
+        # Due too long ago (TaskLinx was down): record it as failed rather than act late
+        due = datetime.fromisoformat(scheduler.to_public(scheduled)["run_at"])
+        task_record = {
+            "id": new_task_id(),
+            "timestamp": datetime.now().isoformat(),
+            "user_input": scheduled["user_input"],
+            "interpretation": scheduled["interpretation"],
+            "result": {"success": False, "error": f"Missed: this was due {due:%a %d %b at %H:%M} and TaskLinx was unavailable"},
+            "status": "failed",
+            "scheduled_task_id": scheduled["id"]
+        }
+        action_type = scheduled["interpretation"]["action_type"]
+        tasks_total.inc(action_type=action_type, status="failed")
+        task_errors.inc(action_type=action_type)
+        await io_pool.run(self._save_task_to_history, scheduled["user_id"], task_record)
+        return task_record
+    
+    async def list_scheduled(self, user_id: str) -> List[Dict[str, Any]]:
+        return await scheduler.list(user_id)
+    
+    async def cancel_scheduled(self, user_id: str, task_id: str) -> bool:
+        return await scheduler.cancel(user_id, task_id)
+    
+    async def _acquire_backend(self, user_id: str, action_type: str) -> Optional[Dict[str, Any]]:
+        """Wait for the Gmail/Calendar rate limit; returns a failure result if it stays exhausted"""
+        if action_type not in ACTION_APIS:
+            return None
+        try:
+            api, _ = ACTION_APIS[action_type]
+            await rate_limiter.acquire(api, key=user_id, max_wait=config.BACKEND_RATE_LIMIT_MAX_WAIT)
+        except RateLimitExceeded as e:
+            return {"success": False, "error": str(e), "retry_after": e.retry_after}
+        return None
+    
     def _execute_email_task(self, user_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
         """Execute an email task via Gmail API"""
         required_fields = ["recipient", "subject", "message"]
+        # The model may put a lone recipient in the "recipients" list
+        parameters = {**parameters, "recipient": next(iter(split_recipients(parameters)), None)}
         
         # Check required fields
         missing_fields = [field for field in required_fields if not parameters.get(field)]
@@ -58,15 +282,134 @@ class TaskService:
                 "error": f"Missing required fields: {', '.join(missing_fields)}"
             }
         
+        # Bare names ("Alice") are looked up in the user's contacts
+        recipient = parameters["recipient"]
+        address, candidates = self.contacts.resolve(user_id, recipient)
+        if address is None:
+            return self._unresolved_recipient(recipient, candidates)
+        
         # Send email via Gmail
-        return gmail_service.send_email(
+        result = gmail_service.send_email(
             user_id=user_id,
-            recipient=parameters["recipient"],
+            recipient=address,
             subject=parameters["subject"],
             message=parameters["message"]
         )
+        if result["success"]:
+            self._remember_recipients(user_id, [(None if address == recipient else recipient, address)])
+        return result
     
-    def _execute_calendar_task(self, user_id: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+    def _unresolved_recipient(self, recipient: str, candidates: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Failure result for a name that matches no contact, several, or one only approximately (listed as candidates)"""
+        if not candidates:
+            return {
+                "success": False,
+                "error": f'No contact matches "{recipient}"; use an email address or import your contacts'
+            }
+        options = ", ".join(
+            f"{candidate['name']} <{candidate['email']}>" if candidate["name"] else candidate["email"]
+            for candidate in candidates
+        )
+        if len(candidates) == 1:
+            error = f'"{recipient}" does not exactly match a contact; did you mean {options}?'
+        else:
+            error = f'"{recipient}" matches several contacts: {options}'
+        return {
+            "success": False,
+            "error": error,
+            "candidates": [{"name": candidate["name"], "email": candidate["email"]} for candidate in candidates]
+        }
+    
+    def _resolve_recipients(self, user_id: str, recipients: List[str]) -> List[tuple]:
+        return [(recipient, *self.contacts.resolve(user_id, recipient)) for recipient in recipients]
+    
+    def _remember_recipients(self, user_id: str, entries: List[ContactEntry]):
+        # The mail is already sent; a failed contact update must not turn it into a failed task
+        try:
+            self.contacts.record_sent(user_id, entries)
+        except Exception as e:
+            print(f"Failed to update contacts for {user_id}: {e}")
+    
+    async def _execute_bulk_email_task(self, user_id: str, recipients: List[str], parameters: Dict[str, Any]) -> Dict[str, Any]:
+        """Send a message to each recipient via Gmail batch requests, paced by the user's gmail quota"""
+        missing_fields = [field for field in ("subject", "message") if not parameters.get(field)]
+        if missing_fields:
+            return {
+                "success": False,
+                "error": f"Missing required fields: {', '.join(missing_fields)}"
+            }
+        if len(recipients) > config.GMAIL_BULK_MAX_RECIPIENTS:
+            return {
+                "success": False,
+                "error": f"Too many recipients ({len(recipients)}); the limit is {config.GMAIL_BULK_MAX_RECIPIENTS}"
+            }
+        
+        # Results are keyed by address, or by the name for names that did not resolve
+        results: Dict[str, Dict[str, Any]] = {}
+        keys: List[str] = []
+        names: Dict[str, Optional[str]] = {}
+        pending = deque()
+        for recipient, address, candidates in await io_pool.run(self._resolve_recipients, user_id, recipients):
+            if address is None:
+                results[recipient] = {"recipient": recipient, **self._unresolved_recipient(recipient, candidates)}
+                keys.append(recipient)
+            elif address not in names:
+                names[address] = None if address == recipient else recipient
+                pending.append(address)
+                keys.append(address)
+        
+        # A batch never asks for more tokens than the bucket can hold
+        rate, capacity = config.RATE_LIMITS["gmail"]
+        batch_size = config.GMAIL_BATCH_SIZE if rate <= 0 else max(1, min(config.GMAIL_BATCH_SIZE, int(capacity)))
+        attempts: Dict[str, int] = {}
+        while pending:
+            batch = [pending.popleft() for _ in range(min(batch_size, len(pending)))]
+            try:
+                await rate_limiter.acquire("gmail", key=user_id, tokens=len(batch), max_wait=config.GMAIL_BULK_MAX_WAIT)
+            except RateLimitExceeded as e:
+                for recipient in batch + list(pending):
+                    results[recipient] = {"recipient": recipient, "success": False, "error": str(e), "retry_after": e.retry_after}
+                break
+            
+            rejected = 0
+            for result in await io_pool.run(gmail_service.send_bulk_email, user_id, batch, parameters["subject"], parameters["message"]):
+                recipient = result["recipient"]
+                attempts[recipient] = attempts.get(recipient, 0) + 1
+                # Gmail rejected it (429), so it was not sent: requeue behind the rest
+                if result.pop("retryable", False) and attempts[recipient] < config.RETRY_ATTEMPTS:
+                    pending.append(recipient)
+                    rejected += 1
+                else:
+                    if names[recipient]:
+                        result["name"] = names[recipient]
+                    results[recipient] = result
+            if rejected:
+                await asyncio.sleep(min(config.RETRY_MAX_DELAY, config.RETRY_BASE_DELAY * 2 ** max(attempts.values())))
+        
+        ordered = [results[key] for key in keys]
+        sent = [result["recipient"] for result in ordered if result["success"]]
+        if sent:
+            await io_pool.run(self._remember_recipients, user_id, [(names[address], address) for address in sent])
+        failed = [result for result in ordered if not result["success"]]
+        bulk_result = {
+            # Partly sent still counts as done, so resubmitting does not re-send to everyone
+            "success": bool(sent),
+            "sent": len(sent),
+            "failed": len(failed),
+            "results": ordered,
+            "details": {
+                "to": ", ".join(sent),
+                "subject": parameters["subject"],
+                "from": auth_service.get_user_email(user_id)
+            }
+        }
+        if failed:
+            bulk_result["error"] = f"Sent to {len(sent)} of {len(ordered)} recipients; failed: " + ", ".join(
+                f"{result['recipient']} ({result['error']})" for result in failed
+            )
+        return bulk_result
+    
+    def _execute_calendar_task(self, user_id: str, parameters: Dict[str, Any], timezone: Optional[str] = None) -> Dict[str, Any]:
         """Execute a calendar task via Google Calendar API"""
         required_fields = ["title"]
         
@@ -84,36 +427,47 @@ class TaskService:
             title=parameters["title"],
             start_time=parameters.get("start_time"),
             end_time=parameters.get("end_time"),
-            description=parameters.get("description", "")
+            description=parameters.get("description", ""),
+            timezone=timezone
         )
     
+    def _sent_recipients(self, user_id: str) -> List[ContactEntry]:
+        """Addresses the user's completed email tasks went to, for seeding their contacts"""
+        entries = []
+        tasks = self.history_store.recent(
+            user_id, config.HISTORY_MAX_TASKS_PER_USER or 1000, action_type="email", status="completed"
+        )
+        for task in tasks:
+            result = task.get("result") or {}
+            if "results" in result:
+                addresses = [item["recipient"] for item in result["results"] if item.get("success")]
+            else:
+                addresses = ((result.get("details") or {}).get("to") or "").split(", ")
+            entries.extend((None, address) for address in addresses if is_email_address(address))
+        return entries
+    
+    async def import_contacts(self, user_id: str, entries: List[ContactEntry]) -> int:
+        """Add (name, address) pairs to the user's contacts; invalid addresses are skipped"""
+        return await io_pool.run(self.contacts.import_contacts, user_id, entries)
+    
+    async def search_contacts(self, user_id: str, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Contacts matching a name or address prefix, for recipient autocompletion"""
+        return await io_pool.run(self.contacts.search, user_id, query, limit)
+    
     def _save_task_to_history(self, user_id: str, task_record: Dict[str, Any]):
         """Save task to user's history for TaskLinx dashboard"""
-        history_data = {}
-        if os.path.exists(config.TASKS_FILE):
-            with open(config.TASKS_FILE, 'r') as f:
-                history_data = json.load(f)
-        
-        if user_id not in history_data:
-            history_data[user_id] = []
-        
-        history_data[user_id].append(task_record)
-        
-        # Keep only last 100 tasks per user
-        history_data[user_id] = history_data[user_id][-100:]
-        
-        with open(config.TASKS_FILE, 'w') as f:
-            json.dump(history_data, f, indent=2)
+        self.history_store.append(user_id, task_record)
     
-    def get_task_history(self, user_id: str, limit: int = 20) -> List[Dict[str, Any]]:
-        """Get user's task history for TaskLinx dashboard"""
-        if not os.path.exists(config.TASKS_FILE):
-            return []
-        
-        with open(config.TASKS_FILE, 'r') as f:
-            history_data = json.load(f)
-        
-        user_tasks = history_data.get(user_id, [])
-        return user_tasks[-limit:][::-1]  # Return latest tasks first
+    async def get_task_history(self, user_id: str, limit: int = 20, before: Optional[str] = None, **filters) -> List[Dict[str, Any]]:
+        """Get user's task history for TaskLinx dashboard (filters: since, action_type, status, query)"""
+        return await io_pool.run(self.history_store.recent, user_id, limit, before, **filters)  # Latest tasks first
+    
+    async def get_history_version(self, user_id: str) -> int:
+        """Changes whenever the user's history does; cheap enough to check before every history query"""
+        return await io_pool.run(self.history_store.version, user_id)
+    
+    async def get_task(self, user_id: str, task_id: str) -> Optional[Dict[str, Any]]:
+        """Get a single task from the user's history by id"""
+        return await io_pool.run(self.history_store.get, user_id, task_id)
 
 task_service = TaskService() 
\ No newline at end of file
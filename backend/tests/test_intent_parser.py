@@ -0,0 +1,42 @@
+from datetime import datetime
+import pytest
+from config import config
+from intent_parser import intent_parser
+
+NOW = datetime(2026, 10, 14, 9, 0)  # a Wednesday
+
+@pytest.mark.parametrize("text", [
+    "The meeting at 3pm tomorrow is cancelled",
+    "What meeting do I have tomorrow at 3pm?",
+    "Any meeting tomorrow at 3pm?",
+    "Our sync tomorrow at 3pm is moved to 4pm",
+    "Lunch with Bob got moved to 1pm tomorrow",
+    "Schedule an email to Bob tomorrow at 9am saying the report is ready",
+    "Cancel my meeting at 3pm tomorrow",
+    "Move the team sync to 4pm tomorrow",
+    "Delete the standup on friday at 9am",
+    "Tell Bob the review is at 3pm tomorrow",
+    "Ask Alice if lunch at noon tomorrow works",
+    "Add Bob to the design review at 2pm friday",
+])
+def test_not_a_confident_calendar_create(text):
+    parsed = intent_parser.parse(text, now=NOW)
+    assert parsed is None or parsed["confidence"] < config.FAST_PATH_CONFIDENCE_THRESHOLD
+
+@pytest.mark.parametrize("text, title, start", [
+    ("Schedule a meeting with Bob tomorrow at 3pm", "Meeting with Bob", "2026-10-15T15:00:00"),
+    ("Book a call with the vendor on friday at 10am for 30 minutes", "Call with the vendor", "2026-10-16T10:00:00"),
+    ("Set up interview with Dana 2026-10-20 at 14:30", "Interview with Dana", "2026-10-20T14:30:00"),
+    ("Add dentist appointment to my calendar tomorrow at 9am", "Dentist appointment", "2026-10-15T09:00:00"),
+])
+def test_imperative_create(text, title, start):
+    parsed = intent_parser.parse(text, now=NOW)
+    assert parsed["action_type"] == "calendar"
+    assert parsed["confidence"] >= config.FAST_PATH_CONFIDENCE_THRESHOLD
+    assert parsed["parameters"]["title"] == title
+    assert parsed["parameters"]["start_time"] == start
+
+def test_noun_led_phrase_is_left_to_the_llm():
+    parsed = intent_parser.parse("Team sync tomorrow at 3pm", now=NOW)
+    assert parsed["parameters"]["title"] == "Team sync"
+    assert parsed["confidence"] < config.FAST_PATH_CONFIDENCE_THRESHOLD
@@ -0,0 +1,94 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Any, Dict, Optional
+from config import config
+
+class SQLiteTokenStore:
+    """Users' Google OAuth tokens in SQLite, safe to share between worker processes.
+
+    Each write is its own transaction, so concurrent refreshes in different
+    workers cannot interleave into a corrupt file the way tokens.json could.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connect().execute("""
+            CREATE TABLE IF NOT EXISTS tokens (
+                user_id TEXT PRIMARY KEY,
+                token_info TEXT NOT NULL,
+                email TEXT,
+                updated_at REAL NOT NULL DEFAULT (julianday('now'))
+            )
+        """)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def get(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Return the stored token info (including "email") or None"""
+        row = self._connect().execute(
+            "SELECT token_info, email FROM tokens WHERE user_id = ?", (user_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return {**json.loads(row[0]), "email": row[1]}
+
+    def put(self, user_id: str, token_info: Dict[str, Any], email: Optional[str] = None):
+        """Store tokens; with email=None the previously captured address is kept"""
+        token_info = {key: value for key, value in token_info.items() if key != "email"}
+        self._connect().execute(
+            "INSERT INTO tokens (user_id, token_info, email, updated_at) VALUES (?, ?, ?, julianday('now')) "
+            "ON CONFLICT(user_id) DO UPDATE SET token_info = excluded.token_info, "
+            "email = COALESCE(excluded.email, tokens.email), updated_at = excluded.updated_at",
+            (user_id, json.dumps(token_info), email)
+        )
+
+    def set_email(self, user_id: str, email: str) -> bool:
+        cursor = self._connect().execute("UPDATE tokens SET email = ? WHERE user_id = ?", (email, user_id))
+        return cursor.rowcount > 0
+
+    def import_tokens(self, tokens_data: Dict[str, Dict[str, Any]]):
+        """Bulk-load {user_id: token_info} without overwriting users already in the store"""
+        conn = self._connect()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR IGNORE INTO tokens (user_id, token_info, email) VALUES (?, ?, ?)",
+                [
+                    (user_id, json.dumps({k: v for k, v in info.items() if k != "email"}), info.get("email"))
+                    for user_id, info in tokens_data.items()
+                ]
+            )
+
+def migrate_json_tokens(store: SQLiteTokenStore, json_path: str) -> int:
+    """One-shot import of the legacy tokens.json file (renamed to ``<name>.migrated`` afterwards)"""
+    try:
+        with open(json_path, 'r') as f:
+            tokens_data = json.load(f)
+    except FileNotFoundError:
+        return 0
+
+    store.import_tokens(tokens_data)
+
+    try:
+        os.replace(json_path, f"{json_path}.migrated")
+    except FileNotFoundError:
+        # Another worker finished the migration first
+        pass
+    return len(tokens_data)
+
+def create_token_store() -> SQLiteTokenStore:
+    os.makedirs(config.CREDS_DIR, exist_ok=True)
+    store = SQLiteTokenStore(config.TOKENS_DB_FILE)
+    migrate_json_tokens(store, config.TOKENS_FILE)
+    return store
@@ -1,30 +1,90 @@
-import React, { useState, useEffect } from 'react';
-import { Clock, Mail, Calendar, CheckCircle, XCircle, RefreshCw, Zap } from 'lucide-react';
+import React, { useState, useEffect, useCallback } from 'react';
+import { Clock, Mail, Calendar, CheckCircle, XCircle, RefreshCw, Zap, Search } from 'lucide-react';
 import { Task } from '../types';
 import { apiService } from '../services/api';
 
+const PAGE_SIZE = 20;
+const POLL_INTERVAL_MS = 15000;
+
 export const TaskHistory: React.FC = () => {
   const [tasks, setTasks] = useState<Task[]>([]);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState<string | null>(null);
+  const [actionType, setActionType] = useState('');
+  const [status, setStatus] = useState('');
+  const [search, setSearch] = useState('');
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [latestCursor, setLatestCursor] = useState<string | null>(null);
+  const [isLoadingMore, setIsLoadingMore] = useState(false);
+
+  const filters = { action_type: actionType, status, q: search.trim() };
 
-  const loadHistory = async () => {
+  const loadHistory = useCallback(async () => {
     setIsLoading(true);
     setError(null);
     try {
-      const response = await apiService.getTaskHistory(20);
-      setTasks(response.tasks);
+      const page = await apiService.getTaskHistory({ limit: PAGE_SIZE, ...filters });
+      setTasks(page.tasks);
+      setNextCursor(page.next_cursor);
+      setLatestCursor(page.latest_cursor);
     } catch (err) {
       setError('Failed to load task history');
       console.error('Failed to load history:', err);
     } finally {
       setIsLoading(false);
     }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [actionType, status, search]);
+
+  // Poll for tasks newer than the newest one shown: usually a 304 or a small delta
+  const refreshHistory = useCallback(async () => {
+    if (!latestCursor) {
+      return loadHistory();
+    }
+    try {
+      const page = await apiService.getTaskHistory({ limit: PAGE_SIZE, since: latestCursor, ...filters });
+      if (page.delta) {
+        // A 304 replays the cached delta, so skip tasks already shown
+        setTasks((current) => {
+          const fresh = page.tasks.filter((task) => !current.some((shown) => shown.id === task.id));
+          return fresh.length ? [...fresh, ...current] : current;
+        });
+      } else {
+        setTasks(page.tasks);
+        setNextCursor(page.next_cursor);
+      }
+      setLatestCursor(page.latest_cursor);
+    } catch (err) {
+      console.error('Failed to refresh history:', err);
+    }
+    // eslint-disable-next-line react-hooks/exhaustive-deps
+  }, [latestCursor, loadHistory]);
+
+  const loadMore = async () => {
+    if (!nextCursor) {
+      return;
+    }
+    setIsLoadingMore(true);
+    try {
+      const page = await apiService.getTaskHistory({ limit: PAGE_SIZE, before: nextCursor, ...filters });
+      setTasks((current) => [...current, ...page.tasks]);
+      setNextCursor(page.next_cursor);
+    } catch (err) {
+      console.error('Failed to load more history:', err);
+    } finally {
+      setIsLoadingMore(false);
+    }
   };
 
   useEffect(() => {
-    loadHistory();
-  }, []);
+    const timeout = setTimeout(loadHistory, 300);  // Debounce search typing
+    return () => clearTimeout(timeout);
+  }, [loadHistory]);
+
+  useEffect(() => {
+    const interval = setInterval(refreshHistory, POLL_INTERVAL_MS);
+    return () => clearInterval(interval);
+  }, [refreshHistory]);
 
   const getActionIcon = (actionType: string) => {
     switch (actionType) {
@@ -41,6 +101,9 @@ export const TaskHistory: React.FC = () => {
     if (status === 'processing') {
       return <RefreshCw size={16} className="text-yellow-600 animate-spin" />;
     }
+    if (status === 'scheduled') {
+      return <Clock size={16} className="text-indigo-600" />;
+    }
     return success ? (
       <CheckCircle size={16} className="text-green-600" />
     ) : (
@@ -48,7 +111,7 @@ export const TaskHistory: React.FC = () => {
     );
   };
 
-  if (isLoading) {
+  if (isLoading && tasks.length === 0 && !filters.action_type && !filters.status && !filters.q) {
     return (
       <div className="flex justify-center items-center py-12">
         <div className="text-center">
@@ -74,7 +137,41 @@ export const TaskHistory: React.FC = () => {
     );
   }
 
-  if (tasks.length === 0) {
+  const filterBar = (
+    <div className="flex flex-wrap items-center gap-2">
+      <div className="relative flex-1 min-w-[12rem]">
+        <Search size={14} className="absolute left-2 top-1/2 -translate-y-1/2 text-gray-400" />
+        <input
+          type="text"
+          value={search}
+          onChange={(e) => setSearch(e.target.value)}
+          placeholder="Search tasks..."
+          className="w-full pl-7 pr-2 py-1.5 text-sm border border-gray-200 rounded-lg focus:outline-none focus:ring-2 focus:ring-blue-500"
+        />
+      </div>
+      <select
+        value={actionType}
+        onChange={(e) => setActionType(e.target.value)}
+        className="px-2 py-1.5 text-sm border border-gray-200 rounded-lg"
+      >
+        <option value="">All actions</option>
+        <option value="email">Email</option>
+        <option value="calendar">Calendar</option>
+      </select>
+      <select
+        value={status}
+        onChange={(e) => setStatus(e.target.value)}
+        className="px-2 py-1.5 text-sm border border-gray-200 rounded-lg"
+      >
+        <option value="">All statuses</option>
+        <option value="completed">Completed</option>
+        <option value="scheduled">Scheduled</option>
+        <option value="failed">Failed</option>
+      </select>
+    </div>
+  );
+
+  if (tasks.length === 0 && !filters.action_type && !filters.status && !filters.q) {
     return (
       <div className="text-center py-12 text-gray-600">
         <Clock size={64} className="mx-auto mb-6 text-gray-300" />
@@ -93,7 +190,7 @@ export const TaskHistory: React.FC = () => {
           TaskLinx History
         </h2>
         <button
-          onClick={loadHistory}
+          onClick={refreshHistory}
           className="p-2 text-gray-600 hover:text-blue-600 hover:bg-blue-50 rounded-lg transition-colors"
           title="Refresh history"
         >
@@ -101,6 +198,12 @@ export const TaskHistory: React.FC = () => {
         </button>
       </div>
 
+      {filterBar}
+
+      {tasks.length === 0 && (
+        <p className="text-center text-sm text-gray-500 py-6">No tasks match these filters.</p>
+      )}
+
       <div className="space-y-3">
         {tasks.map((task) => (
           <div key={task.id} className="border border-gray-200 rounded-lg p-4 hover:bg-gray-50 transition-colors shadow-sm">
@@ -164,6 +267,18 @@ export const TaskHistory: React.FC = () => {
           </div>
         ))}
       </div>
+
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={loadMore}
+            disabled={isLoadingMore}
+            className="px-4 py-2 text-sm text-blue-600 hover:bg-blue-50 rounded-lg transition-colors disabled:opacity-50"
+          >
+            {isLoadingMore ? 'Loading...' : 'Load older tasks'}
+          </button>
+        </div>
+      )}
     </div>
   );
 }; 
\ No newline at end of file
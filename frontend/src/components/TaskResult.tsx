@@ -1,6 +1,7 @@
-import React from 'react';
-import { CheckCircle, XCircle, Mail, Calendar, ExternalLink, Brain, Zap } from 'lucide-react';
+import React, { useState } from 'react';
+import { CheckCircle, XCircle, Mail, Calendar, Clock, ExternalLink, Brain, Zap } from 'lucide-react';
 import { TaskResult as TaskResultType, TaskInterpretation } from '../types';
+import { apiService } from '../services/api';
 
 interface TaskResultProps {
   result: TaskResultType;
@@ -10,6 +11,19 @@ interface TaskResultProps {
 export const TaskResult: React.FC<TaskResultProps> = ({ result, interpretation }) => {
   const isSuccess = result.success;
   const actionType = interpretation.action_type;
+  const scheduled = result.scheduled;
+  const [cancelState, setCancelState] = useState<'idle' | 'cancelling' | 'cancelled' | 'error'>('idle');
+
+  const cancelScheduled = async () => {
+    if (!scheduled) return;
+    setCancelState('cancelling');
+    try {
+      await apiService.cancelScheduledTask(scheduled.id);
+      setCancelState('cancelled');
+    } catch {
+      setCancelState('error');
+    }
+  };
 
   const getActionIcon = () => {
     switch (actionType) {
@@ -49,7 +63,7 @@ export const TaskResult: React.FC<TaskResultProps> = ({ result, interpretation }
               {getActionIcon()}
             </div>
             <h3 className="text-lg font-semibold text-gray-900">
-              {isSuccess ? 'Task Completed Successfully! 🎉' : 'Task Failed ❌'}
+              {!isSuccess ? 'Task Failed ❌' : scheduled ? 'Task Scheduled ⏰' : 'Task Completed Successfully! 🎉'}
             </h3>
           </div>
 
@@ -77,6 +91,32 @@ export const TaskResult: React.FC<TaskResultProps> = ({ result, interpretation }
           {/* Result Details */}
           {isSuccess ? (
             <div className="space-y-3">
+              {scheduled && (
+                <div className="bg-indigo-50 p-4 rounded-lg border border-indigo-200">
+                  <h5 className="font-medium text-indigo-900 mb-2 flex items-center gap-2">
+                    <Clock size={16} />
+                    {scheduled.repeat ? `Repeats ${scheduled.repeat}` : 'Runs once'}
+                  </h5>
+                  <div className="text-sm space-y-1">
+                    <p>
+                      <span className="font-medium text-indigo-800">{scheduled.repeat ? 'First run:' : 'Runs at:'}</span>{' '}
+                      <span className="text-indigo-700">{new Date(scheduled.run_at).toLocaleString()}</span>
+                    </p>
+                    {cancelState === 'cancelled' ? (
+                      <p className="text-indigo-700">Cancelled.</p>
+                    ) : (
+                      <button
+                        onClick={cancelScheduled}
+                        disabled={cancelState === 'cancelling'}
+                        className="mt-2 text-sm font-medium text-indigo-700 hover:text-indigo-900 hover:underline disabled:opacity-50"
+                      >
+                        {cancelState === 'error' ? 'Could not cancel, try again' : 'Cancel'}
+                      </button>
+                    )}
+                  </div>
+                </div>
+              )}
+
               {actionType === 'email' && result.details && (
                 <div className="bg-blue-50 p-4 rounded-lg border border-blue-200">
                   <h5 className="font-medium text-blue-900 mb-2 flex items-center gap-2">
@@ -90,6 +130,16 @@ export const TaskResult: React.FC<TaskResultProps> = ({ result, interpretation }
                     {result.message_id && (
                       <p><span className="font-medium text-blue-800">Message ID:</span> <span className="text-blue-700 font-mono text-xs">{result.message_id}</span></p>
                     )}
+                    {result.results && result.results.some((item) => !item.success) && (
+                      <div className="mt-2 pt-2 border-t border-blue-200">
+                        <p className="font-medium text-red-800">Not sent to {result.failed} of {result.results.length} recipients:</p>
+                        <ul className="list-disc list-inside text-red-700">
+                          {result.results.filter((item) => !item.success).map((item) => (
+                            <li key={item.recipient}>{item.recipient}: {item.error}</li>
+                          ))}
+                        </ul>
+                      </div>
+                    )}
                   </div>
                 </div>
               )}
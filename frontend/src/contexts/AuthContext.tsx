@@ -1,6 +1,6 @@
 import React, { createContext, useContext, useState, useEffect, ReactNode } from 'react';
 import { AuthState, User } from '../types';
-import { apiService } from '../services/api';
+import { apiService, clearTokens, storeTokens } from '../services/api';
 
 interface AuthContextType extends AuthState {
   login: (code: string) => Promise<void>;
@@ -41,11 +41,22 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
         token,
       });
     }
+
+    // The API service refreshes expired access tokens on its own; follow along, or sign out when it can't
+    apiService.onSessionChange((newToken) => {
+      if (newToken) {
+        setAuthState((state) => ({ ...state, token: newToken }));
+        return;
+      }
+      localStorage.removeItem('userInfo');
+      setAuthState({ isAuthenticated: false, user: null, token: null });
+    });
+    return () => apiService.onSessionChange(null);
   }, []);
 
   const login = async (code: string) => {
     try {
-      const { access_token, user_info } = await apiService.exchangeCodeForToken(code);
+      const { user_info, ...tokens } = await apiService.exchangeCodeForToken(code);
       
       const user: User = {
         id: user_info.id,
@@ -54,13 +65,13 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
         picture: user_info.picture,
       };
 
-      localStorage.setItem('token', access_token);
+      storeTokens(tokens);
       localStorage.setItem('userInfo', JSON.stringify(user));
 
       setAuthState({
         isAuthenticated: true,
         user,
-        token: access_token,
+        token: tokens.access_token,
       });
     } catch (error) {
       console.error('Login failed:', error);
@@ -69,7 +80,8 @@ export const AuthProvider: React.FC<AuthProviderProps> = ({ children }) => {
   };
 
   const logout = () => {
-    localStorage.removeItem('token');
+    apiService.logout().catch((error) => console.error('Logout failed:', error));
+    clearTokens();
     localStorage.removeItem('userInfo');
     setAuthState({
       isAuthenticated: false,
@@ -1,9 +1,35 @@
-import axios, { AxiosInstance } from 'axios';
+import axios, { AxiosError, AxiosInstance, InternalAxiosRequestConfig } from 'axios';
 import { config } from '../config';
-import { Task, TaskResult, TaskInterpretation, User } from '../types';
+import { ScheduledTask, TaskResult, TaskInterpretation, TaskHistoryPage, TaskHistoryQuery, User } from '../types';
+
+export interface AuthTokens {
+  access_token: string;
+  refresh_token: string;
+  expires_in: number;
+}
+
+type RetriableRequest = InternalAxiosRequestConfig & { _retried?: boolean };
+
+// Last history page per query, with its ETag, so a 304 can be answered from here
+const HISTORY_CACHE_SIZE = 50;
+const historyCache = new Map<string, { etag: string; page: TaskHistoryPage }>();
+
+export const storeTokens = (tokens: AuthTokens) => {
+  localStorage.setItem('token', tokens.access_token);
+  localStorage.setItem('refreshToken', tokens.refresh_token);
+};
+
+export const clearTokens = () => {
+  localStorage.removeItem('token');
+  localStorage.removeItem('refreshToken');
+  historyCache.clear();  // The next user must not be shown (or 304'd into) this user's pages
+};
 
 class ApiService {
   private api: AxiosInstance;
+  // One refresh at a time; requests that fail meanwhile wait for it instead of spending the refresh token again
+  private refreshing: Promise<string | null> | null = null;
+  private sessionListener: ((token: string | null) => void) | null = null;
 
   constructor() {
     this.api = axios.create({
@@ -21,6 +47,56 @@ class ApiService {
       }
       return config;
     });
+
+    // Access tokens are short-lived: on a 401, refresh once and replay the request
+    this.api.interceptors.response.use(undefined, async (error: AxiosError) => {
+      const request = error.config as RetriableRequest | undefined;
+      if (error.response?.status !== 401 || !request || request._retried || request.url?.startsWith('/auth/')) {
+        throw error;
+      }
+      request._retried = true;
+
+      // Another tab (or request) may already have refreshed; then the stored token is newer than the one sent
+      const sent = String(request.headers.Authorization || '').replace('Bearer ', '');
+      const stored = localStorage.getItem('token');
+      const token = stored && stored !== sent ? stored : await this.refreshAccessToken();
+      if (!token) {
+        throw error;
+      }
+      request.headers.Authorization = `Bearer ${token}`;
+      return this.api(request);
+    });
+  }
+
+  // Called with the new access token after a refresh, or null once the session has ended
+  onSessionChange(listener: ((token: string | null) => void) | null) {
+    this.sessionListener = listener;
+  }
+
+  private refreshAccessToken(): Promise<string | null> {
+    if (!this.refreshing) {
+      this.refreshing = this.refreshTokens().finally(() => {
+        this.refreshing = null;
+      });
+    }
+    return this.refreshing;
+  }
+
+  private async refreshTokens(): Promise<string | null> {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      try {
+        const response = await this.api.post<AuthTokens>('/auth/refresh', { refresh_token: refreshToken });
+        storeTokens(response.data);
+        this.sessionListener?.(response.data.access_token);
+        return response.data.access_token;
+      } catch (error) {
+        console.error('Token refresh failed:', error);
+      }
+    }
+    clearTokens();
+    this.sessionListener?.(null);
+    return null;
   }
 
   // Auth methods
@@ -29,11 +105,19 @@ class ApiService {
     return response.data.auth_url;
   }
 
-  async exchangeCodeForToken(code: string): Promise<{ access_token: string; user_info: any }> {
+  async exchangeCodeForToken(code: string): Promise<AuthTokens & { user_info: any }> {
     const response = await this.api.post('/auth/callback', { code });
     return response.data;
   }
 
+  // Revokes the session server-side, so its tokens stop working even if they were copied
+  async logout(): Promise<void> {
+    const refreshToken = localStorage.getItem('refreshToken');
+    if (refreshToken) {
+      await this.api.post('/auth/logout', { refresh_token: refreshToken });
+    }
+  }
+
   async getUserProfile(): Promise<User> {
     const response = await this.api.get('/user/profile');
     return response.data;
@@ -46,14 +130,44 @@ class ApiService {
     result: TaskResult;
     interpretation: TaskInterpretation;
   }> {
-    const response = await this.api.post('/tasks/execute', { task });
+    const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+    const response = await this.api.post('/tasks/execute', { task, timezone });
     return response.data;
   }
 
-  async getTaskHistory(limit: number = 20): Promise<{ tasks: Task[] }> {
-    const response = await this.api.get(`/tasks/history?limit=${limit}`);
+  // On a 304 (nothing changed since the last identical request) returns the page cached for that request
+  async getTaskHistory(query: TaskHistoryQuery = {}): Promise<TaskHistoryPage> {
+    const params = Object.fromEntries(
+      Object.entries({ limit: 20, ...query }).filter(([, value]) => value !== undefined && value !== '')
+    );
+    const cacheKey = JSON.stringify(params);
+    const cached = historyCache.get(cacheKey);
+    const response = await this.api.get('/tasks/history', {
+      params,
+      headers: cached ? { 'If-None-Match': cached.etag } : undefined,
+      validateStatus: (status) => (status >= 200 && status < 300) || status === 304,
+    });
+    if (response.status === 304 && cached) {
+      return cached.page;
+    }
+    historyCache.delete(cacheKey);
+    if (response.headers.etag) {
+      historyCache.set(cacheKey, { etag: response.headers.etag, page: response.data });
+      if (historyCache.size > HISTORY_CACHE_SIZE) {
+        historyCache.delete(historyCache.keys().next().value as string);
+      }
+    }
     return response.data;
   }
+
+  async getScheduledTasks(): Promise<ScheduledTask[]> {
+    const response = await this.api.get('/tasks/scheduled');
+    return response.data.tasks;
+  }
+
+  async cancelScheduledTask(taskId: string): Promise<void> {
+    await this.api.delete(`/tasks/scheduled/${taskId}`);
+  }
 }
 
 export const apiService = new ApiService(); 
\ No newline at end of file
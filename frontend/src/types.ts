@@ -11,11 +11,42 @@ export interface AuthState {
   token: string | null;
 }
 
+export interface LLMUsage {
+  model: string;
+  escalated: boolean;
+  prompt_tokens: number;
+  completion_tokens: number;
+  latency_ms: number;
+  cost_usd: number;
+}
+
 export interface TaskInterpretation {
   action_type: string;
   parameters: Record<string, any>;
   confidence: number;
   reasoning: string;
+  schedule?: { run_at: string | null; repeat: string | null };
+  llm?: LLMUsage;
+}
+
+export interface ScheduledTask {
+  id: string;
+  user_input: string;
+  action_type: string;
+  run_at: string;
+  repeat: 'daily' | 'weekdays' | 'weekly' | 'monthly' | null;
+  timezone: string;
+  status: 'pending' | 'running';
+  runs: number;
+  last_task_id: string | null;
+  created_at: string;
+}
+
+export interface RecipientResult {
+  recipient: string;
+  success: boolean;
+  message_id?: string;
+  error?: string;
 }
 
 export interface TaskResult {
@@ -25,6 +56,12 @@ export interface TaskResult {
   message_id?: string;
   event_id?: string;
   event_link?: string;
+  // Bulk email: one entry per recipient
+  sent?: number;
+  failed?: number;
+  results?: RecipientResult[];
+  // Set when the task was stored to run later
+  scheduled?: ScheduledTask;
 }
 
 export interface Task {
@@ -33,7 +70,24 @@ export interface Task {
   user_input: string;
   interpretation: TaskInterpretation;
   result: TaskResult;
-  status: 'processing' | 'completed' | 'failed';
+  status: 'processing' | 'completed' | 'failed' | 'scheduled';
+  scheduled_task_id?: string;
+}
+
+export interface TaskHistoryQuery {
+  limit?: number;
+  before?: string;
+  since?: string;
+  action_type?: string;
+  status?: string;
+  q?: string;
+}
+
+export interface TaskHistoryPage {
+  tasks: Task[];
+  next_cursor: string | null;
+  latest_cursor: string | null;
+  delta: boolean;
 }
 
 export interface ApiResponse<T> {